@@ -1,6 +1,8 @@
 from PySide6.QtWidgets import QApplication
 from spritesheetz.application import MainWindow
 
-app = QApplication()
-window = MainWindow().show()
-app.exec()
\ No newline at end of file
+# tile slicing spawns worker processes, which import this module again
+if __name__ == '__main__':
+    app = QApplication()
+    window = MainWindow().show()
+    app.exec()
\ No newline at end of file
@@ -0,0 +1,76 @@
+import weakref
+import numpy
+from PySide6.QtCore import Qt, QObject, QTimer, QElapsedTimer
+
+# however short the frames, previews never redraw faster than this
+MIN_FRAME_INTERVAL = 16
+
+# Frame timing of one animated object, frame i shows for durations[i] ms and
+# the sequence loops
+class Animation:
+    def __init__(self, durations):
+        self.ends = numpy.cumsum(numpy.maximum(numpy.asarray(durations, dtype=numpy.int64), 1))
+        self.period = int(self.ends[-1])
+
+    def frameAt(self, now):
+        return int(numpy.searchsorted(self.ends, now % self.period, side='right'))
+
+    def nextChange(self, now):
+        # ms until the frame after the one showing at now
+        return int(self.ends[self.frameAt(now)] - now % self.period)
+
+def visibleRects(scene):
+    # scene rects shown by the scene's visible views
+    return [view.mapToScene(view.viewport().rect()).boundingRect() for view in scene.views() if view.isVisible()]
+
+# One timer for every animated preview. It sleeps until the next frame change
+# of any listener rather than ticking at a fixed rate, listeners implement
+# nextFrameChange(now) returning ms or None and advanceAnimations(now).
+class AnimationClock(QObject):
+    def __init__(self):
+        super().__init__()
+
+        self.listeners = weakref.WeakSet()
+
+        self.elapsed = QElapsedTimer()
+        self.elapsed.start()
+
+        self.timer = QTimer(self)
+        self.timer.setSingleShot(True)
+        # a coarse timer can fire a little early and wake again just to catch up
+        self.timer.setTimerType(Qt.PreciseTimer)
+        self.timer.timeout.connect(self.tick)
+
+    def now(self):
+        return self.elapsed.elapsed()
+
+    def register(self, listener):
+        self.listeners.add(listener)
+        self.schedule()
+
+    def schedule(self):
+        now = self.now()
+        delays = [delay for delay in (listener.nextFrameChange(now) for listener in list(self.listeners)) if delay is not None]
+
+        if delays:
+            self.timer.start(max(min(delays), MIN_FRAME_INTERVAL))
+        else:
+            self.timer.stop()
+
+    def tick(self):
+        now = self.now()
+
+        for listener in list(self.listeners):
+            listener.advanceAnimations(now)
+
+        self.schedule()
+
+_clock = None
+
+def animationClock():
+    global _clock
+
+    if _clock is None:
+        _clock = AnimationClock()
+
+    return _clock
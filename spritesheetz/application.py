@@ -1,10 +1,13 @@
 import json
-from PySide6.QtCore import Qt, QSize, QSettings, QByteArray
-from PySide6.QtGui import QAction
-from PySide6.QtWidgets import QMainWindow, QHBoxLayout, QInputDialog, QMessageBox
+from PySide6.QtCore import Qt, QSize, QSettings, QByteArray, QDir, QTimer
+from PySide6.QtGui import QAction, QUndoGroup
+from PySide6.QtWidgets import QMainWindow, QHBoxLayout, QInputDialog, QMessageBox, QFileDialog
 
 from spritesheetz.docks import ResourcesDockWidget
 from spritesheetz.tabs import WorkAreaTabWidget, WorkAreaType
+from spritesheetz.project import ProjectIndex
+from spritesheetz.saving import AUTOSAVE_INTERVAL
+from spritesheetz.journal import abandonedJournals, readJournal, replayRecord, removeJournal
 
 # Subclass QMainWindow to customize your application's main window
 class MainWindow(QMainWindow):
@@ -19,9 +22,17 @@ class MainWindow(QMainWindow):
         self.gridWidth = 16
         self.gridHeight = 16
 
+        # zoom new work area views start at, tiles are drawn from their native pixels at any zoom
+        self.displayScale = float(QSettings("Bamboo", "SpriteSheetz").value("view/displayScale", 1.0))
+
         self.setWindowTitle("SpriteSheetz")
         self.setMinimumSize(QSize(1200, 900))
 
+        # saves modified documents that already have a file every few seconds
+        self.autosaveTimer = QTimer(self)
+        self.autosaveTimer.setInterval(AUTOSAVE_INTERVAL)
+        self.autosaveTimer.timeout.connect(self.autosave)
+
         self.createMenus()
 
         layout = QHBoxLayout()
@@ -44,6 +55,9 @@ class MainWindow(QMainWindow):
         # Docks should be split by default not tabbed
         self.setDockOptions(self.dockOptions() & ~QMainWindow.AllowTabbedDocks)
 
+        self.projectIndex = ProjectIndex(QDir.currentPath())
+        self.projectIndex.scan()
+
         self.resourcesDock = ResourcesDockWidget(self, "Project Files", self)
         self.resourcesDock.setObjectName("project_files")
 
@@ -55,6 +69,7 @@ class MainWindow(QMainWindow):
         self.setLayout(layout)
 
         self.restoreApplicationState()
+        self.recoverJournals()
 
     def createMenus(self):
         bar = self.menuBar()
@@ -66,20 +81,61 @@ class MainWindow(QMainWindow):
         saveAction.triggered.connect(self.saveFile)
         saveAction.setShortcut("Ctrl+S")
 
+        autosaveAction = QAction("&Autosave", self)
+        autosaveAction.setCheckable(True)
+        autosaveAction.toggled.connect(self.setAutosave)
+        autosaveAction.setChecked(QSettings("Bamboo", "SpriteSheetz").value("file/autosave", False, type=bool))
+
+        exportAction = QAction("E&xport Map", self)
+        exportAction.triggered.connect(lambda: self.exportFile('editor'))
+        runtimeExportAction = QAction("Export Map for &Runtime", self)
+        runtimeExportAction.triggered.connect(lambda: self.exportFile('runtime'))
+        streamExportAction = QAction("Export Map for S&treaming", self)
+        streamExportAction.triggered.connect(lambda: self.exportFile('stream'))
+
         exitAction = QAction("&Exit", self)
         exitAction.triggered.connect(self.quit)
         exitAction.setShortcut("Ctrl+E")
 
         fileMenu.addAction(newAction)
         fileMenu.addAction(saveAction)
+        fileMenu.addAction(autosaveAction)
         fileMenu.addAction("&Open")
+        fileMenu.addAction(exportAction)
+        fileMenu.addAction(runtimeExportAction)
+        fileMenu.addAction(streamExportAction)
         fileMenu.addAction(exitAction)
 
+        self.undoGroup = QUndoGroup(self)
+
+        editMenu = bar.addMenu("&Edit")
+        undoAction = self.undoGroup.createUndoAction(self, "&Undo")
+        undoAction.setShortcut("Ctrl+Z")
+        redoAction = self.undoGroup.createRedoAction(self, "&Redo")
+        redoAction.setShortcut("Ctrl+Y")
+
+        copyAction = QAction("&Copy", self)
+        copyAction.triggered.connect(self.copySelection)
+        copyAction.setShortcut("Ctrl+C")
+        pasteAction = QAction("&Paste", self)
+        pasteAction.triggered.connect(self.paste)
+        pasteAction.setShortcut("Ctrl+V")
+
+        editMenu.addAction(undoAction)
+        editMenu.addAction(redoAction)
+        editMenu.addSeparator()
+        editMenu.addAction(copyAction)
+        editMenu.addAction(pasteAction)
+
         viewMenu = bar.addMenu("&View")
         showGridAction = QAction("Show &grid", self)
         showGridAction.triggered.connect(self.toggleGrid)
         viewMenu.addAction(showGridAction)
 
+        displayScaleAction = QAction("Display &scale...", self)
+        displayScaleAction.triggered.connect(self.pickDisplayScale)
+        viewMenu.addAction(displayScaleAction)
+
     def newFile(self):
         item, ok = QInputDialog.getItem(self, "New File",
                                         "Type:", ["Map", "Sprite Sheet"], 0, False);
@@ -99,16 +155,14 @@ class MainWindow(QMainWindow):
         return data
 
     def triggerFile(self, filePath):
-        # if open then add to selected map instead
-        data = self.readFile(filePath)
-
+        # if open then add to selected map instead, the type comes from the index without parsing the file
         tab = self.workAreaWidget.activeTab()
 
-        if tab and tab.areaType == WorkAreaType.MAP:
+        if tab and tab.areaType == WorkAreaType.MAP and self.projectIndex.fileType(filePath) == 'sheet':
             if self.confirmDialogue('SpriteSheetz', 'Would you like to add this sheet to the map?'):
-                tab.addSpriteSheet(filePath, data)
+                tab.addSpriteSheet(filePath, self.readFile(filePath))
         else:
-            self.openFile(filePath, data)
+            self.openFile(filePath)
 
 
     def openFile(self, filePath, data = None):
@@ -123,12 +177,45 @@ class MainWindow(QMainWindow):
 
         if tab:
             tab.saveFile()
+            self.projectIndex.scan()
         else:
             print("Not found", flush=True)
 
+    def setAutosave(self, enabled):
+        QSettings("Bamboo", "SpriteSheetz").setValue("file/autosave", enabled)
+
+        if enabled:
+            self.autosaveTimer.start()
+        else:
+            self.autosaveTimer.stop()
+
+    def autosave(self):
+        # each tab serializes only what changed and writes in the background
+        for i in range(self.workAreaWidget.count()):
+            self.workAreaWidget.widget(i).autosave()
+
+    def exportFile(self, profile = 'editor'):
+        tab = self.workAreaWidget.activeTab()
+
+        if tab and tab.areaType == WorkAreaType.MAP:
+            tab.exportFile(profile)
+
+    def copySelection(self):
+        tab = self.workAreaWidget.activeTab()
+
+        if tab and tab.areaType == WorkAreaType.MAP:
+            tab.copySelection()
+
+    def paste(self):
+        tab = self.workAreaWidget.activeTab()
+
+        if tab and tab.areaType == WorkAreaType.MAP:
+            tab.paste()
+
     def closeEvent(self, event):        
         if self.confirmQuit():
             self.saveApplicationState()
+            self.workAreaWidget.closeDocuments()
             event.accept()
         else:
             event.ignore()
@@ -145,13 +232,47 @@ class MainWindow(QMainWindow):
         return msgBox.exec() == QMessageBox.Yes
 
     def confirmQuit(self):
+        modified = len([i for i in range(self.workAreaWidget.count()) if self.workAreaWidget.widget(i).isModified()])
+
+        if modified:
+            return self.confirmDialogue('SpriteSheetz', f"{modified} tab{'s have' if modified > 1 else ' has'} unsaved changes, are you sure you want to exit?")
+
         return self.confirmDialogue('SpriteSheetz', 'Are you sure you want to exit?')
 
     def quit(self):
         if self.confirmQuit():
             self.saveApplicationState()
+            self.workAreaWidget.closeDocuments()
             exit()
 
+    def recoverJournals(self):
+        # maps that had unsaved changes when the app last went down without closing them
+        for path, lock in abandonedJournals():
+            base, records = readJournal(path)
+
+            if base is not None and (records or base['snapshot']):
+                if self.confirmDialogue('SpriteSheetz', f"Recover unsaved changes to {base['fileName'] or base['name']}?"):
+                    try:
+                        self.recoverMap(base, records)
+                    except (OSError, ValueError, KeyError) as error:
+                        print(f"Couldn't recover {path}: {error}", flush=True)
+
+            lock.unlock()
+            removeJournal(path)
+
+    def recoverMap(self, base, records):
+        # the last snapshot, or the map's own file if it was unchanged then, plus every edit since
+        state = self.readFile(base['snapshot'] or base['fileName'])
+
+        tab = self.workAreaWidget.addTab(state['name'], WorkAreaType.MAP)
+        tab.restoreState(state)
+        tab.scene.fileName = base['fileName']
+
+        for payload in records:
+            replayRecord(tab.scene, payload)
+
+        tab.scene.setModified()
+
     def saveApplicationState(self):
         settings = QSettings("Bamboo", "SpriteSheetz")
         settings.setValue("mainWindow/geometry", self.saveGeometry())
@@ -180,11 +301,22 @@ class MainWindow(QMainWindow):
         else:
             self.scene.removeGridLines()
 
+    def pickDisplayScale(self):
+        scale, ok = QInputDialog.getDouble(self, "Display Scale", "Scale:", self.displayScale, 0.05, 16.0, 2)
+
+        if ok:
+            self.displayScale = scale
+            QSettings("Bamboo", "SpriteSheetz").setValue("view/displayScale", scale)
+            self.workAreaWidget.setDisplayScale(scale)
+
     def keyPressEvent(self, event):
         if event.key() == Qt.Key_Control:
             self.controlHeld = True
         elif event.key() == Qt.Key_Delete:
-            self.scene.deletePress()
+            tab = self.workAreaWidget.activeTab()
+
+            if tab:
+                tab.scene.deletePress()
 
     def keyReleaseEvent(self, event):
         if event.key() == Qt.Key_Control:
@@ -0,0 +1,268 @@
+import hashlib
+from os import makedirs, stat, scandir, remove, replace, utime, getpid
+from os.path import join, exists
+from threading import get_ident
+import numpy
+from PySide6.QtCore import Qt, QObject, QRunnable, QThreadPool, QStandardPaths, QMutex, QMutexLocker, Signal
+from PySide6.QtGui import QImage, QPixmap
+
+from spritesheetz.slicing import sliceImage
+
+# Thumbnails are this many pixels per sheet tile
+THUMBNAIL_TILE_SIZE = 25
+# Least recently used entries are removed once the cache grows past this
+CACHE_MAX_BYTES = 512 * 1024 * 1024
+
+# path -> (mtime, file size, hash) so unchanged files are only hashed once a session
+_hashes = {}
+# (hash, tile size, tiles) -> QImage, shared by every dock showing the same sheet
+_thumbnails = {}
+# loaders fill both from worker threads
+_mutex = QMutex()
+
+def cacheDirectory(name):
+    directory = join(QStandardPaths.writableLocation(QStandardPaths.GenericCacheLocation), 'spritesheetz', name)
+    makedirs(directory, exist_ok=True)
+
+    return directory
+
+def imageToArray(image):
+    image = image.convertToFormat(QImage.Format_RGBA8888)
+    width, height = image.width(), image.height()
+    rows = numpy.frombuffer(image.constBits(), dtype=numpy.uint8).reshape(height, image.bytesPerLine())
+
+    return rows[:, :width * 4].reshape(height, width, 4).copy()
+
+def arrayToImage(array):
+    height, width = array.shape[:2]
+    return QImage(numpy.ascontiguousarray(array).tobytes(), width, height, width * 4, QImage.Format_RGBA8888).copy()
+
+# Arrays saved as .npy files so they can be memory mapped straight back
+class DiskCache:
+    def __init__(self, name, maxBytes = CACHE_MAX_BYTES):
+        self.directory = cacheDirectory(name)
+        self.maxBytes = maxBytes
+        # size of every file in the directory, counted once then kept up to date as files come and go
+        self.totalBytes = None
+        self.mutex = QMutex()
+
+    def path(self, key):
+        return join(self.directory, key + '.npy')
+
+    def load(self, key):
+        path = self.path(key)
+
+        try:
+            array = numpy.load(path, mmap_mode='r')
+        except (OSError, ValueError):
+            return None
+
+        # a read counts as a use for the eviction order
+        utime(path)
+
+        return array
+
+    def store(self, key, array):
+        # an array bigger than the whole cache would evict everything and still not fit, keep it in memory
+        if array.nbytes > self.maxBytes:
+            return array
+
+        path = self.path(key)
+        # workers can store the same key at once, whole files are swapped in
+        temporary = f"{path}.{getpid()}.{get_ident()}.tmp"
+
+        with open(temporary, 'wb') as file:
+            numpy.save(file, array)
+
+        with QMutexLocker(self.mutex):
+            if self.totalBytes is None:
+                self.totalBytes = sum(size for _, size, _ in self.entries())
+
+            try:
+                self.totalBytes -= stat(path).st_size
+            except OSError:
+                pass
+
+            replace(temporary, path)
+            self.totalBytes += stat(path).st_size
+
+            if self.totalBytes > self.maxBytes:
+                self.trim(path)
+
+            return numpy.load(path, mmap_mode='r')
+
+    def entries(self):
+        entries = []
+
+        for entry in scandir(self.directory):
+            if entry.name.endswith('.npy'):
+                try:
+                    info = entry.stat()
+                except OSError:
+                    continue
+
+                entries.append((info.st_mtime, info.st_size, entry.path))
+
+        return entries
+
+    def trim(self, keep):
+        # only runs once the total is over, keep is the file just stored
+        entries = self.entries()
+        self.totalBytes = sum(size for _, size, _ in entries)
+
+        for _, size, path in sorted(entries):
+            if self.totalBytes <= self.maxBytes:
+                break
+
+            if path == keep:
+                continue
+
+            try:
+                remove(path)
+            except OSError:
+                continue
+
+            self.totalBytes -= size
+
+_diskCache = None
+
+def diskCache():
+    global _diskCache
+
+    with QMutexLocker(_mutex):
+        if _diskCache is None:
+            _diskCache = DiskCache('tiles')
+
+    return _diskCache
+
+def contentHash(filePath):
+    info = stat(filePath)
+
+    with QMutexLocker(_mutex):
+        known = _hashes.get(filePath)
+
+    if known is not None and known[:2] == (info.st_mtime_ns, info.st_size):
+        return known[2]
+
+    digest = hashlib.sha1()
+
+    with open(filePath, 'rb') as file:
+        for block in iter(lambda: file.read(1 << 20), b''):
+            digest.update(block)
+
+    with QMutexLocker(_mutex):
+        _hashes[filePath] = (info.st_mtime_ns, info.st_size, digest.hexdigest())
+
+    return digest.hexdigest()
+
+def loadThumbnail(filePath, tileWidth, tileHeight, horizontalTiles, verticalTiles):
+    """
+    Thumbnail of a sheet with every tile THUMBNAIL_TILE_SIZE pixels square,
+    from memory, the disk cache or by decoding the image. Safe to call off the
+    GUI thread.
+    """
+    if not exists(filePath):
+        return QImage()
+
+    imageHash = contentHash(filePath)
+    key = (imageHash, tileWidth, tileHeight, horizontalTiles, verticalTiles)
+
+    with QMutexLocker(_mutex):
+        thumbnail = _thumbnails.get(key)
+
+    if thumbnail is not None:
+        return thumbnail
+
+    cacheKey = f"thumbnail-{imageHash}-{tileWidth}x{tileHeight}-{horizontalTiles}x{verticalTiles}"
+    pixels = diskCache().load(cacheKey)
+
+    if pixels is None:
+        # partial tiles at the edges are padded out transparent so cells stay square once scaled
+        image = QImage(filePath).convertToFormat(QImage.Format_RGBA8888).copy(0, 0, horizontalTiles * tileWidth, verticalTiles * tileHeight)
+        image = image.scaled(horizontalTiles * THUMBNAIL_TILE_SIZE, verticalTiles * THUMBNAIL_TILE_SIZE, Qt.IgnoreAspectRatio, Qt.SmoothTransformation)
+        pixels = diskCache().store(cacheKey, imageToArray(image))
+
+    thumbnail = arrayToImage(pixels)
+
+    with QMutexLocker(_mutex):
+        _thumbnails[key] = thumbnail
+
+    return thumbnail
+
+def loadTiles(filePath, tileWidth, tileHeight, horizontalTiles, verticalTiles):
+    """
+    Every tile of a sheet at its native size, as a (horizontalTiles,
+    verticalTiles, tileHeight, tileWidth, 4) RGBA array, along with each
+    tile's content hash and empty flag. Once a sheet has been sliced the
+    arrays are memory mapped from the cache instead.
+    """
+    shape = (horizontalTiles, verticalTiles, tileHeight, tileWidth, 4)
+
+    if not exists(filePath):
+        return numpy.zeros(shape, dtype=numpy.uint8), numpy.zeros(shape[:2] + (16,), dtype=numpy.uint8), numpy.ones(shape[:2], dtype=bool)
+
+    key = f"{contentHash(filePath)}-{tileWidth}x{tileHeight}-{horizontalTiles}x{verticalTiles}"
+    tiles = diskCache().load(f"tiles-{key}")
+    hashes = diskCache().load(f"tilehashes-{key}")
+    empty = diskCache().load(f"tileempty-{key}")
+
+    if tiles is None or hashes is None or empty is None or tiles.shape != shape:
+        tiles, hashes, empty = sliceImage(imageToArray(QImage(filePath)), tileWidth, tileHeight)
+
+        tiles = diskCache().store(f"tiles-{key}", tiles)
+        hashes = diskCache().store(f"tilehashes-{key}", hashes)
+        empty = diskCache().store(f"tileempty-{key}", empty)
+
+    return tiles, hashes, empty
+
+def tilePixmap(tiles, x, y):
+    return QPixmap.fromImage(arrayToImage(tiles[x, y]))
+
+class ThumbnailSignals(QObject):
+    loaded = Signal(QImage)
+
+class ThumbnailLoader(QRunnable):
+    def __init__(self, filePath, tileWidth, tileHeight, horizontalTiles, verticalTiles):
+        super().__init__()
+
+        self.filePath = filePath
+        self.tileWidth = tileWidth
+        self.tileHeight = tileHeight
+        self.horizontalTiles = horizontalTiles
+        self.verticalTiles = verticalTiles
+        self.signals = ThumbnailSignals()
+
+        # the scene keeps hold of the loader, don't let the pool delete it underneath
+        self.setAutoDelete(False)
+
+    def run(self):
+        # QImage is fine on a worker thread, pixmaps are made once it's back on the GUI thread
+        self.signals.loaded.emit(loadThumbnail(self.filePath, self.tileWidth, self.tileHeight, self.horizontalTiles, self.verticalTiles))
+
+    def start(self):
+        QThreadPool.globalInstance().start(self)
+
+class TileSignals(QObject):
+    # file path, tiles, hashes and empty flags
+    loaded = Signal(str, object, object, object)
+
+class TileLoader(QRunnable):
+    def __init__(self, filePath, tileWidth, tileHeight, horizontalTiles, verticalTiles):
+        super().__init__()
+
+        self.filePath = filePath
+        self.tileWidth = tileWidth
+        self.tileHeight = tileHeight
+        self.horizontalTiles = horizontalTiles
+        self.verticalTiles = verticalTiles
+        self.signals = TileSignals()
+
+        self.setAutoDelete(False)
+
+    def run(self):
+        # decoding and slicing a big atlas takes seconds, none of it on the GUI thread
+        tiles, hashes, empty = loadTiles(self.filePath, self.tileWidth, self.tileHeight, self.horizontalTiles, self.verticalTiles)
+        self.signals.loaded.emit(self.filePath, tiles, hashes, empty)
+
+    def start(self):
+        QThreadPool.globalInstance().start(self)
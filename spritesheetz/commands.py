@@ -0,0 +1,159 @@
+import numpy
+from PySide6.QtGui import QUndoCommand
+
+# Stores only the changed bounding box of each layer array, before and after
+class MapLayerEditCommand(QUndoCommand):
+    def __init__(self, scene, layerIndex, rect, before, after, text):
+        super().__init__(text)
+
+        self.scene = scene
+        self.layerIndex = layerIndex
+        self.rect = rect
+        self.before = before
+        self.after = after
+
+        # the edit has already been applied by the time it is pushed
+        self.applied = True
+
+    def apply(self, data):
+        layer = self.scene.layers[self.layerIndex]
+        x0, y0, x1, y1 = self.rect
+
+        for name, values in data.items():
+            getattr(layer, name)[x0:x1, y0:y1] = values
+
+        self.scene.cellsChanged(self.layerIndex, *self.rect)
+
+    def redo(self):
+        if self.applied:
+            self.applied = False
+        else:
+            self.apply(self.after)
+
+    def undo(self):
+        self.apply(self.before)
+
+# Placed objects are small packed records, so the whole table is kept either side
+class ObjectInstancesEditCommand(QUndoCommand):
+    def __init__(self, scene, before, after, text):
+        super().__init__(text)
+
+        self.scene = scene
+        self.before = before
+        self.after = after
+        self.applied = True
+
+    def apply(self, records, previous):
+        self.scene.instances.replace(records)
+
+        # repaint where objects were removed as well as where they were added
+        for objectId, x, y, layerIndex in numpy.setxor1d(previous, records):
+            width, height = self.scene.objectSizes[objectId]
+            self.scene.cellsChanged(int(layerIndex), int(x), int(y), int(x + width), int(y + height))
+
+    def redo(self):
+        if self.applied:
+            self.applied = False
+        else:
+            self.apply(self.after, self.before)
+
+    def undo(self):
+        self.apply(self.before, self.after)
+
+# Attribute values of a batch of sheet objects either side of one edit, so
+# retagging any number of them is a single undo step
+class SpriteObjectsEditCommand(QUndoCommand):
+    def __init__(self, scene, objects, before, after, text):
+        super().__init__(text)
+
+        self.scene = scene
+        self.objects = objects
+        self.before = before
+        self.after = after
+        self.applied = True
+
+    def apply(self, values):
+        for obj, attributes in zip(self.objects, values):
+            for name, value in attributes.items():
+                setattr(obj, name, value)
+
+        # listeners hear about the batch once
+        self.scene.objectsEdited.emit(self.objects)
+
+    def redo(self):
+        if self.applied:
+            self.applied = False
+        else:
+            self.apply(self.after)
+
+    def undo(self):
+        self.apply(self.before)
+
+# A logic region taken off its layer, undo puts the same region back
+class MapRegionRemoveCommand(QUndoCommand):
+    def __init__(self, scene, layerIndex, region, text):
+        super().__init__(text)
+
+        self.scene = scene
+        self.layerIndex = layerIndex
+        self.region = region
+        self.applied = True
+
+    def redo(self):
+        if self.applied:
+            self.applied = False
+        else:
+            self.scene.removeRegion(self.layerIndex, self.region)
+
+    def undo(self):
+        self.scene.addRegion(self.layerIndex, self.region)
+
+# A logic region drawn onto its layer, undo takes the same region off again
+class MapRegionAddCommand(QUndoCommand):
+    def __init__(self, scene, layerIndex, region, text):
+        super().__init__(text)
+
+        self.scene = scene
+        self.layerIndex = layerIndex
+        self.region = region
+        self.applied = True
+
+    def redo(self):
+        if self.applied:
+            self.applied = False
+        else:
+            self.scene.addRegion(self.layerIndex, self.region)
+
+    def undo(self):
+        self.scene.removeRegion(self.layerIndex, self.region)
+
+# Attribute values of one logic region either side of an edit
+class MapRegionEditCommand(QUndoCommand):
+    def __init__(self, scene, layerIndex, region, before, after, text):
+        super().__init__(text)
+
+        self.scene = scene
+        self.layerIndex = layerIndex
+        self.region = region
+        self.before = before
+        self.after = after
+        self.applied = True
+
+    def apply(self, values):
+        for name, value in values.items():
+            setattr(self.region, name, value)
+
+        self.scene.updateRegion(self.layerIndex, self.region)
+
+        # the properties dock shows what undo put back
+        if self.region is self.scene.selectedRegion:
+            self.scene.regionSelected.emit(self.region)
+
+    def redo(self):
+        if self.applied:
+            self.applied = False
+        else:
+            self.apply(self.after)
+
+    def undo(self):
+        self.apply(self.before)
@@ -1,17 +1,20 @@
-from os.path import join
-from PySide6.QtCore import Qt, QDir, QItemSelectionModel
+import json
+from os.path import join, basename, relpath
+from PySide6.QtCore import Qt, QDir, QItemSelectionModel, QAbstractTableModel, QSortFilterProxyModel, QModelIndex, Signal
 from PySide6.QtGui import QPalette
-from PySide6.QtWidgets import QDockWidget, QTableWidget, QTableWidgetItem, QComboBox, QCheckBox, QTreeView, QFileSystemModel, QFileDialog, QAbstractItemView, QHeaderView, QListWidget, QAbstractItemView
+from PySide6.QtWidgets import QDockWidget, QTableWidget, QTableWidgetItem, QComboBox, QCheckBox, QTreeView, QFileSystemModel, QFileDialog, QAbstractItemView, QHeaderView, QListWidget, QAbstractItemView, QListWidgetItem, QWidget, QVBoxLayout, QHBoxLayout, QPushButton, QTableView, QLineEdit, QStyledItemDelegate
 
-from spritesheetz.objects import SpriteObjectOrigin
+from spritesheetz.objects import SpriteObjectOrigin, TerrainMode, TerrainRules, HitBox, HitBoxType, RegionKind
 
 class ObjectPropertiesWidget(QDockWidget):
+    objectChanged = Signal(object)
+
     def __init__(self, name, parent):
         super().__init__(name, parent)
 
         self.obj = None
 
-        self.objectPropertiesTable = QTableWidget(6, 2, self)
+        self.objectPropertiesTable = QTableWidget(10, 2, self)
         self.objectPropertiesTable.setHorizontalHeaderLabels(['Property', 'Value'])
         self.objectPropertiesTable.verticalHeader().setVisible(False)
         self.objectPropertiesTable.horizontalHeader().setSectionResizeMode(QHeaderView.Stretch)
@@ -23,11 +26,49 @@ class ObjectPropertiesWidget(QDockWidget):
         originTitleItem = QTableWidgetItem("Origin")
         shouldRenderTitleItem = QTableWidgetItem("Should Render")
         hasCollisionTitleItem = QTableWidgetItem("Has Collision")
+        terrainTitleItem = QTableWidgetItem("Terrain")
+        hitBoxTitleItem = QTableWidgetItem("Hit Box")
+        variantsTitleItem = QTableWidgetItem("Variants")
+        framesTitleItem = QTableWidgetItem("Frames")
 
-        for row, item in enumerate([nameTitleItem, keyTitleItem, typeTitleItem, originTitleItem, shouldRenderTitleItem, hasCollisionTitleItem]):
+        for row, item in enumerate([nameTitleItem, keyTitleItem, typeTitleItem, originTitleItem, shouldRenderTitleItem, hasCollisionTitleItem, terrainTitleItem, hitBoxTitleItem, variantsTitleItem, framesTitleItem]):
             item.setFlags(item.flags() ^ (Qt.ItemIsSelectable | Qt.ItemIsEditable))
             self.objectPropertiesTable.setItem(row, 0, item)
 
+        # the editors are made once and refilled for each object
+        self.originBox = QComboBox()
+        self.originBox.addItem("Bottom Left", SpriteObjectOrigin.BOTTOM_LEFT)
+        self.originBox.addItem("Top Left", SpriteObjectOrigin.TOP_LEFT)
+        self.originBox.addItem("Bottom Right", SpriteObjectOrigin.BOTTOM_RIGHT)
+        self.originBox.addItem("Top Right", SpriteObjectOrigin.TOP_RIGHT)
+        self.originBox.currentTextChanged.connect(self.originChanged)
+
+        self.shouldRenderCheckbox = QCheckBox()
+        self.shouldRenderCheckbox.stateChanged.connect(self.renderChanged)
+
+        self.hasCollisionCheckbox = QCheckBox()
+        self.hasCollisionCheckbox.stateChanged.connect(self.collisionChanged)
+
+        self.terrainBox = QComboBox()
+        self.terrainBox.addItem("None", None)
+        self.terrainBox.addItem("Edge (4 bit)", int(TerrainMode.EDGE))
+        self.terrainBox.addItem("Blob (8 bit)", int(TerrainMode.BLOB))
+        self.terrainBox.currentTextChanged.connect(self.terrainChanged)
+
+        self.hitBoxBox = QComboBox()
+        self.hitBoxBox.addItem("Rect", int(HitBoxType.RECT))
+        self.hitBoxBox.addItem("Ellipse", int(HitBoxType.ELLIPSE))
+        self.hitBoxBox.addItem("Polygon", int(HitBoxType.POLYGON))
+        self.hitBoxBox.currentTextChanged.connect(self.hitBoxChanged)
+
+        self.editors = [self.originBox, self.shouldRenderCheckbox, self.hasCollisionCheckbox, self.terrainBox, self.hitBoxBox]
+
+        for row, editor in zip([3, 4, 5, 6, 7], self.editors):
+            self.objectPropertiesTable.setCellWidget(row, 1, editor)
+
+        # nothing to edit until an object is picked
+        self.objectPropertiesTable.setEnabled(False)
+
         self.setWidget(self.objectPropertiesTable)
         self.setFloating(False)
 
@@ -36,54 +77,402 @@ class ObjectPropertiesWidget(QDockWidget):
             case 11:
                 self.obj.name = item.text()
             case 12:
+                # keys name the objects in saved sheets, a taken one is put back
+                if self.parent().scene.keyTaken(item.text(), self.obj):
+                    self.objectPropertiesTable.blockSignals(True)
+                    item.setText(self.obj.key)
+                    self.objectPropertiesTable.blockSignals(False)
+                    return
+
                 self.obj.key = item.text()
             case 13:
                 self.obj.objType = item.text()
+            case 14:
+                try:
+                    self.obj.setVariantsText(item.text())
+                except ValueError:
+                    pass
+            case 15:
+                try:
+                    self.obj.setFramesText(item.text())
+                except ValueError:
+                    pass
+            case _:
+                return
+
+        self.objectChanged.emit(self.obj)
 
     def renderChanged(self, state):
         self.obj.renderTiles = Qt.CheckState(state) == Qt.CheckState.Checked
+        self.objectChanged.emit(self.obj)
 
     def collisionChanged(self, state):
         self.obj.hasCollision = Qt.CheckState(state) == Qt.CheckState.Checked
 
+        if self.obj.hasCollision and self.obj.hitBox is None:
+            self.obj.hitBox = HitBox()
+
+        self.objectChanged.emit(self.obj)
+
+    def hitBoxChanged(self, text):
+        # switching shape starts over from an empty hitbox of the new type
+        self.obj.hitBox = HitBox(HitBoxType(self.hitBoxBox.currentData()))
+        self.objectChanged.emit(self.obj)
+
     def originChanged(self, text):
         self.obj.originMode = self.originBox.currentData()
+        self.objectChanged.emit(self.obj)
+
+    def terrainChanged(self, text):
+        mode = self.terrainBox.currentData()
+
+        if mode is None:
+            self.obj.terrain = None
+        elif self.obj.terrain is None:
+            self.obj.terrain = TerrainRules(TerrainMode(mode))
+        else:
+            self.obj.terrain.mode = TerrainMode(mode)
+
+        self.objectChanged.emit(self.obj)
 
     def setObject(self, obj):
         self.obj = obj
 
         table = self.objectPropertiesTable
+        table.setEnabled(True)
 
-        nameItem = QTableWidgetItem(obj.name, 11)
+        # filling in the values isn't an edit
+        for widget in [table] + self.editors:
+            widget.blockSignals(True)
 
-        table.setItem(0, 1, nameItem)
+        table.setItem(0, 1, QTableWidgetItem(obj.name, 11))
         table.setItem(1, 1, QTableWidgetItem(obj.key, 12))
         table.setItem(2, 1, QTableWidgetItem(obj.objType, 13))
 
-        originBox = QComboBox()
-        originBox.addItem("Bottom Left", SpriteObjectOrigin.BOTTOM_LEFT)
-        originBox.addItem("Top Left", SpriteObjectOrigin.TOP_LEFT)
-        originBox.addItem("Bottom Right", SpriteObjectOrigin.BOTTOM_RIGHT)
-        originBox.addItem("Top Right", SpriteObjectOrigin.TOP_RIGHT)
-        originBox.setCurrentIndex(int(obj.originMode))
-        originBox.currentTextChanged.connect(self.originChanged)
+        self.originBox.setCurrentIndex(int(obj.originMode))
+        self.shouldRenderCheckbox.setChecked(bool(obj.renderTiles))
+        self.hasCollisionCheckbox.setChecked(bool(obj.hasCollision))
+        self.terrainBox.setCurrentIndex(0 if obj.terrain is None else int(obj.terrain.mode) + 1)
+        # an object without a hitbox shows the shape a new one starts as
+        self.hitBoxBox.setCurrentIndex(0 if obj.hitBox is None else int(obj.hitBox.hitBoxType))
 
-        self.originBox = originBox
+        # comma separated keys with optional weights, e.g. "oak:2, pine"
+        table.setItem(8, 1, QTableWidgetItem(obj.variantsText(), 14))
+        # sheet offsets of each frame with its duration in ms, e.g. "0 0:150, 1 0:150"
+        table.setItem(9, 1, QTableWidgetItem(obj.framesText(), 15))
 
-        table.setCellWidget(3, 1, originBox)
+        for widget in [table] + self.editors:
+            widget.blockSignals(False)
 
-        shouldRenderCheckbox = QCheckBox()
-        if obj.renderTiles:
-            shouldRenderCheckbox.setChecked(True)
-        shouldRenderCheckbox.stateChanged.connect(self.renderChanged)
+        table.viewport().update()
 
-        hasCollisionCheckbox = QCheckBox()
-        if obj.hasCollision:
-            hasCollisionCheckbox.setChecked(True)
-        hasCollisionCheckbox.stateChanged.connect(self.collisionChanged)
+class SpriteObjectsModel(QAbstractTableModel):
+    COLUMNS = ['Name', 'Key', 'Type', 'Origin', 'Render', 'Collision', 'Tiles']
+    ORIGINS = ["Bottom Left", "Top Left", "Bottom Right", "Top Right"]
 
-        table.setCellWidget(4, 1, shouldRenderCheckbox)
-        table.setCellWidget(5, 1, hasCollisionCheckbox)
+    objectEdited = Signal(object)
+
+    def __init__(self, scene):
+        super().__init__()
+
+        self.scene = scene
+        self.objects = []
+        self.rows = {}
+        self.searchText = []
+
+        scene.objectsChanged.connect(self.refresh)
+        self.refresh()
+
+    def refresh(self):
+        self.beginResetModel()
+        self.objects = list(self.scene.objects)
+        self.rows = {id(obj): row for row, obj in enumerate(self.objects)}
+        self.searchText = [self.objectSearchText(obj) for obj in self.objects]
+        self.endResetModel()
+
+    def objectSearchText(self, obj):
+        # what the filter matches against, worked out once per change rather than per keystroke
+        return "\n".join([obj.name or '', obj.key or '', obj.objType or '']).lower()
+
+    def objectChanged(self, obj):
+        row = self.rows.get(id(obj))
+
+        if row is None:
+            return
+
+        self.searchText[row] = self.objectSearchText(obj)
+        self.dataChanged.emit(self.index(row, 0), self.index(row, len(self.COLUMNS) - 1))
+
+    def objectsChanged(self, objects):
+        rows = [self.rows[id(obj)] for obj in objects if id(obj) in self.rows]
+
+        if not rows:
+            return
+
+        for row in rows:
+            self.searchText[row] = self.objectSearchText(self.objects[row])
+
+        # one signal spanning the batch rather than one per row
+        self.dataChanged.emit(self.index(min(rows), 0), self.index(max(rows), len(self.COLUMNS) - 1))
+
+    def rowOf(self, obj):
+        return self.rows.get(id(obj), -1)
+
+    def rowCount(self, parent = QModelIndex()):
+        return 0 if parent.isValid() else len(self.objects)
+
+    def columnCount(self, parent = QModelIndex()):
+        return 0 if parent.isValid() else len(self.COLUMNS)
+
+    def headerData(self, section, orientation, role = Qt.DisplayRole):
+        if orientation == Qt.Horizontal and role == Qt.DisplayRole:
+            return self.COLUMNS[section]
+
+    # looked up for every cell the view touches, so worked out once
+    FLAGS = [Qt.ItemIsSelectable | Qt.ItemIsEnabled | Qt.ItemIsEditable] * 4 + \
+            [Qt.ItemIsSelectable | Qt.ItemIsEnabled | Qt.ItemIsUserCheckable] * 2 + \
+            [Qt.ItemIsSelectable | Qt.ItemIsEnabled]
+
+    def flags(self, index):
+        return self.FLAGS[index.column()]
+
+    def data(self, index, role = Qt.DisplayRole):
+        obj = self.objects[index.row()]
+        column = index.column()
+
+        if role == Qt.UserRole:
+            return obj
+
+        if role == Qt.CheckStateRole:
+            match column:
+                case 4:
+                    return Qt.Checked if obj.renderTiles else Qt.Unchecked
+                case 5:
+                    return Qt.Checked if obj.hasCollision else Qt.Unchecked
+
+            return None
+
+        if role not in (Qt.DisplayRole, Qt.EditRole):
+            return None
+
+        match column:
+            case 0:
+                return obj.name
+            case 1:
+                return obj.key
+            case 2:
+                return obj.objType
+            case 3:
+                return int(obj.originMode) if role == Qt.EditRole else self.ORIGINS[int(obj.originMode)]
+            case 6:
+                return len(obj.tiles)
+
+    def setData(self, index, value, role = Qt.EditRole):
+        obj = self.objects[index.row()]
+
+        match index.column(), role:
+            case 0, Qt.EditRole:
+                obj.name = value
+            case 1, Qt.EditRole:
+                if self.scene.keyTaken(value, obj):
+                    return False
+
+                obj.key = value
+            case 2, Qt.EditRole:
+                obj.objType = value
+            case 3, Qt.EditRole:
+                obj.originMode = SpriteObjectOrigin(value)
+            case 4, Qt.CheckStateRole:
+                obj.renderTiles = Qt.CheckState(value) == Qt.Checked
+            case 5, Qt.CheckStateRole:
+                obj.hasCollision = Qt.CheckState(value) == Qt.Checked
+
+                if obj.hasCollision and obj.hitBox is None:
+                    obj.hitBox = HitBox()
+            case _:
+                return False
+
+        self.objectChanged(obj)
+        self.objectEdited.emit(obj)
+
+        return True
+
+class SpriteObjectsFilterModel(QSortFilterProxyModel):
+    def __init__(self):
+        super().__init__()
+
+        self.text = ''
+
+    def setFilterText(self, text):
+        text = text.lower()
+
+        if text == self.text:
+            return
+
+        self.text = text
+        self.invalidateFilter()
+
+    def filterAcceptsRow(self, sourceRow, sourceParent):
+        return self.text in self.sourceModel().searchText[sourceRow]
+
+# Edits the origin column with one combo box, made when a cell starts editing
+# and handed back when it's done rather than one per row
+class OriginDelegate(QStyledItemDelegate):
+    def createEditor(self, parent, option, index):
+        editor = QComboBox(parent)
+        editor.addItems(SpriteObjectsModel.ORIGINS)
+
+        return editor
+
+    def setEditorData(self, editor, index):
+        editor.setCurrentIndex(index.data(Qt.EditRole))
+
+    def setModelData(self, editor, model, index):
+        model.setData(index, editor.currentIndex(), Qt.EditRole)
+
+# Every object on the sheet as a filterable table, the view only ever creates
+# the rows on screen so sheets with very many objects list as quickly as few
+class SpriteObjectsDockWidget(QDockWidget):
+    objectSelected = Signal(object)
+    # objects, attribute changes, extra property changes
+    bulkEdit = Signal(list, dict, dict)
+
+    def __init__(self, name, parent, scene):
+        super().__init__(name, parent)
+
+        self.model = SpriteObjectsModel(scene)
+        self.filterModel = SpriteObjectsFilterModel()
+        self.filterModel.setSourceModel(self.model)
+
+        self.searchEdit = QLineEdit()
+        self.searchEdit.setPlaceholderText("Filter by name, key or type")
+        self.searchEdit.setClearButtonEnabled(True)
+        self.searchEdit.textChanged.connect(self.filterModel.setFilterText)
+
+        table = QTableView()
+        table.setModel(self.filterModel)
+        table.setItemDelegateForColumn(3, OriginDelegate(table))
+        table.setSelectionBehavior(QAbstractItemView.SelectRows)
+        table.setSelectionMode(QAbstractItemView.ExtendedSelection)
+        table.setEditTriggers(QAbstractItemView.DoubleClicked | QAbstractItemView.EditKeyPressed)
+        table.verticalHeader().setVisible(False)
+        # fixed row heights let the view place rows without measuring them
+        table.verticalHeader().setSectionResizeMode(QHeaderView.Fixed)
+        table.verticalHeader().setDefaultSectionSize(table.fontMetrics().height() + 6)
+        table.horizontalHeader().setSectionResizeMode(QHeaderView.Interactive)
+        table.horizontalHeader().setStretchLastSection(True)
+        table.selectionModel().currentRowChanged.connect(self.currentRowChanged)
+
+        self.table = table
+
+        # applied to every selected row at once, blank or half checked fields are left alone
+        self.typeEdit = QLineEdit()
+        self.typeEdit.setPlaceholderText("Type")
+
+        self.originBox = QComboBox()
+        self.originBox.addItem("Origin", None)
+
+        for origin, title in enumerate(SpriteObjectsModel.ORIGINS):
+            self.originBox.addItem(title, SpriteObjectOrigin(origin))
+
+        self.renderCheckbox = QCheckBox("Render")
+        self.collisionCheckbox = QCheckBox("Collision")
+
+        for checkbox in [self.renderCheckbox, self.collisionCheckbox]:
+            checkbox.setTristate(True)
+            checkbox.setCheckState(Qt.PartiallyChecked)
+
+        # e.g. "layer=2, solid=true", an empty value removes the property
+        self.propertiesEdit = QLineEdit()
+        self.propertiesEdit.setPlaceholderText("Properties, e.g. layer=2, solid=true")
+
+        applyButton = QPushButton("Apply to Selected")
+        applyButton.clicked.connect(self.applyBulkEdit)
+
+        bulkLayout = QHBoxLayout()
+        bulkLayout.addWidget(self.typeEdit)
+        bulkLayout.addWidget(self.originBox)
+        bulkLayout.addWidget(self.renderCheckbox)
+        bulkLayout.addWidget(self.collisionCheckbox)
+
+        widget = QWidget()
+        widget.setLayout(QVBoxLayout())
+        widget.layout().addWidget(self.searchEdit)
+        widget.layout().addWidget(table)
+        widget.layout().addLayout(bulkLayout)
+        widget.layout().addWidget(self.propertiesEdit)
+        widget.layout().addWidget(applyButton)
+
+        self.setWidget(widget)
+        self.setFloating(False)
+
+    def currentRowChanged(self, current, previous):
+        if current.isValid():
+            self.objectSelected.emit(current.data(Qt.UserRole))
+
+    def selectedObjects(self):
+        # walks the selected ranges, asking for the selected rows would visit every cell
+        rows = set()
+
+        for selectionRange in self.table.selectionModel().selection():
+            for row in range(selectionRange.top(), selectionRange.bottom() + 1):
+                rows.add(self.filterModel.mapToSource(self.filterModel.index(row, 0)).row())
+
+        return [self.model.objects[row] for row in sorted(rows)]
+
+    def bulkChanges(self):
+        changes = {}
+
+        if self.typeEdit.text():
+            changes['objType'] = self.typeEdit.text()
+
+        if self.originBox.currentData() is not None:
+            changes['originMode'] = self.originBox.currentData()
+
+        for name, checkbox in [('renderTiles', self.renderCheckbox), ('hasCollision', self.collisionCheckbox)]:
+            if checkbox.checkState() != Qt.PartiallyChecked:
+                changes[name] = checkbox.checkState() == Qt.Checked
+
+        properties = {}
+
+        for entry in self.propertiesEdit.text().split(','):
+            key, _, value = entry.partition('=')
+            key, value = key.strip(), value.strip()
+
+            if not key:
+                continue
+
+            if not value:
+                properties[key] = None
+                continue
+
+            # numbers and true/false keep their type, anything else is a string
+            try:
+                properties[key] = json.loads(value)
+            except ValueError:
+                properties[key] = value
+
+        return changes, properties
+
+    def applyBulkEdit(self):
+        objects = self.selectedObjects()
+        changes, properties = self.bulkChanges()
+
+        if objects and (changes or properties):
+            self.bulkEdit.emit(objects, changes, properties)
+
+    def setCurrentObject(self, obj):
+        index = self.filterModel.mapFromSource(self.model.index(self.model.rowOf(obj), 0))
+
+        if not index.isValid() or index == self.table.currentIndex():
+            return
+
+        # selecting in the scene shouldn't bounce back as another selection
+        self.table.selectionModel().blockSignals(True)
+        self.table.setCurrentIndex(index)
+        self.table.selectionModel().blockSignals(False)
+        self.table.viewport().update()
+        self.table.scrollTo(index)
 
 class SpriteSheetPropertiesWidget(QDockWidget):
     def __init__(self, name, parent, application):
@@ -136,26 +525,93 @@ class SpriteSheetPropertiesWidget(QDockWidget):
         match item.type():
             case 11:
                 self.sheet.name = item.text()
+                self.sheet.setModified()
                 if hasattr(self.application, 'workAreaWidget'):
                     tabWidget = self.application.workAreaWidget
 
                     tabWidget.setTabText(tabWidget.currentIndex(), item.text())
 
-class ResourcesTreeView(QTreeView):
-    def __init__(self, application):
+class ProjectIndexModel(QAbstractTableModel):
+    COLUMNS = ['Name', 'Type', 'Size', 'File']
+    SORT_ROLE = Qt.UserRole + 1
+
+    def __init__(self, projectIndex):
         super().__init__()
 
-        self.application = application
+        self.projectIndex = projectIndex
+        self.paths = []
+
+        projectIndex.updated.connect(self.refresh)
+        self.refresh()
+
+    def refresh(self):
+        self.beginResetModel()
+        self.paths = sorted(self.projectIndex.entries)
+        self.endResetModel()
+
+    def rowCount(self, parent = QModelIndex()):
+        return 0 if parent.isValid() else len(self.paths)
+
+    def columnCount(self, parent = QModelIndex()):
+        return 0 if parent.isValid() else len(self.COLUMNS)
+
+    def headerData(self, section, orientation, role = Qt.DisplayRole):
+        if orientation == Qt.Horizontal and role == Qt.DisplayRole:
+            return self.COLUMNS[section]
+
+    def data(self, index, role = Qt.DisplayRole):
+        filePath = self.paths[index.row()]
+        entry = self.projectIndex.entries.get(filePath, {})
+        column = index.column()
+
+        if role == Qt.UserRole:
+            return filePath
+
+        if role == Qt.ToolTipRole:
+            if entry.get('type') == 'sheet':
+                maps = self.projectIndex.mapsUsingSheet(filePath)
+                return "Used by: " + (", ".join(relpath(path, self.projectIndex.root) for path in maps) if maps else "no maps")
 
-    def edit(self, index, trigger, event):
-        if trigger == QAbstractItemView.DoubleClicked:
-            # Prevent renaming files, double click to open the file instead in a tab
-            self.application.triggerFile(join(QDir.currentPath(), index.data()))
+            return filePath
 
-            return False
-        if trigger == QAbstractItemView.EditKeyPressed:
-            return False
-        return super().edit(index, trigger, event)
+        if role not in (Qt.DisplayRole, self.SORT_ROLE):
+            return None
+
+        match column:
+            case 0:
+                return entry.get('name', basename(filePath))
+            case 1:
+                return entry.get('type', '')
+            case 2:
+                width, height = entry.get('width', 0), entry.get('height', 0)
+
+                if role == self.SORT_ROLE:
+                    return width * height
+
+                return f"{width} x {height}" if width and height else ''
+            case 3:
+                return relpath(filePath, self.projectIndex.root)
+
+class ProjectFilterModel(QSortFilterProxyModel):
+    def __init__(self):
+        super().__init__()
+
+        self.fileType = None
+
+        self.setFilterKeyColumn(-1)
+        self.setFilterCaseSensitivity(Qt.CaseInsensitive)
+        self.setSortRole(ProjectIndexModel.SORT_ROLE)
+
+    def setFileType(self, fileType):
+        self.fileType = fileType
+        self.invalidateFilter()
+
+    def filterAcceptsRow(self, sourceRow, sourceParent):
+        if self.fileType is not None:
+            if self.sourceModel().index(sourceRow, 1, sourceParent).data() != self.fileType:
+                return False
+
+        return super().filterAcceptsRow(sourceRow, sourceParent)
 
 class ResourcesDockWidget(QDockWidget):
     def __init__(self, application, name, parent = None):
@@ -163,24 +619,45 @@ class ResourcesDockWidget(QDockWidget):
 
         self.application = application
 
-        model = QFileSystemModel()
-        model.setNameFilters(['*.json'])
-        model.setNameFilterDisables(False)
-        model.setReadOnly(False)
-        model.setRootPath(QDir.currentPath())
-        tree = ResourcesTreeView(application)
-        tree.setRootIsDecorated(False)
-        tree.setModel(model)
-        tree.setRootIndex(model.index(QDir.currentPath()))
-
-        for i in range(1, model.columnCount()):
-            tree.hideColumn(i)
-
-        tree.setUniformRowHeights(True)
-
-        self.tree = tree
-        
-        self.setWidget(tree)
+        self.model = ProjectIndexModel(application.projectIndex)
+        self.filterModel = ProjectFilterModel()
+        self.filterModel.setSourceModel(self.model)
+
+        self.searchEdit = QLineEdit()
+        self.searchEdit.setPlaceholderText("Search")
+        self.searchEdit.setClearButtonEnabled(True)
+        self.searchEdit.textChanged.connect(self.filterModel.setFilterFixedString)
+
+        self.typeBox = QComboBox()
+        self.typeBox.addItem("All", None)
+        self.typeBox.addItem("Maps", 'map')
+        self.typeBox.addItem("Sprite Sheets", 'sheet')
+        self.typeBox.currentIndexChanged.connect(lambda index: self.filterModel.setFileType(self.typeBox.itemData(index)))
+
+        table = QTableView()
+        table.setModel(self.filterModel)
+        table.setSortingEnabled(True)
+        table.sortByColumn(0, Qt.AscendingOrder)
+        table.setSelectionBehavior(QAbstractItemView.SelectRows)
+        table.setEditTriggers(QAbstractItemView.NoEditTriggers)
+        table.verticalHeader().setVisible(False)
+        table.horizontalHeader().setSectionResizeMode(QHeaderView.ResizeToContents)
+        table.horizontalHeader().setStretchLastSection(True)
+        # double click to open the file in a tab
+        table.doubleClicked.connect(lambda index: self.application.triggerFile(index.data(Qt.UserRole)))
+
+        self.table = table
+
+        filterLayout = QHBoxLayout()
+        filterLayout.addWidget(self.searchEdit)
+        filterLayout.addWidget(self.typeBox)
+
+        widget = QWidget()
+        widget.setLayout(QVBoxLayout())
+        widget.layout().addLayout(filterLayout)
+        widget.layout().addWidget(table)
+
+        self.setWidget(widget)
         self.setFloating(False)
 
 class MapPropertiesWidget(QDockWidget):
@@ -263,7 +740,84 @@ class MapPropertiesWidget(QDockWidget):
         table.setCellWidget(4, 1, shouldRenderCheckbox)
         table.setCellWidget(5, 1, hasCollisionCheckbox)
 
+class RegionPropertiesWidget(QDockWidget):
+    # the region and the new values of the attributes edited
+    regionChanged = Signal(object, dict)
+
+    def __init__(self, name, parent):
+        super().__init__(name, parent)
+
+        self.region = None
+
+        self.regionPropertiesTable = QTableWidget(3, 2, self)
+        self.regionPropertiesTable.setHorizontalHeaderLabels(['Property', 'Value'])
+        self.regionPropertiesTable.verticalHeader().setVisible(False)
+        self.regionPropertiesTable.horizontalHeader().setSectionResizeMode(QHeaderView.Stretch)
+        self.regionPropertiesTable.itemChanged.connect(self.itemChanged)
+
+        nameTitleItem = QTableWidgetItem("Name")
+        kindTitleItem = QTableWidgetItem("Kind")
+        propertiesTitleItem = QTableWidgetItem("Properties (JSON)")
+
+        for row, item in enumerate([nameTitleItem, kindTitleItem, propertiesTitleItem]):
+            item.setFlags(item.flags() ^ (Qt.ItemIsSelectable | Qt.ItemIsEditable))
+            self.regionPropertiesTable.setItem(row, 0, item)
+
+        kindBox = QComboBox()
+        kindBox.addItem("Trigger", RegionKind.TRIGGER)
+        kindBox.addItem("Spawn Zone", RegionKind.SPAWN)
+        kindBox.addItem("Custom", RegionKind.CUSTOM)
+        kindBox.currentTextChanged.connect(self.kindChanged)
+
+        self.kindBox = kindBox
+        self.regionPropertiesTable.setCellWidget(1, 1, kindBox)
+
+        self.setWidget(self.regionPropertiesTable)
+        self.setFloating(False)
+
+    def itemChanged(self, item):
+        if self.region is None:
+            return
+
+        match item.type():
+            case 11:
+                values = {'name': item.text()}
+            case 12:
+                try:
+                    values = {'properties': json.loads(item.text() or '{}')}
+                except ValueError:
+                    return
+            case _:
+                return
+
+        # the scene makes the change so it can be undone
+        self.regionChanged.emit(self.region, values)
+
+    def kindChanged(self, text):
+        if self.region is not None:
+            self.regionChanged.emit(self.region, {'kind': RegionKind(self.kindBox.currentData())})
+
+    def setRegion(self, region):
+        self.region = None
+
+        table = self.regionPropertiesTable
+
+        if region is None:
+            table.setItem(0, 1, QTableWidgetItem("", 11))
+            table.setItem(2, 1, QTableWidgetItem("", 12))
+            return
+
+        table.setItem(0, 1, QTableWidgetItem(region.name, 11))
+        table.setItem(2, 1, QTableWidgetItem(json.dumps(region.properties), 12))
+        self.kindBox.setCurrentIndex(int(region.kind))
+
+        self.region = region
+
 class LayersDock(QDockWidget):
+    layerAdded = Signal(int)
+    layerSelected = Signal(int)
+    layerRenamed = Signal(int, str)
+
     def __init__(self, name, parent):
         super().__init__(name, parent)
 
@@ -274,11 +828,14 @@ class LayersDock(QDockWidget):
         for index in range(self.layersList.count()):
             item = self.layersList.item(index)
             item.setFlags(item.flags() | Qt.ItemIsEditable)
+            item.setData(Qt.UserRole, index)
 
             if index == 0:
                 self.layersList.setCurrentItem(item)
         
         self.layersList.selectionModel().selectionChanged.connect(self.selectionChanged)
+        self.layersList.currentItemChanged.connect(self.currentItemChanged)
+        self.layersList.itemChanged.connect(self.itemChanged)
 #myList->selectionModel()->            
 
         # Always keep selection even when blurred
@@ -289,7 +846,42 @@ class LayersDock(QDockWidget):
         customPalette.setColor(QPalette.Inactive, QPalette.HighlightedText, orginalPallete.color(QPalette.Active, QPalette.HighlightedText))
         self.layersList.setPalette(customPalette)
 
-        self.setWidget(self.layersList)
+        # layer type values match MapLayerType
+        addTileLayerButton = QPushButton("Add Tile Layer")
+        addTileLayerButton.clicked.connect(lambda: self.layerAdded.emit(0))
+        addLogicLayerButton = QPushButton("Add Logic Layer")
+        addLogicLayerButton.clicked.connect(lambda: self.layerAdded.emit(1))
+
+        buttons = QHBoxLayout()
+        buttons.addWidget(addTileLayerButton)
+        buttons.addWidget(addLogicLayerButton)
+
+        container = QWidget()
+        container.setLayout(QVBoxLayout())
+        container.layout().addWidget(self.layersList)
+        container.layout().addLayout(buttons)
+
+        self.setWidget(container)
+
+    def setLayers(self, layers, currentIndex = 0):
+        self.layersList.blockSignals(True)
+        self.layersList.clear()
+
+        for index, layer in enumerate(layers):
+            item = QListWidgetItem(layer.name)
+            item.setFlags(item.flags() | Qt.ItemIsEditable)
+            item.setData(Qt.UserRole, index)
+            self.layersList.addItem(item)
+
+        self.layersList.setCurrentRow(currentIndex)
+        self.layersList.blockSignals(False)
+
+    def currentItemChanged(self, current, previous):
+        if current is not None:
+            self.layerSelected.emit(current.data(Qt.UserRole))
+
+    def itemChanged(self, item):
+        self.layerRenamed.emit(item.data(Qt.UserRole), item.text())
 
     def selectionChanged(self, selected, deselected):
         # Prevent nothing being selected
@@ -0,0 +1,759 @@
+import os
+import json
+import base64
+import hashlib
+from os.path import splitext
+import numpy
+
+from spritesheetz.objects import HitBoxType, MapLayerType
+from spritesheetz.spatial import mergeRects, UniformGrid
+from spritesheetz.saving import writeFileAtomic, sparseCells, encodeRuns
+
+# Collision grid buckets are this many map tiles across
+COLLISION_GRID_TILES = 8
+# Logic regions are bucketed into chunks this many map tiles across
+REGION_CHUNK_TILES = 32
+# Render batches are baked per chunk this many map tiles across
+RENDER_CHUNK_TILES = 32
+# Streamed exports are split into region files this many map tiles across
+STREAM_REGION_TILES = 64
+# Sections of each region file, in the order they're written
+STREAM_SECTIONS = ['tiles', 'objects', 'collision', 'triggers']
+
+def cellHash(seed, x, y, layer):
+    """
+    Stateless 64 bit hash of each cell, a splitmix64 finaliser over the mixed
+    coordinates. Works on whole arrays at once and never depends on order.
+    """
+    with numpy.errstate(over='ignore'):
+        h = numpy.asarray(x, dtype=numpy.int64).astype(numpy.uint64) * numpy.uint64(0x9E3779B97F4A7C15)
+        h ^= numpy.asarray(y, dtype=numpy.int64).astype(numpy.uint64) * numpy.uint64(0xC2B2AE3D27D4EB4F)
+        h ^= numpy.asarray(layer, dtype=numpy.int64).astype(numpy.uint64) * numpy.uint64(0x165667B19E3779F9)
+        h ^= numpy.uint64(seed & 0xFFFFFFFFFFFFFFFF)
+
+        h ^= h >> numpy.uint64(30)
+        h *= numpy.uint64(0xBF58476D1CE4E5B9)
+        h ^= h >> numpy.uint64(27)
+        h *= numpy.uint64(0x94D049BB133111EB)
+        h ^= h >> numpy.uint64(31)
+
+    return h
+
+def pickVariants(hashes, weights):
+    # weighted choice from the top 53 bits of each hash
+    cumulative = numpy.cumsum(numpy.asarray(weights, dtype=numpy.float64))
+    unit = (hashes >> numpy.uint64(11)).astype(numpy.float64) * 2.0 ** -53
+
+    return numpy.minimum(numpy.searchsorted(cumulative, unit * cumulative[-1], side='right'), len(cumulative) - 1)
+
+class MapExporter:
+    def __init__(self, scene):
+        self.scene = scene
+        self.suffix = '.export.json'
+
+        # each stage adds its own section to the exported document
+        self.stages = [
+            self.exportTilesets,
+            self.exportLayers,
+            self.exportObjects,
+            self.bakeCollision,
+            self.exportNavigation,
+            self.exportRegions
+        ]
+
+    def export(self):
+        scene = self.scene
+
+        data = {
+            'name': scene.name,
+            'type': 'mapExport',
+            'tileWidth': scene.tileWidth,
+            'tileHeight': scene.tileHeight,
+            'width': scene.rows,
+            'height': scene.cols
+        }
+
+        # placeholders are swapped for their variants once, every stage sees the result
+        self.variants = self.variantTable()
+        self.instances = self.resolveInstances()
+        self.layerTiles = [self.resolveTiles(layerIndex, layer) for layerIndex, layer in enumerate(scene.layers)]
+
+        for stage in self.stages:
+            stage(data)
+
+        return data
+
+    def exportFile(self, fileName):
+        exportFileName = splitext(fileName)[0] + self.suffix
+
+        with open(exportFileName, 'w') as file:
+            file.write(json.dumps(self.export(), separators=(',', ':')))
+
+        return exportFileName
+
+    def variantTable(self):
+        # placeholder object id -> (variant object ids, weights)
+        scene = self.scene
+        table = {}
+
+        for objectId, (spriteSheet, obj) in enumerate(scene.mapObjects):
+            keys = {variant.key: index for index, variant in enumerate(spriteSheet.objects)}
+            variants = [(spriteSheet.firstObjectId + keys[key], weight) for key, weight in obj.variants if key in keys and weight > 0]
+
+            if variants:
+                table[objectId] = (numpy.array([variant[0] for variant in variants]), [variant[1] for variant in variants])
+
+        return table
+
+    def resolveInstances(self):
+        scene = self.scene
+        records = scene.instances.view().copy()
+
+        for objectId, (variantIds, weights) in self.variants.items():
+            which = numpy.flatnonzero(records['object'] == objectId)
+
+            if len(which) == 0:
+                continue
+
+            # variants share the placeholder's anchor cell rather than its top left
+            offsetX, offsetY = scene.mapObjects[objectId][1].originOffset()
+            anchorX = records['x'][which] - offsetX
+            anchorY = records['y'][which] - offsetY
+
+            picked = pickVariants(cellHash(scene.variantSeed, anchorX, anchorY, records['layer'][which]), weights)
+            offsets = numpy.array([scene.mapObjects[variantId][1].originOffset() for variantId in variantIds])
+
+            records['object'][which] = variantIds[picked]
+            records['x'][which] = anchorX + offsets[picked, 0]
+            records['y'][which] = anchorY + offsets[picked, 1]
+
+        return records
+
+    def resolveTiles(self, layerIndex, layer):
+        # single tile placeholders painted as tiles resolve cell by cell
+        scene = self.scene
+        tiles = layer.tiles
+
+        for objectId, (variantIds, weights) in self.variants.items():
+            spriteSheet, obj = scene.mapObjects[objectId]
+            variants = [scene.mapObjects[variantId] for variantId in variantIds]
+
+            if len(obj.tiles) != 1 or any(len(variant.tiles) != 1 for _, variant in variants):
+                continue
+
+            xs, ys = numpy.nonzero(tiles == spriteSheet.tileId(*obj.tiles[0]))
+
+            if len(xs) == 0:
+                continue
+
+            if tiles is layer.tiles:
+                tiles = tiles.copy()
+
+            variantTiles = numpy.array([variantSheet.tileId(*variant.tiles[0]) for variantSheet, variant in variants], dtype=tiles.dtype)
+            tiles[xs, ys] = variantTiles[pickVariants(cellHash(scene.variantSeed, xs, ys, layerIndex), weights)]
+
+        return tiles
+
+    def exportTilesets(self, data):
+        data['tilesets'] = [{
+            'spriteSheet': filePath,
+            'spriteFile': spriteSheet.spriteFile,
+            'firstTileId': spriteSheet.firstTileId,
+            'columns': spriteSheet.horizontalTiles,
+            'tileCount': spriteSheet.horizontalTiles * spriteSheet.verticalTiles,
+            'tileWidth': spriteSheet.tileWidth,
+            'tileHeight': spriteSheet.tileHeight
+        } for filePath, spriteSheet in zip(self.scene.spriteSheetFiles, self.scene.spriteSheets)]
+
+    def exportLayers(self, data):
+        # regions are written per chunk by exportRegions instead
+        data['layers'] = []
+
+        for layer, tiles in zip(self.scene.layers, self.layerTiles):
+            layerData = layer.asdict()
+            layerData.pop('regions', None)
+
+            if tiles is not layer.tiles:
+                layerData['tiles'] = sparseCells(tiles)
+
+            data['layers'].append(layerData)
+
+    def exportObjects(self, data):
+        scene = self.scene
+        records = self.instances
+
+        data['objects'] = {
+            'types': [{
+                'tileset': scene.spriteSheets.index(spriteSheet),
+                'key': obj.key,
+                'name': obj.name,
+                'type': obj.objType,
+                'tiles': [spriteSheet.tileId(*tile) for tile in obj.tiles],
+                'originMode': int(obj.originMode),
+                'renderTiles': obj.renderTiles,
+                'width': int(width) * scene.tileWidth,
+                'height': int(height) * scene.tileHeight
+            } for (spriteSheet, obj), (width, height) in zip(scene.mapObjects, scene.objectSizes)],
+            # [type, x, y, layer] with x, y the top left corner in map pixels
+            'instances': numpy.stack([records['object'], records['x'] * scene.tileWidth,
+                                      records['y'] * scene.tileHeight, records['layer']], axis=1).tolist()
+        }
+
+        for (spriteSheet, obj), entry in zip(scene.mapObjects, data['objects']['types']):
+            if obj.extraProperties:
+                entry['properties'] = obj.extraProperties
+
+        # animated objects list the tile ids of each frame, tiles placed on layers animate the same way
+        for animation, objectId, _, frameIds in scene.animations:
+            durations = numpy.diff(animation.ends, prepend=0)
+            data['objects']['types'][objectId]['frames'] = [{'tiles': tiles.tolist(), 'duration': int(duration)}
+                                                            for tiles, duration in zip(frameIds, durations)]
+
+    def collisionLookups(self):
+        scene = self.scene
+        solidTiles = numpy.zeros(len(scene.tileObjects), dtype=bool)
+        anchorTiles = numpy.zeros(len(scene.tileObjects), dtype=bool)
+
+        for tileId, entry in enumerate(scene.tileObjects):
+            if entry is None:
+                continue
+
+            spriteSheet, obj = entry
+
+            if not obj.hasCollision or obj.hitBox is None:
+                continue
+
+            if obj.hitBox.isFullTile():
+                solidTiles[tileId] = True
+            elif spriteSheet.tileId(*obj.tiles[0]) == tileId:
+                # shapes are emitted once per placed object, from its first tile
+                anchorTiles[tileId] = True
+
+        return solidTiles, anchorTiles
+
+    def hitBoxShape(self, hitBox, spriteSheet, left, top, layerIndex):
+        scaleX = self.scene.tileWidth / spriteSheet.tileWidth
+        scaleY = self.scene.tileHeight / spriteSheet.tileHeight
+
+        shape = {
+            'type': HitBoxType(hitBox.hitBoxType).name.lower(),
+            'layer': layerIndex,
+            'x': left + hitBox.x * scaleX,
+            'y': top + hitBox.y * scaleY,
+            'width': hitBox.width * scaleX,
+            'height': hitBox.height * scaleY
+        }
+
+        if hitBox.hitBoxType == HitBoxType.POLYGON and hitBox.shape:
+            points = [[shape['x'] + point[0] * scaleX, shape['y'] + point[1] * scaleY] for point in hitBox.shape]
+            xs = [point[0] for point in points]
+            ys = [point[1] for point in points]
+
+            shape['points'] = points
+            shape['x'], shape['y'] = min(xs), min(ys)
+            shape['width'], shape['height'] = max(xs) - min(xs), max(ys) - min(ys)
+
+        return shape
+
+    def collisionShapes(self, lookups, layerTiles, x0, y0, instances):
+        """
+        Collision shapes of windows of the layers' tiles whose top left is cell
+        x0, y0, and of the given placed instances, in map pixels.
+        """
+        scene = self.scene
+        tileWidth = scene.tileWidth
+        tileHeight = scene.tileHeight
+        solidTiles, anchorTiles = lookups
+        shapes = []
+
+        for layerIndex, tiles in enumerate(layerTiles):
+            # solid tiles collapse into as few rects as possible
+            for x, y, width, height in mergeRects(solidTiles[tiles]):
+                shapes.append({
+                    'type': 'rect',
+                    'layer': layerIndex,
+                    'x': (x0 + x) * tileWidth,
+                    'y': (y0 + y) * tileHeight,
+                    'width': width * tileWidth,
+                    'height': height * tileHeight
+                })
+
+            for x, y in zip(*numpy.nonzero(anchorTiles[tiles])):
+                spriteSheet, obj = scene.tileObjects[tiles[x, y]]
+                left, top, _, _ = obj.bounds()
+
+                # world position of the object's top left tile
+                originX = (x0 + int(x) - (obj.tiles[0][0] - left)) * tileWidth
+                originY = (y0 + int(y) - (obj.tiles[0][1] - top)) * tileHeight
+
+                shapes.append(self.hitBoxShape(obj.hitBox, spriteSheet, originX, originY, layerIndex))
+
+        for objectId, x, y, layerIndex in instances:
+            spriteSheet, obj = scene.mapObjects[objectId]
+
+            if not obj.hasCollision or obj.hitBox is None:
+                continue
+
+            if obj.hitBox.isFullTile():
+                width, height = scene.objectSizes[objectId]
+
+                shapes.append({
+                    'type': 'rect',
+                    'layer': int(layerIndex),
+                    'x': int(x) * tileWidth,
+                    'y': int(y) * tileHeight,
+                    'width': int(width) * tileWidth,
+                    'height': int(height) * tileHeight
+                })
+            else:
+                shapes.append(self.hitBoxShape(obj.hitBox, spriteSheet, int(x) * tileWidth, int(y) * tileHeight, int(layerIndex)))
+
+        return shapes
+
+    def bakeCollision(self, data):
+        scene = self.scene
+        tileWidth = scene.tileWidth
+        tileHeight = scene.tileHeight
+        shapes = self.collisionShapes(self.collisionLookups(), self.layerTiles, 0, 0, self.instances)
+
+        boxes = [(shape['x'], shape['y'], shape['x'] + shape['width'], shape['y'] + shape['height']) for shape in shapes]
+        grid = UniformGrid.build(boxes, COLLISION_GRID_TILES * tileWidth, scene.rows * tileWidth, scene.cols * tileHeight)
+
+        data['collision'] = {
+            'shapes': shapes,
+            'grid': grid.asdict()
+        }
+
+    def exportNavigation(self, data):
+        navigation = self.scene.navigation
+        regions = navigation.updateRegions()
+
+        data['navigation'] = {
+            'regionCount': navigation.regionCount,
+            'regions': encodeRuns(regions)
+        }
+
+    def exportRegions(self, data):
+        scene = self.scene
+        chunkWidth = REGION_CHUNK_TILES * scene.tileWidth
+        chunkHeight = REGION_CHUNK_TILES * scene.tileHeight
+        layers = []
+
+        for layerIndex, layer in enumerate(scene.layers):
+            if layer.layerType != MapLayerType.LOGIC:
+                continue
+
+            chunks = {}
+
+            for regionId in sorted(layer.regions):
+                region = layer.regions[regionId]
+                x0, y0, x1, y1 = region.rect()
+                regionData = region.asdict()
+
+                # a region is written into every chunk it overlaps so chunks stream on their own
+                for chunkX in range(int(x0 // chunkWidth), max(int(numpy.ceil(x1 / chunkWidth)), int(x0 // chunkWidth) + 1)):
+                    for chunkY in range(int(y0 // chunkHeight), max(int(numpy.ceil(y1 / chunkHeight)), int(y0 // chunkHeight) + 1)):
+                        chunks.setdefault(f"{chunkX},{chunkY}", []).append(regionData)
+
+            layers.append({
+                'layer': layerIndex,
+                'name': layer.name,
+                'chunks': chunks
+            })
+
+        data['regions'] = {
+            'chunkWidth': chunkWidth,
+            'chunkHeight': chunkHeight,
+            'layers': layers
+        }
+
+# Export profile for the game runtime. Tile layers are baked into render batches
+# instead of cell lists: per layer and chunk, the quads that actually draw grouped
+# by tileset, so each batch is one texture bind and one draw call. Batches hold
+# interleaved float32 x, y, u, v vertices, four per quad, or sprite lists of
+# [x, y, sourceX, sourceY] when vertexBuffers is off. Chunks draw their fills,
+# then their tiles, then their objects.
+class RuntimeMapExporter(MapExporter):
+    def __init__(self, scene, vertexBuffers = True):
+        super().__init__(scene)
+
+        self.suffix = '.runtime.json'
+        self.vertexBuffers = vertexBuffers
+        self.stages[self.stages.index(self.exportLayers)] = self.bakeRenderBatches
+
+    def tileLookups(self):
+        # per tile id: tileset, column and row in its sheet, and whether it draws anything
+        scene = self.scene
+        count = len(scene.tileObjects)
+        tilesets = numpy.full(count, -1, dtype=numpy.int32)
+        columns = numpy.zeros(count, dtype=numpy.int32)
+        rows = numpy.zeros(count, dtype=numpy.int32)
+        visible = numpy.zeros(count, dtype=bool)
+
+        for index, spriteSheet in enumerate(scene.spriteSheets):
+            first = spriteSheet.firstTileId
+            ids = numpy.arange(spriteSheet.horizontalTiles * spriteSheet.verticalTiles)
+
+            tilesets[first:first + len(ids)] = index
+            columns[first:first + len(ids)] = ids % spriteSheet.horizontalTiles
+            rows[first:first + len(ids)] = ids // spriteSheet.horizontalTiles
+            # ids run along x first, emptyTiles is indexed [x, y]
+            visible[first:first + len(ids)] = ~spriteSheet.emptyTiles.T.reshape(-1)
+
+        # placeholders are only there to be seen in the editor
+        for tileId, entry in enumerate(scene.tileObjects):
+            if entry is not None and not entry[1].renderTiles:
+                visible[tileId] = False
+
+        return tilesets, columns, rows, visible
+
+    def objectTiles(self, visible):
+        # the drawn tiles of every object type as flat (dx, dy, tile id) offsets from its top left,
+        # type i owns entries starts[i]:starts[i] + counts[i]
+        offsets = []
+        counts = numpy.zeros(len(self.scene.mapObjects), dtype=numpy.int64)
+
+        for objectId, (spriteSheet, obj) in enumerate(self.scene.mapObjects):
+            if not obj.renderTiles:
+                continue
+
+            left, top, _, _ = obj.bounds()
+            tiles = [(x - left, y - top, spriteSheet.tileId(x, y)) for x, y in obj.tiles if visible[spriteSheet.tileId(x, y)]]
+
+            offsets.extend(tiles)
+            counts[objectId] = len(tiles)
+
+        offsets = numpy.array(offsets, dtype=numpy.int64).reshape(-1, 3)
+
+        return offsets, numpy.cumsum(counts) - counts, counts
+
+    def instanceTiles(self, layerIndex, objectTiles):
+        # every drawn tile of the layer's objects, lower objects after the ones above them
+        # like the editor draws them. Objects are batched in the chunk of their top left cell
+        scene = self.scene
+        offsets, starts, counts = objectTiles
+        records = self.instances[self.instances['layer'] == layerIndex]
+        bottoms = records['y'] + scene.objectSizes[records['object'], 1]
+        records = records[numpy.lexsort((records['x'], bottoms))]
+
+        perRecord = counts[records['object']]
+        which = numpy.repeat(numpy.arange(len(records)), perRecord)
+        entries = numpy.repeat(starts[records['object']], perRecord) + numpy.arange(perRecord.sum()) - numpy.repeat(numpy.cumsum(perRecord) - perRecord, perRecord)
+
+        anchorXs = records['x'][which].astype(numpy.int64)
+        anchorYs = records['y'][which].astype(numpy.int64)
+
+        return anchorXs + offsets[entries, 0], anchorYs + offsets[entries, 1], offsets[entries, 2], anchorXs, anchorYs
+
+    def batchData(self, spriteSheet, xs, ys, columns, rows):
+        scene = self.scene
+        left = xs * scene.tileWidth
+        top = ys * scene.tileHeight
+        sourceX = columns * spriteSheet.tileWidth
+        sourceY = rows * spriteSheet.tileHeight
+
+        if not self.vertexBuffers:
+            return {'sprites': numpy.stack([left, top, sourceX, sourceY], axis=1).tolist()}
+
+        # corners clockwise from the top left, drawn as triangles 0 1 2 and 2 3 0
+        cornersX = numpy.array([0, 1, 1, 0])
+        cornersY = numpy.array([0, 0, 1, 1])
+        quads = numpy.empty((len(xs), 4, 4), dtype='<f4')
+
+        quads[:, :, 0] = left[:, None] + cornersX * scene.tileWidth
+        quads[:, :, 1] = top[:, None] + cornersY * scene.tileHeight
+        quads[:, :, 2] = numpy.minimum(sourceX[:, None] + cornersX * spriteSheet.tileWidth, spriteSheet.width) / spriteSheet.width
+        quads[:, :, 3] = numpy.minimum(sourceY[:, None] + cornersY * spriteSheet.tileHeight, spriteSheet.height) / spriteSheet.height
+
+        return {'vertices': base64.b64encode(quads.tobytes()).decode('ascii')}
+
+    def addBatches(self, chunks, kind, xs, ys, tileIds, anchorXs, anchorYs, lookups):
+        scene = self.scene
+        tilesets, columns, rows, _ = lookups
+        chunkXs = anchorXs // RENDER_CHUNK_TILES
+        chunkYs = anchorYs // RENDER_CHUNK_TILES
+        chunksDown = -(-scene.cols // RENDER_CHUNK_TILES)
+
+        # a stable sort keeps the draw order within each batch
+        keys = (chunkXs * chunksDown + chunkYs) * len(scene.spriteSheets) + tilesets[tileIds]
+        order = numpy.argsort(keys, kind='stable')
+        bounds = numpy.flatnonzero(numpy.diff(keys[order])) + 1
+
+        for batch in numpy.split(order, bounds) if len(order) else []:
+            first = batch[0]
+            tileset = int(tilesets[tileIds[first]])
+            batchTiles = tileIds[batch]
+
+            entry = {'tileset': tileset, 'count': len(batch)}
+            entry.update(self.batchData(scene.spriteSheets[tileset], xs[batch], ys[batch], columns[batchTiles], rows[batchTiles]))
+
+            chunks.setdefault((int(chunkXs[first]), int(chunkYs[first])), {}).setdefault(kind, []).append(entry)
+
+    def addFills(self, chunks, fills):
+        # merged same colour rects as [x, y, width, height, 0xRRGGBBAA] in map pixels
+        scene = self.scene
+        xs, ys = numpy.nonzero(fills)
+
+        for chunkX, chunkY in sorted(set(zip((xs // RENDER_CHUNK_TILES).tolist(), (ys // RENDER_CHUNK_TILES).tolist()))):
+            x0, y0 = chunkX * RENDER_CHUNK_TILES, chunkY * RENDER_CHUNK_TILES
+            window = fills[x0:x0 + RENDER_CHUNK_TILES, y0:y0 + RENDER_CHUNK_TILES]
+            rects = []
+
+            for value in numpy.unique(window[window > 0]):
+                for x, y, width, height in mergeRects(window == value):
+                    rects.append([(x0 + x) * scene.tileWidth, (y0 + y) * scene.tileHeight,
+                                  width * scene.tileWidth, height * scene.tileHeight, int(value)])
+
+            chunks.setdefault((chunkX, chunkY), {})['fills'] = rects
+
+    def bakeRenderBatches(self, data):
+        scene = self.scene
+        lookups = self.tileLookups()
+        objectTiles = self.objectTiles(lookups[3])
+        layers = []
+
+        for layerIndex, (layer, tiles) in enumerate(zip(scene.layers, self.layerTiles)):
+            if layer.layerType != MapLayerType.TILES:
+                continue
+
+            # only chunks with something to draw are written
+            chunks = {}
+
+            if layer.fills is not None:
+                self.addFills(chunks, layer.fills)
+
+            xs, ys = numpy.nonzero(lookups[3][tiles])
+            self.addBatches(chunks, 'tiles', xs, ys, tiles[xs, ys], xs, ys, lookups)
+            self.addBatches(chunks, 'objects', *self.instanceTiles(layerIndex, objectTiles), lookups)
+
+            layers.append({
+                'layer': layerIndex,
+                'name': layer.name,
+                'chunks': {f"{chunkX},{chunkY}": chunks[(chunkX, chunkY)] for chunkX, chunkY in sorted(chunks)}
+            })
+
+        data['render'] = {
+            'chunkWidth': RENDER_CHUNK_TILES * scene.tileWidth,
+            'chunkHeight': RENDER_CHUNK_TILES * scene.tileHeight,
+            'format': 'vertices' if self.vertexBuffers else 'sprites',
+            'layers': layers
+        }
+
+# Export profile for open world streaming. The map is split into fixed size
+# regions, each written to its own file as one compact json document per
+# section, back to back. A manifest lists every region with anything in it,
+# the area its contents cover and the byte offset and length of each section,
+# so the game can load the regions around the player and read only the
+# sections it needs. Regions are fingerprinted from their source cells, so
+# exporting again only rewrites the files of regions that changed.
+class StreamingMapExporter(MapExporter):
+    def __init__(self, scene):
+        super().__init__(scene)
+
+        self.suffix = '.stream'
+
+    def exportFile(self, fileName):
+        scene = self.scene
+        directory = splitext(fileName)[0] + self.suffix
+        manifestFileName = os.path.join(directory, 'manifest.json')
+        os.makedirs(directory, exist_ok=True)
+
+        previous = self.previousRegions(manifestFileName)
+
+        self.variants = self.variantTable()
+        self.instances = self.resolveInstances()
+        self.layerTiles = [self.resolveTiles(layerIndex, layer) for layerIndex, layer in enumerate(scene.layers)]
+
+        manifest = {
+            'name': scene.name,
+            'type': 'mapStream',
+            'tileWidth': scene.tileWidth,
+            'tileHeight': scene.tileHeight,
+            'width': scene.rows,
+            'height': scene.cols,
+            'regionWidth': STREAM_REGION_TILES * scene.tileWidth,
+            'regionHeight': STREAM_REGION_TILES * scene.tileHeight,
+            'layers': [{'name': layer.name, 'layerType': int(layer.layerType)} for layer in scene.layers]
+        }
+
+        self.exportTilesets(manifest)
+        self.exportObjects(manifest)
+        # placed objects are written with their region
+        del manifest['objects']['instances']
+
+        # anything every region depends on, a change here rewrites them all
+        hitBoxes = [obj.hitBox.asdict() if obj.hasCollision and obj.hitBox else None for _, obj in scene.mapObjects]
+        baseHash = hashlib.blake2b(json.dumps([manifest, hitBoxes, scene.variantSeed, STREAM_REGION_TILES]).encode('utf-8'), digest_size=16)
+
+        lookups = self.collisionLookups()
+        regionInstances = self.regionInstances()
+        regionTriggers = self.regionTriggers()
+        regions = []
+
+        for regionX in range(-(-scene.rows // STREAM_REGION_TILES)):
+            for regionY in range(-(-scene.cols // STREAM_REGION_TILES)):
+                instances = regionInstances.get((regionX, regionY))
+                triggers = regionTriggers.get((regionX, regionY), [])
+
+                if instances is None and not triggers and self.regionIsEmpty(regionX, regionY):
+                    continue
+
+                instances = instances if instances is not None else numpy.zeros(0, dtype=self.instances.dtype)
+                regionFileName = f"{regionX}_{regionY}.json"
+                fingerprint = self.regionFingerprint(baseHash.copy(), regionX, regionY, instances, triggers)
+                entry = previous.get(regionFileName)
+
+                if entry is None or entry.get('fingerprint') != fingerprint or not os.path.exists(os.path.join(directory, regionFileName)):
+                    entry = self.writeRegion(os.path.join(directory, regionFileName), regionX, regionY, lookups, instances, triggers)
+                    entry['fingerprint'] = fingerprint
+
+                regions.append(entry)
+
+        # regions that have since been emptied
+        for regionFileName in set(previous) - {entry['file'] for entry in regions}:
+            if os.path.exists(os.path.join(directory, regionFileName)):
+                os.remove(os.path.join(directory, regionFileName))
+
+        manifest['regions'] = regions
+        writeFileAtomic(manifestFileName, json.dumps(manifest, separators=(',', ':')))
+
+        return manifestFileName
+
+    def previousRegions(self, manifestFileName):
+        # region file -> manifest entry of the last export
+        try:
+            with open(manifestFileName) as file:
+                return {entry['file']: entry for entry in json.load(file)['regions']}
+        except (OSError, ValueError, KeyError):
+            return {}
+
+    def regionCells(self, regionX, regionY):
+        x0, y0 = regionX * STREAM_REGION_TILES, regionY * STREAM_REGION_TILES
+
+        return x0, y0, min(x0 + STREAM_REGION_TILES, self.scene.rows), min(y0 + STREAM_REGION_TILES, self.scene.cols)
+
+    def regionIsEmpty(self, regionX, regionY):
+        x0, y0, x1, y1 = self.regionCells(regionX, regionY)
+
+        for layer, tiles in zip(self.scene.layers, self.layerTiles):
+            if tiles[x0:x1, y0:y1].any() or (layer.fills is not None and layer.fills[x0:x1, y0:y1].any()):
+                return False
+
+        return True
+
+    def regionInstances(self):
+        # (regionX, regionY) -> the placed objects whose top left cell is in it
+        records = self.instances
+        regionXs = records['x'] // STREAM_REGION_TILES
+        regionYs = records['y'] // STREAM_REGION_TILES
+        keys = regionXs.astype(numpy.int64) * (-(-self.scene.cols // STREAM_REGION_TILES)) + regionYs
+        order = numpy.argsort(keys, kind='stable')
+        bounds = numpy.flatnonzero(numpy.diff(keys[order])) + 1
+
+        return {(int(regionXs[group[0]]), int(regionYs[group[0]])): records[group]
+                for group in (numpy.split(order, bounds) if len(order) else [])}
+
+    def regionTriggers(self):
+        # (regionX, regionY) -> [(layer index, region)] of the logic regions overlapping it
+        scene = self.scene
+        regionWidth = STREAM_REGION_TILES * scene.tileWidth
+        regionHeight = STREAM_REGION_TILES * scene.tileHeight
+        triggers = {}
+
+        for layerIndex, layer in enumerate(scene.layers):
+            if layer.layerType != MapLayerType.LOGIC:
+                continue
+
+            for regionId in sorted(layer.regions):
+                region = layer.regions[regionId]
+                x0, y0, x1, y1 = region.rect()
+
+                for regionX in range(int(x0 // regionWidth), max(int(numpy.ceil(x1 / regionWidth)), int(x0 // regionWidth) + 1)):
+                    for regionY in range(int(y0 // regionHeight), max(int(numpy.ceil(y1 / regionHeight)), int(y0 // regionHeight) + 1)):
+                        triggers.setdefault((regionX, regionY), []).append((layerIndex, region))
+
+        return triggers
+
+    def regionFingerprint(self, hasher, regionX, regionY, instances, triggers):
+        # hashes what the region is made from rather than what is written, which is much cheaper
+        x0, y0, x1, y1 = self.regionCells(regionX, regionY)
+
+        for layer in self.scene.layers:
+            hasher.update(numpy.ascontiguousarray(layer.tiles[x0:x1, y0:y1]).tobytes())
+
+            if layer.fills is not None:
+                hasher.update(numpy.ascontiguousarray(layer.fills[x0:x1, y0:y1]).tobytes())
+
+        hasher.update(numpy.ascontiguousarray(instances).tobytes())
+        hasher.update(json.dumps([[layerIndex, region.asdict()] for layerIndex, region in triggers]).encode('utf-8'))
+
+        return hasher.hexdigest()
+
+    def writeRegion(self, fileName, regionX, regionY, lookups, instances, triggers):
+        scene = self.scene
+        x0, y0, x1, y1 = self.regionCells(regionX, regionY)
+        tiles = []
+        triggerLayers = {}
+
+        for layerIndex, (layer, layerTiles) in enumerate(zip(scene.layers, self.layerTiles)):
+            window = layerTiles[x0:x1, y0:y1]
+            fills = layer.fills[x0:x1, y0:y1] if layer.fills is not None else None
+
+            if layer.layerType == MapLayerType.TILES and (window.any() or (fills is not None and fills.any())):
+                tiles.append({
+                    'layer': layerIndex,
+                    'tiles': sparseCells(window, x0, y0),
+                    'fills': encodeRuns(fills, x0, y0) if fills is not None else []
+                })
+
+        for layerIndex, region in triggers:
+            triggerLayers.setdefault(layerIndex, []).append(region.asdict())
+
+        sections = {
+            'tiles': tiles,
+            # [type, x, y, layer] with x, y the top left corner in map pixels, like the full export
+            'objects': numpy.stack([instances['object'], instances['x'] * scene.tileWidth,
+                                    instances['y'] * scene.tileHeight, instances['layer']], axis=1).tolist(),
+            'collision': self.collisionShapes(lookups, [layerTiles[x0:x1, y0:y1] for layerTiles in self.layerTiles], x0, y0, instances),
+            'triggers': [{'layer': layerIndex, 'regions': regions} for layerIndex, regions in sorted(triggerLayers.items())]
+        }
+
+        # what the region's contents cover, objects and triggers can reach past its edges
+        boxes = [(x0 * scene.tileWidth, y0 * scene.tileHeight, x1 * scene.tileWidth, y1 * scene.tileHeight)]
+        boxes += [(shape['x'], shape['y'], shape['x'] + shape['width'], shape['y'] + shape['height']) for shape in sections['collision']]
+        boxes += [region.rect() for _, region in triggers]
+
+        if len(instances):
+            sizes = scene.objectSizes[instances['object']]
+            boxes.append((int(instances['x'].min()) * scene.tileWidth, int(instances['y'].min()) * scene.tileHeight,
+                          int((instances['x'] + sizes[:, 0]).max()) * scene.tileWidth, int((instances['y'] + sizes[:, 1]).max()) * scene.tileHeight))
+
+        boxes = numpy.array(boxes, dtype=numpy.float64)
+        entry = {
+            'file': os.path.basename(fileName),
+            'x': regionX,
+            'y': regionY,
+            'bounds': [float(boxes[:, 0].min()), float(boxes[:, 1].min()), float(boxes[:, 2].max()), float(boxes[:, 3].max())],
+            'sections': {}
+        }
+
+        # [offset, length] in bytes of each section's json
+        data = []
+        offset = 0
+
+        for name in STREAM_SECTIONS:
+            text = json.dumps(sections[name], separators=(',', ':')).encode('utf-8') + b'\n'
+            entry['sections'][name] = [offset, len(text) - 1]
+            data.append(text)
+            offset += len(text)
+
+        writeFileAtomic(fileName, b''.join(data))
+
+        return entry
+
+# Export profiles by name, as offered in the File menu
+EXPORT_PROFILES = {
+    'editor': MapExporter,
+    'runtime': RuntimeMapExporter,
+    'stream': StreamingMapExporter
+}
@@ -1,10 +1,74 @@
+import json
 from os.path import basename
-from math import ceil
-from PySide6.QtCore import Qt, QRectF, QPoint, QPointF
-from PySide6.QtGui import QTransform, QPen, QBrush, QColor, QAction, QPixmap
-from PySide6.QtWidgets import QGraphicsScene, QGraphicsView, QGraphicsSceneMouseEvent, QGraphicsPixmapItem
-
-from spritesheetz.objects import SpriteItem, SpriteObject, SpriteObjectOrigin
+from math import ceil, floor
+import numpy
+from PySide6.QtCore import Qt, QRectF, QPoint, QPointF, QMimeData, QByteArray, Signal
+from PySide6.QtGui import QTransform, QPen, QBrush, QColor, QAction, QPixmap, QImageReader, QPainter, QUndoStack, QPainterPath, QPolygonF, QGuiApplication
+from PySide6.QtWidgets import QGraphicsScene, QGraphicsView, QGraphicsSceneMouseEvent, QGraphicsItem, QFileDialog, QMenu
+
+from spritesheetz.objects import SpriteItem, SpriteObject, SpriteObjectOrigin, HitBox, HitBoxType, MapRegion, RegionKind, MapLayerType, ObjectInstances, TerrainRules
+from spritesheetz.tiling import AutoTiler
+from spritesheetz.tools import MapTool, rectangleMask, lineMask, ellipseMask, floodFillMask, orderedRect, clipMask, labelComponents, componentBounds
+from spritesheetz.commands import MapLayerEditCommand, ObjectInstancesEditCommand, SpriteObjectsEditCommand, MapRegionRemoveCommand, MapRegionAddCommand, MapRegionEditCommand
+from spritesheetz.export import EXPORT_PROFILES
+from spritesheetz.navigation import NavigationGrid
+from spritesheetz.spatial import QuadTree, mergeRects
+from spritesheetz.cache import ThumbnailLoader, TileLoader, THUMBNAIL_TILE_SIZE, loadTiles, tilePixmap
+from spritesheetz.mipmaps import MipPixmap, TileGridItem, levelOfDetail, drawMipPixmap
+from spritesheetz.stamps import Stamp, STAMP_CELL, STAMP_MIME_TYPE
+from spritesheetz.animation import Animation, animationClock, visibleRects
+from spritesheetz.minimap import averageColors
+from spritesheetz.saving import SectionCache, SAVE_CHUNK, jsonObject, writeFile, writeFileInBackground, sparseCells, encodeRuns, decodeRuns
+
+# Fill colours are painted and cached in chunks this many cells across
+FILL_CHUNK_TILES = 32
+
+# Fully transparent colours all look the same, they pack to this so that no
+# colour packs to 0, which fills use for no fill
+TRANSPARENT_FILL = 0xFFFFFF00
+
+def packColor(color):
+    if color.alpha() == 0:
+        return TRANSPARENT_FILL
+
+    return (color.red() << 24) | (color.green() << 16) | (color.blue() << 8) | color.alpha()
+
+def unpackColor(value):
+    value = int(value)
+    return QColor((value >> 24) & 255, (value >> 16) & 255, (value >> 8) & 255, value & 255)
+
+def loadTileGrid(filePath, tileWidth, tileHeight, horizontalTiles, verticalTiles):
+    """
+    [x][y] lists of tile MipPixmaps for a sheet, with the tile pixels, hashes
+    and empty flags.
+    """
+    sourceTiles, hashes, empty = loadTiles(filePath, tileWidth, tileHeight, horizontalTiles, verticalTiles)
+
+    return tileGrid(sourceTiles, hashes), sourceTiles, hashes, empty
+
+def tileGrid(sourceTiles, hashes):
+    # tiles with the same content share one pixmap
+    horizontalTiles, verticalTiles = hashes.shape[:2]
+    pixmaps = {}
+    tiles = [[None for col in range(verticalTiles)] for row in range(horizontalTiles)]
+    # one bytes object sliced per tile is far quicker than converting each hash
+    keys = numpy.ascontiguousarray(hashes).tobytes()
+    step = hashes.shape[2]
+
+    for x in range(horizontalTiles):
+        column = tiles[x]
+        offset = x * verticalTiles * step
+
+        for y in range(verticalTiles):
+            key = keys[offset + y * step:offset + (y + 1) * step]
+            pixmap = pixmaps.get(key)
+
+            if pixmap is None:
+                pixmap = pixmaps[key] = MipPixmap(tilePixmap(sourceTiles, x, y))
+
+            column[y] = [pixmap]
+
+    return tiles
 
 class SpriteSheet:
     def __init__(self, name, spriteFile, tileWidth, tileHeight, width, height, objects):
@@ -17,6 +81,9 @@ class SpriteSheet:
         self.objects = objects
 
         self.size = 102
+        # set once added to a map, tile and object ids are unique across the map's sheets
+        self.firstTileId = 0
+        self.firstObjectId = 0
 
         self.gridLines = []
 
@@ -25,40 +92,25 @@ class SpriteSheet:
         self._loadSpriteFile()
 
     def _loadSpriteFile(self):
-        masterPixmap = QPixmap(self.spriteFile)
-        self.masterPixmap = masterPixmap
-
         self.horizontalTiles = ceil(self.width / self.tileWidth)
-        self.verticalTiles = ceil(self.width / self.tileWidth)
-        self.tiles = [[None for col in range(self.verticalTiles)] for row in range(self.horizontalTiles)]
-
-        for x, row in enumerate(range(self.horizontalTiles)):
-            for y, col in enumerate(range(self.verticalTiles)):
-                copy_x = x * self.tileWidth
-                copy_y = y * self.tileHeight
-                # copy + scale
-                pixmap = masterPixmap.copy(copy_x, copy_y, self.tileWidth, self.tileHeight).scaled(self.size - 2, self.size - 2)
-                pixmapItem = QGraphicsPixmapItem(pixmap)
+        self.verticalTiles = ceil(self.height / self.tileHeight)
 
-                # placement
-                x_pos = 1 + (x * (self.size))
-                y_pos = 1 + (y * (self.size))
+        # tiles stay at their native size, views scale them when drawing
+        self.tiles, sourceTiles, self.tileHashes, self.emptyTiles = loadTileGrid(self.spriteFile, self.tileWidth, self.tileHeight,
+                                                                                 self.horizontalTiles, self.verticalTiles)
+        # what each tile looks like from far away, for the map overview
+        self.tileColors = averageColors(sourceTiles)
 
-                pixmapItem.setOffset(x_pos, y_pos)
-                self.tiles[x][y] = [pixmap, pixmapItem]
-                #self.addItem(pixmapItem)
+    def tileId(self, x, y):
+        return self.firstTileId + y * self.horizontalTiles + x
 
     def drawTiles(self, scene):
-        for x, row in enumerate(range(self.horizontalTiles)):
-            for y, col in enumerate(range(self.verticalTiles)):
-                scene.addItem(self.tiles[x][y][1])
+        scene.addItem(TileGridItem(self.tiles, self.size, self.emptyTiles))
 
     def drawGrid(self, scene):
         self.rows = self.horizontalTiles
         self.cols = self.verticalTiles
         
-        endPoint = self.rows * self.size
-
         if len(self.gridLines):
             for line in self.gridLines:
                 self.removeItem(line)
@@ -71,14 +123,14 @@ class SpriteSheet:
 
         #if self.application.showGrid:
         # vertical lines
-        for i in range(0, self.cols + 1):
+        for i in range(0, self.rows + 1):
             x = i * self.size
-            self.gridLines.append(scene.addLine(x, 0, x, endPoint, self.gridPen))
+            self.gridLines.append(scene.addLine(x, 0, x, self.cols * self.size, self.gridPen))
 
         # horizontal lines
-        for i in range(0, self.rows + 1):
+        for i in range(0, self.cols + 1):
             y = i * self.size
-            self.gridLines.append(scene.addLine(0, y, endPoint, y, self.gridPen))
+            self.gridLines.append(scene.addLine(0, y, self.rows * self.size, y, self.gridPen))
 
     @staticmethod
     def fromdict(obj):
@@ -98,6 +150,9 @@ class GraphicsView(QGraphicsView):
         self.setMouseTracking(True)
         self.setAlignment(Qt.AlignTop | Qt.AlignLeft)
 
+    def setDisplayScale(self, scale):
+        self.setTransform(QTransform.fromScale(scale, scale))
+
     def wheelEvent(self, event):
         if self.application.controlHeld:
             """
@@ -136,17 +191,289 @@ class SpriteSheetView(GraphicsView):
         #self.addAction("Test")
 
 class MapLayer:
-    def __init__(self, name, rows, cols):
+    def __init__(self, name, rows, cols, layerType = MapLayerType.TILES):
         self.name = name
         self.rows = rows
         self.cols = cols
-        
-        self.tiles = [[None for col in range(self.cols)] for row in range(self.rows)]
+        self.layerType = layerType
+
+        # logic layers only, region id -> MapRegion
+        self.regions = {}
+        self.regionIndex = None
+        self.nextRegionId = 1
+
+        if layerType == MapLayerType.TILES:
+            # indexed [x, y] like the rest of the grids, 0 is an empty cell
+            self.tiles = numpy.zeros((self.rows, self.cols), dtype=numpy.int32)
+            # index into the map's AutoTiler terrains, 0 is no terrain
+            self.terrain = numpy.zeros((self.rows, self.cols), dtype=numpy.int16)
+        else:
+            # logic layers hold no cells, readers see a read-only zero that takes no memory
+            self.tiles = numpy.broadcast_to(numpy.int32(0), (self.rows, self.cols))
+            self.terrain = numpy.broadcast_to(numpy.int16(0), (self.rows, self.cols))
+        # packed RGBA solid colours, 0 is no fill. Only allocated once something is filled
+        self.fills = None
+
+    def tile(self, x, y):
+        return self.tiles[x, y]
+
+    def dataArrays(self):
+        if self.layerType != MapLayerType.TILES:
+            return {}
+
+        arrays = {
+            'tiles': self.tiles,
+            'terrain': self.terrain
+        }
+
+        if self.fills is not None:
+            arrays['fills'] = self.fills
+
+        return arrays
+
+    def allocateFills(self):
+        if self.fills is None:
+            self.fills = numpy.zeros((self.rows, self.cols), dtype=numpy.uint32)
+
+        return self.fills
+
+    def indexRegions(self, width, height):
+        # width and height are the map's size in map pixels
+        self.regionIndex = QuadTree((0, 0, width, height))
+
+        for region in self.regions.values():
+            self.regionIndex.insert(region.regionId, region.rect())
+
+    def addRegion(self, region):
+        self.regions[region.regionId] = region
+        self.regionIndex.insert(region.regionId, region.rect())
+        self.nextRegionId = max(self.nextRegionId, region.regionId + 1)
+
+    def removeRegion(self, region):
+        del self.regions[region.regionId]
+        self.regionIndex.remove(region.regionId)
+
+    def regionsIn(self, x0, y0, x1, y1):
+        return [self.regions[regionId] for regionId in self.regionIndex.query((x0, y0, x1, y1))]
+
+    def regionAt(self, x, y):
+        # the most recently added region wins where they overlap
+        found = [self.regions[regionId] for regionId in self.regionIndex.queryPoint(x, y)]
+        found = [region for region in found if region.contains(x, y)]
+
+        return max(found, key=lambda region: region.regionId) if found else None
+
+    def asdict(self):
+        # sparse [x, y, value] triples rather than arrays full of zeroes
+        data = {
+            'name': self.name,
+            'layerType': int(self.layerType),
+            'tiles': sparseCells(self.tiles),
+            'terrain': sparseCells(self.terrain)
+        }
+
+        if self.fills is not None and self.fills.any():
+            # fills tend to cover big areas, runs are much smaller than cells
+            data['fills'] = encodeRuns(self.fills)
+
+        if self.layerType == MapLayerType.LOGIC:
+            data['regions'] = [region.asdict() for region in self.regions.values()]
+
+        return data
+
+    @staticmethod
+    def fromdict(obj, rows, cols):
+        layer = MapLayer(obj['name'], rows, cols, MapLayerType(obj.get('layerType', MapLayerType.TILES)))
+
+        for name in layer.dataArrays():
+            cells = numpy.array(obj.get(name, []), dtype=numpy.int64).reshape(-1, 3)
+            getattr(layer, name)[cells[:, 0], cells[:, 1]] = cells[:, 2]
+
+        if obj.get('fills'):
+            decodeRuns(obj['fills'], layer.allocateFills())
+
+        for region in obj.get('regions', []):
+            region = MapRegion.fromdict(region)
+            layer.regions[region.regionId] = region
+            layer.nextRegionId = max(layer.nextRegionId, region.regionId + 1)
+
+        return layer
+
+    def fillKeys(self):
+        # terrain cells compare by terrain so auto-tiled transitions fill as one area
+        keys = numpy.where(self.terrain > 0, -self.terrain.astype(numpy.int64), self.tiles)
+
+        if self.fills is not None:
+            # colours sit above every tile id
+            keys = numpy.where(self.fills > 0, self.fills.astype(numpy.int64) + (1 << 32), keys)
+
+        return keys
+
+# Draws a whole layer from its tile id array, only the exposed cells are painted
+class MapLayerItem(QGraphicsItem):
+    def __init__(self, scene, layer):
+        super().__init__()
+
+        self.mapScene = scene
+        self.layer = layer
+
+        # (chunkX, chunkY) -> [(rect, colour)] of merged same colour fills
+        self.fillChunks = {}
+
+        self.setFlag(QGraphicsItem.ItemUsesExtendedStyleOption)
+        self.setZValue(-1)
+
+    def boundingRect(self):
+        size = self.mapScene.size
+        return QRectF(0, 0, self.layer.rows * size, self.layer.cols * size)
+
+    def invalidateCells(self, x0, y0, x1, y1):
+        size = self.mapScene.size
+
+        for chunkX in range(x0 // FILL_CHUNK_TILES, (x1 - 1) // FILL_CHUNK_TILES + 1):
+            for chunkY in range(y0 // FILL_CHUNK_TILES, (y1 - 1) // FILL_CHUNK_TILES + 1):
+                self.fillChunks.pop((chunkX, chunkY), None)
+
+        self.update(QRectF(x0 * size, y0 * size, (x1 - x0) * size, (y1 - y0) * size))
+
+    def fillChunk(self, chunkX, chunkY):
+        rects = self.fillChunks.get((chunkX, chunkY))
+
+        if rects is None:
+            size = self.mapScene.size
+            x0, y0 = chunkX * FILL_CHUNK_TILES, chunkY * FILL_CHUNK_TILES
+            window = self.layer.fills[x0:x0 + FILL_CHUNK_TILES, y0:y0 + FILL_CHUNK_TILES]
+            rects = []
+
+            for value in numpy.unique(window[window > 0]):
+                color = unpackColor(value)
+
+                for x, y, width, height in mergeRects(window == value):
+                    rects.append((QRectF((x0 + x) * size + 1, (y0 + y) * size + 1, width * size - 2, height * size - 2), color))
+
+            self.fillChunks[(chunkX, chunkY)] = rects
 
-    def tile(x, y):
-        return self.tiles[x][y]
+        return rects
+
+    def paintFills(self, painter, x0, y0, x1, y1):
+        for chunkX in range(x0 // FILL_CHUNK_TILES, (x1 - 1) // FILL_CHUNK_TILES + 1):
+            for chunkY in range(y0 // FILL_CHUNK_TILES, (y1 - 1) // FILL_CHUNK_TILES + 1):
+                for rect, color in self.fillChunk(chunkX, chunkY):
+                    painter.fillRect(rect, color)
+
+    def paint(self, painter, option, widget = None):
+        size = self.mapScene.size
+        exposed = option.exposedRect
+
+        x0 = max(int(floor(exposed.left() / size)), 0)
+        y0 = max(int(floor(exposed.top() / size)), 0)
+        x1 = min(int(ceil(exposed.right() / size)), self.layer.rows)
+        y1 = min(int(ceil(exposed.bottom() / size)), self.layer.cols)
+
+        if x0 >= x1 or y0 >= y1:
+            return
+
+        if self.layer.fills is not None:
+            self.paintFills(painter, x0, y0, x1, y1)
+
+        # animated tiles draw whichever frame is showing
+        window = self.mapScene.tileFrames[self.layer.tiles[x0:x1, y0:y1]]
+        pixmaps = self.mapScene.tilePixmaps
+        detail = levelOfDetail(painter)
+
+        painter.setRenderHint(QPainter.SmoothPixmapTransform, False)
+
+        for x, y in zip(*numpy.nonzero(window)):
+            mip = pixmaps[window[x, y]]
+
+            if mip is not None:
+                drawMipPixmap(painter, QRectF((x0 + x) * size + 1, (y0 + y) * size + 1, size - 2, size - 2), mip, detail)
+
+        self.paintInstances(painter, x0, y0, x1, y1, detail)
+
+    def paintInstances(self, painter, x0, y0, x1, y1, detail):
+        scene = self.mapScene
+        size = scene.size
+        indices = scene.instances.inRect(scene.objectSizes, x0, y0, x1, y1, scene.layers.index(self.layer))
+
+        if len(indices) == 0:
+            return
+
+        records = scene.instances.view()[indices]
+        # lower objects overlap the ones above them
+        bottoms = records['y'] + scene.objectSizes[records['object'], 1]
+
+        for record in records[numpy.lexsort((records['x'], bottoms))]:
+            width, height = scene.objectSizes[record['object']]
+            rect = QRectF(record['x'] * size + 1, record['y'] * size + 1, width * size - 2, height * size - 2)
+
+            drawMipPixmap(painter, rect, scene.objectPixmap(record['object']), detail)
+
+# Draws the regions of a logic layer, looked up through the layer's quadtree
+class MapLogicLayerItem(QGraphicsItem):
+    def __init__(self, scene, layer):
+        super().__init__()
+
+        self.mapScene = scene
+        self.layer = layer
+
+        self.pens = {
+            RegionKind.TRIGGER: QPen(QColor(255, 128, 0), 0),
+            RegionKind.SPAWN: QPen(QColor(0, 160, 0), 0),
+            RegionKind.CUSTOM: QPen(QColor(128, 0, 255), 0)
+        }
+        self.brushes = {kind: QBrush(QColor(pen.color().red(), pen.color().green(), pen.color().blue(), 50)) for kind, pen in self.pens.items()}
+        self.highlightBrush = QBrush(QColor(255, 255, 0, 90))
+        self.selectedPen = QPen(Qt.red, 0, Qt.DashLine)
+
+        self.setFlag(QGraphicsItem.ItemUsesExtendedStyleOption)
+        self.setZValue(10)
+
+    def boundingRect(self):
+        size = self.mapScene.size
+        return QRectF(0, 0, self.layer.rows * size, self.layer.cols * size)
+
+    def invalidateRegion(self, region):
+        scaleX, scaleY = self.mapScene.worldScale()
+        x0, y0, x1, y1 = region.rect()
+
+        self.update(QRectF(x0 * scaleX - 1, y0 * scaleY - 1, (x1 - x0) * scaleX + 2, (y1 - y0) * scaleY + 2))
+
+    def paint(self, painter, option, widget = None):
+        scene = self.mapScene
+        scaleX, scaleY = scene.worldScale()
+        exposed = option.exposedRect
+
+        regions = self.layer.regionsIn(exposed.left() / scaleX, exposed.top() / scaleY,
+                                       exposed.right() / scaleX, exposed.bottom() / scaleY)
+
+        painter.save()
+        painter.scale(scaleX, scaleY)
+
+        for region in regions:
+            if region is scene.selectedRegion:
+                painter.setPen(self.selectedPen)
+            else:
+                painter.setPen(self.pens[region.kind])
+
+            painter.setBrush(self.highlightBrush if region is scene.hoveredRegion else self.brushes[region.kind])
+            painter.drawPath(region.path())
+
+        painter.restore()
 
 class MapScene(QGraphicsScene):
+    regionSelected = Signal(object)
+    # layer index and cell rect of every change, for views of the map kept outside the scene
+    cellsDirty = Signal(int, int, int, int, int)
+    # the map's size, layers or sheets changed, everything needs redrawing
+    mapReset = Signal()
+    # whether there are changes since the map was loaded or saved
+    modifiedChanged = Signal(bool)
+    # something outside the layer cells changed, like layers, regions or names
+    mapEdited = Signal()
+    # a save has been written to the map's file
+    mapSaved = Signal()
+
     def __init__(self, application):
         super().__init__()
 
@@ -162,9 +489,61 @@ class MapScene(QGraphicsScene):
         self.gridLines = []
         self.spriteSheets = []
         self.spriteSheetFiles = []
-        self.layers = [ MapLayer('ground', 50, 50) ]
+        self.fileName = ""
+
+        self.rows = 50
+        self.cols = 50
+        self.size = 102 # extra 1 either side for borders
+        self.tileWidth = application.gridWidth
+        self.tileHeight = application.gridHeight
+
+        self.layers = [ MapLayer('ground', self.rows, self.cols) ]
         self.currentLayerIndex = 0
 
+        self.placementObject = None
+        self.placementTiles = None
+        self.placementFill = None
+        self.placementStamp = None
+        self.spriteSheet = None
+
+        # tile id -> MipPixmap at the sheet's native tile size, id 0 is the empty cell
+        self.tilePixmaps = [None]
+        # tile id -> (spriteSheet, obj) for tiles grouped into an object
+        self.tileObjects = [None]
+        # object id -> (spriteSheet, obj) and its size in cells, for placed instances
+        self.mapObjects = []
+        self.objectSizes = numpy.zeros((0, 2), dtype=numpy.int32)
+        # one native size composite MipPixmap per object and frame shared by all of its instances
+        self.objectPixmaps = {}
+        # tile id -> tile id drawn for it, animated tiles point at their current frame
+        self.tileFrames = numpy.zeros(1, dtype=numpy.int32)
+        # (animation, object id, tile ids, frame tile ids per frame) for each animated object
+        self.animations = []
+        # object id -> frame showing, for animated objects
+        self.objectFrames = {}
+        self.instances = ObjectInstances()
+        # picks object variants at export, the same seed always exports the same map
+        self.variantSeed = 0
+        self.autoTiler = AutoTiler()
+
+        self.tool = MapTool.BRUSH
+        self.toolStart = None
+        # (x0, y0, x1, y1) cells picked with the select tool
+        self.selection = None
+        # stamp positions already written by the current brush stroke
+        self.stampOrigin = (0, 0)
+        self.stampedCells = set()
+        self.editSnapshot = None
+        self.undoStack = QUndoStack(self)
+
+        self.navigation = NavigationGrid(self.rows, self.cols)
+        self._blockingTiles = None
+        self.pathStart = None
+
+        self.hoveredRegion = None
+        self.selectedRegion = None
+        self.regionPoints = []
+
         self.name = "Untitled map"
 
         #rect = self.addRect(QRectF(0, 0, 100, 100), gridOutline, QBrush(Qt.green))
@@ -179,19 +558,857 @@ class MapScene(QGraphicsScene):
         self.gridTurtle = self.addRect(QRectF(0, 0, self.size, self.size), QPen(Qt.blue, 0), QBrush(QColor(0,0,255, 75)))
         self.gridTurtle.setZValue(100) #always on top
 
+        self.toolPreview = self.addRect(QRectF(), QPen(Qt.blue, 0, Qt.DashLine), QBrush(QColor(0,0,255, 40)))
+        self.toolPreview.setZValue(99)
+        self.toolPreview.hide()
+
+        self.pathPreview = self.addPath(QPainterPath(), QPen(Qt.red, 3))
+        self.pathPreview.setZValue(98)
+
+        self.regionPreview = self.addPath(QPainterPath(), QPen(Qt.red, 0, Qt.DashLine), QBrush(QColor(255, 0, 0, 40)))
+        self.regionPreview.setZValue(98)
+        self.regionPreview.hide()
+
+        self.selectionItem = self.addRect(QRectF(), QPen(Qt.darkGreen, 0, Qt.DashLine), QBrush(QColor(0, 128, 0, 40)))
+        self.selectionItem.setZValue(99)
+        self.selectionItem.hide()
+
+        # serialized text of the map's sections from the last save
+        self.saveCache = SectionCache()
+        self.modified = False
+        self.changeCount = 0
+        self.mapReset.connect(self.saveCache.clear)
+        self.mapReset.connect(lambda: self.setModified())
+
+        self.layerItems = []
+        self.setLayers(self.layers)
+        self.modified = False
+
+    def setModified(self, modified = True):
+        if modified:
+            # background saves compare against this to tell whether they're still current
+            self.changeCount += 1
+
+        if modified != self.modified:
+            self.modified = modified
+            self.modifiedChanged.emit(modified)
+
+    def mapChanged(self):
+        self.setModified()
+        self.mapEdited.emit()
+
+    def setLayers(self, layers):
+        for layerItem in self.layerItems:
+            self.removeItem(layerItem)
+
+        self.layers = layers
+        self.layerItems = []
+        self.currentLayerIndex = 0
+        self.hoveredRegion = None
+        self.selectedRegion = None
+
+        for layer in self.layers:
+            self.layerItems.append(self.createLayerItem(layer))
+
+        self.navigation.rebuild(self)
+        self.mapReset.emit()
+
+    def createLayerItem(self, layer):
+        if layer.layerType == MapLayerType.LOGIC:
+            layer.indexRegions(self.rows * self.tileWidth, self.cols * self.tileHeight)
+            layerItem = MapLogicLayerItem(self, layer)
+        else:
+            layerItem = MapLayerItem(self, layer)
+
+        self.addItem(layerItem)
+
+        return layerItem
+
+    def addLayer(self, layerType):
+        count = len([layer for layer in self.layers if layer.layerType == layerType]) + 1
+        name = ('logic ' if layerType == MapLayerType.LOGIC else 'layer ') + str(count)
+
+        layer = MapLayer(name, self.rows, self.cols, layerType)
+        self.layers.append(layer)
+        self.layerItems.append(self.createLayerItem(layer))
+        self.mapChanged()
+
+        return layer
+
+    def setCurrentLayer(self, index):
+        self.currentLayerIndex = index
+        self.selectRegion(None)
+        self.hoveredRegion = None
+
+    def worldScale(self):
+        # map pixels to scene units
+        return (self.size / self.tileWidth, self.size / self.tileHeight)
+
+    def sceneToWorld(self, x, y):
+        scaleX, scaleY = self.worldScale()
+        return (x / scaleX, y / scaleY)
+
+    def selectRegion(self, region):
+        previous = self.selectedRegion
+        self.selectedRegion = region
+        layerItem = self.layerItems[self.currentLayerIndex]
+
+        if isinstance(layerItem, MapLogicLayerItem):
+            for changed in [previous, region]:
+                if changed is not None:
+                    layerItem.invalidateRegion(changed)
+
+        self.regionSelected.emit(region)
+
+    def editRegion(self, region, values):
+        # values are new attribute values from the properties dock
+        before = {name: getattr(region, name) for name in values}
+
+        if values == before:
+            return
+
+        for name, value in values.items():
+            setattr(region, name, value)
+
+        self.updateRegion(self.currentLayerIndex, region)
+        self.undoStack.push(MapRegionEditCommand(self, self.currentLayerIndex, region, before, values, "Edit region"))
+
+    def updateRegion(self, layerIndex, region):
+        layer = self.layers[layerIndex]
+
+        if region.regionId in layer.regions:
+            layer.regionIndex.update(region.regionId, region.rect())
+            self.layerItems[layerIndex].invalidateRegion(region)
+            self.mapChanged()
+
+    def createRegion(self, region):
+        self.addRegion(self.currentLayerIndex, region)
+        self.undoStack.push(MapRegionAddCommand(self, self.currentLayerIndex, region, "Add region"))
+
+    def addRegion(self, layerIndex, region):
+        self.layers[layerIndex].addRegion(region)
+        self.layerItems[layerIndex].invalidateRegion(region)
+
+        if layerIndex == self.currentLayerIndex:
+            self.selectRegion(region)
+
+        self.mapChanged()
+
+    def removeRegion(self, layerIndex, region):
+        if region is self.selectedRegion:
+            self.selectRegion(None)
+
+        if region is self.hoveredRegion:
+            self.hoveredRegion = None
+
+        self.layerItems[layerIndex].invalidateRegion(region)
+        self.layers[layerIndex].removeRegion(region)
+        self.mapChanged()
+
+    def updateHoveredRegion(self, x, y):
+        layer = self.currentLayer()
+
+        if layer.layerType != MapLayerType.LOGIC:
+            return
+
+        region = layer.regionAt(*self.sceneToWorld(x, y))
+
+        if region is not self.hoveredRegion:
+            layerItem = self.layerItems[self.currentLayerIndex]
+
+            for changed in [self.hoveredRegion, region]:
+                if changed is not None:
+                    layerItem.invalidateRegion(changed)
+
+            self.hoveredRegion = region
+
+    def regionPress(self, x, y):
+        layer = self.currentLayer()
+
+        if layer.layerType != MapLayerType.LOGIC:
+            return
+
+        if self.tool == MapTool.POLYGON_REGION:
+            self.regionPoints.append(list(self.sceneToWorld(x, y)))
+            self.updateRegionPreview(x, y)
+        else:
+            self.mouseDown = True
+            self.toolStart = self.sceneToWorld(x, y)
+
+    def updateRegionPreview(self, x, y):
+        scaleX, scaleY = self.worldScale()
+
+        if self.regionPoints:
+            points = [QPointF(point[0] * scaleX, point[1] * scaleY) for point in self.regionPoints] + [QPointF(x, y)]
+            path = QPainterPath()
+            path.addPolygon(QPolygonF(points))
+            self.regionPreview.setPath(path)
+        else:
+            startX, startY = self.toolStart
+            path = QPainterPath()
+            path.addRect(QRectF(QPointF(startX * scaleX, startY * scaleY), QPointF(x, y)).normalized())
+            self.regionPreview.setPath(path)
+
+        self.regionPreview.show()
+
+    def regionRelease(self, x, y):
+        startX, startY = self.toolStart
+        endX, endY = self.sceneToWorld(x, y)
+
+        self.toolStart = None
+        self.regionPreview.hide()
+
+        # a click without dragging selects
+        if abs(endX - startX) < 1 or abs(endY - startY) < 1:
+            self.selectRegion(self.currentLayer().regionAt(startX, startY))
+            return
+
+        layer = self.currentLayer()
+        x0, y0 = round(min(startX, endX)), round(min(startY, endY))
+        x1, y1 = round(max(startX, endX)), round(max(startY, endY))
+
+        self.createRegion(MapRegion(layer.nextRegionId, 'region ' + str(layer.nextRegionId), RegionKind.TRIGGER, x0, y0, x1 - x0, y1 - y0))
+
+    def finishRegionPolygon(self):
+        points = self.regionPoints
+        self.regionPoints = []
+        self.regionPreview.hide()
+
+        if len(points) < 3:
+            return
+
+        layer = self.currentLayer()
+        region = MapRegion(layer.nextRegionId, 'region ' + str(layer.nextRegionId))
+        region.setPoints([[round(point[0]), round(point[1])] for point in points])
+
+        self.createRegion(region)
+
+    def mouseDoubleClickEvent(self, e: QGraphicsSceneMouseEvent):
+        if self.tool == MapTool.POLYGON_REGION:
+            self.finishRegionPolygon()
+        else:
+            super().mouseDoubleClickEvent(e)
+
+    def setMapSize(self, rows, cols):
+        self.rows = rows
+        self.cols = cols
+
+        for row in self.selectedGridItems:
+            for cell in row:
+                if cell is not None:
+                    self.removeItem(cell)
+
+        self.gridItems = None
+        self.createGrid()
+
+    def currentLayer(self):
+        return self.layers[self.currentLayerIndex]
+
+    def setTool(self, tool):
+        self.tool = tool
+        self.toolStart = None
+        self.toolPreview.hide()
+        self.pathStart = None
+        self.pathPreview.setPath(QPainterPath())
+        self.regionPoints = []
+        self.regionPreview.hide()
+
+    def cellsChanged(self, layerIndex, x0, y0, x1, y1):
+        x0, y0 = max(x0, 0), max(y0, 0)
+        x1, y1 = min(x1, self.rows), min(y1, self.cols)
+
+        if x0 >= x1 or y0 >= y1:
+            return
+
+        self.layerItems[layerIndex].invalidateCells(x0, y0, x1, y1)
+        self.navigation.updateCells(self, x0, y0, x1, y1)
+        self.cellsDirty.emit(layerIndex, x0, y0, x1, y1)
+
+        # the next save re-serializes just these chunks
+        for chunkX in range(x0 // SAVE_CHUNK, (x1 - 1) // SAVE_CHUNK + 1):
+            for chunkY in range(y0 // SAVE_CHUNK, (y1 - 1) // SAVE_CHUNK + 1):
+                for name in ['tiles', 'terrain', 'fills']:
+                    self.saveCache.invalidate((layerIndex, name, chunkX, chunkY))
+
+        self.setModified()
+
+    def blockingTiles(self):
+        # tile id -> whether it belongs to an object with collision
+        if self._blockingTiles is None or len(self._blockingTiles) != len(self.tileObjects):
+            blocking = numpy.zeros(len(self.tileObjects), dtype=bool)
+
+            for tileId, entry in enumerate(self.tileObjects):
+                if entry is not None and entry[1].hasCollision:
+                    blocking[tileId] = True
+
+            self._blockingTiles = blocking
+
+        return self._blockingTiles
+
+    def blockingInstances(self, x0, y0, x1, y1):
+        # cells inside the rect covered by instances of objects with collision
+        blocked = numpy.zeros((x1 - x0, y1 - y0), dtype=bool)
+        records = self.instances.view()
+
+        for index in self.instances.inRect(self.objectSizes, x0, y0, x1, y1):
+            objectId, x, y = records[index]['object'], records[index]['x'], records[index]['y']
+
+            if self.mapObjects[objectId][1].hasCollision:
+                width, height = self.objectSizes[objectId]
+                blocked[max(x - x0, 0):max(x + width - x0, 0), max(y - y0, 0):max(y + height - y0, 0)] = True
+
+        return blocked
+
+    def previewPath(self, x, y):
+        cell = self.cellAt(x, y)
+        path = QPainterPath()
+
+        if self.pathStart is None:
+            self.pathStart = cell
+            cells = [cell]
+        else:
+            cells = self.navigation.findPath(self.pathStart, cell) or []
+            self.pathStart = None
+
+        for index, (cellX, cellY) in enumerate(cells):
+            point = QPointF((cellX + 0.5) * self.size, (cellY + 0.5) * self.size)
+
+            if index == 0:
+                path.addEllipse(point, self.size / 6, self.size / 6)
+                path.moveTo(point)
+            else:
+                path.lineTo(point)
+
+        self.pathPreview.setPath(path)
+
+    def beginEdit(self):
+        layer = self.currentLayer()
+        self.editSnapshot = (self.currentLayerIndex,
+                             {name: array.copy() for name, array in layer.dataArrays().items()},
+                             self.instances.view().copy())
+
+    def endEdit(self, text):
+        if self.editSnapshot is None:
+            return
+
+        layerIndex, before, instancesBefore = self.editSnapshot
+        self.editSnapshot = None
+
+        commands = []
+        arrays = self.layers[layerIndex].dataArrays()
+
+        # arrays allocated during the edit were empty before it
+        for name, array in arrays.items():
+            if name not in before:
+                before[name] = numpy.zeros_like(array)
+        changed = numpy.zeros((self.rows, self.cols), dtype=bool)
+
+        for name, array in arrays.items():
+            changed |= array != before[name]
+
+        xs = numpy.flatnonzero(changed.any(axis=1))
+
+        if len(xs):
+            ys = numpy.flatnonzero(changed.any(axis=0))
+            x0, y0, x1, y1 = int(xs[0]), int(ys[0]), int(xs[-1]) + 1, int(ys[-1]) + 1
+
+            commands.append(MapLayerEditCommand(self, layerIndex, (x0, y0, x1, y1),
+                                                {name: array[x0:x1, y0:y1].copy() for name, array in before.items()},
+                                                {name: array[x0:x1, y0:y1].copy() for name, array in arrays.items()},
+                                                text))
+
+        if not numpy.array_equal(instancesBefore, self.instances.view()):
+            commands.append(ObjectInstancesEditCommand(self, instancesBefore, self.instances.view().copy(), text))
+
+        if len(commands) > 1:
+            self.undoStack.beginMacro(text)
+
+        for command in commands:
+            self.undoStack.push(command)
+
+        if len(commands) > 1:
+            self.undoStack.endMacro()
+
+    def cellAt(self, x, y):
+        gridItemX = int(x // self.size)
+        gridItemY = int(y // self.size)
+
+        return (min(max(gridItemX, 0), self.rows - 1), min(max(gridItemY, 0), self.cols - 1))
+
+    def toolMask(self, startX, startY, endX, endY):
+        match self.tool:
+            case MapTool.RECTANGLE:
+                return rectangleMask(startX, startY, endX, endY, self.rows, self.cols)
+            case MapTool.LINE:
+                return lineMask(startX, startY, endX, endY, self.rows, self.cols)
+            case MapTool.ELLIPSE:
+                return ellipseMask(startX, startY, endX, endY, self.rows, self.cols)
+
+    def bucketFill(self, x, y, erase = False):
+        gridItemX, gridItemY = self.cellAt(x, y)
+        region = floodFillMask(self.currentLayer().fillKeys(), gridItemX, gridItemY)
+
+        if region:
+            self.beginEdit()
+            self.paintCells(*region, erase)
+            self.endEdit("Bucket fill")
+
     def setPlacementObject(self, obj, spriteSheet):
         self.placementObject = obj
         self.spriteSheet = spriteSheet
         self.placementTiles = None
+        self.placementFill = None
+        self.setPlacementStamp(None)
 
     def setPlacementTiles(self, tiles, spriteSheet):
         self.placementObject = None
         self.spriteSheet = spriteSheet
         self.placementTiles = tiles
+        self.placementFill = None
+        self.setPlacementStamp(None)
+
+    def setPlacementFill(self, color):
+        self.placementObject = None
+        self.placementTiles = None
+        self.placementFill = packColor(color)
+        self.setPlacementStamp(None)
+
+    def setPlacementStamp(self, stamp):
+        if stamp is not None:
+            self.placementObject = None
+            self.placementTiles = None
+            self.placementFill = None
+            stamp = stamp.remapped(self.sheetLayout())
+
+        self.placementStamp = stamp
+
+        # the turtle shows how much of the map a stamp covers
+        width, height = (stamp.width, stamp.height) if stamp is not None else (1, 1)
+        self.gridTurtle.setRect(QRectF(0, 0, width * self.size, height * self.size))
+
+    def sheetLayout(self):
+        return [[filePath, spriteSheet.firstTileId, spriteSheet.horizontalTiles * spriteSheet.verticalTiles,
+                 spriteSheet.firstObjectId, len(spriteSheet.objects)]
+                for filePath, spriteSheet in zip(self.spriteSheetFiles, self.spriteSheets)]
+
+    def terrainObjectIds(self):
+        # terrain index -> object id + 1 as stamps hold it, and back again
+        objectIds = {id(obj): objectId for objectId, (_, obj) in enumerate(self.mapObjects)}
+        terrainObjects = numpy.array([0] + [objectIds[id(obj)] + 1 for obj in self.autoTiler.terrains[1:]], dtype=numpy.int32)
+
+        terrainIndices = numpy.zeros(len(self.mapObjects) + 1, dtype=numpy.int16)
+        terrainIndices[terrainObjects] = numpy.arange(len(terrainObjects))
+
+        return terrainObjects, terrainIndices
+
+    def copyStamp(self, x0, y0, x1, y1):
+        """
+        Stamp of the current layer's cells and instances inside the rect, empty
+        cells are left out so pasting it doesn't erase around what was copied.
+        """
+        layer = self.currentLayer()
+        terrainObjects, _ = self.terrainObjectIds()
+
+        tiles = layer.tiles[x0:x1, y0:y1].copy()
+        terrain = terrainObjects[layer.terrain[x0:x1, y0:y1]]
+        fills = layer.fills[x0:x1, y0:y1].copy() if layer.fills is not None else None
+
+        used = (tiles > 0) | (terrain > 0)
+
+        if fills is not None:
+            used |= fills > 0
+
+        records = self.instances.view()
+        inside = (records['layer'] == self.currentLayerIndex) & \
+                 (records['x'] >= x0) & (records['x'] < x1) & (records['y'] >= y0) & (records['y'] < y1)
+        instances = records[inside].copy()
+        instances['x'] -= x0
+        instances['y'] -= y0
+
+        return Stamp(tiles, terrain, numpy.where(used, STAMP_CELL, 0).astype(numpy.uint8), self.sheetLayout(), fills, instances)
+
+    def sheetStamp(self, spriteSheet, x0, y0, x1, y1):
+        # a block of sheet tiles laid out as they are on the sheet, blank tiles left out
+        xs, ys = numpy.meshgrid(numpy.arange(x0, x1), numpy.arange(y0, y1), indexing='ij')
+        tiles = (spriteSheet.firstTileId + ys * spriteSheet.horizontalTiles + xs).astype(numpy.int32)
+        flags = numpy.where(spriteSheet.emptyTiles[x0:x1, y0:y1], 0, STAMP_CELL).astype(numpy.uint8)
+
+        return Stamp(tiles, numpy.zeros(tiles.shape, dtype=numpy.int32), flags, self.sheetLayout())
+
+    def setSelection(self, selection):
+        self.selection = selection
+
+        if selection is None:
+            self.selectionItem.hide()
+        else:
+            x0, y0, x1, y1 = selection
+            self.selectionItem.setRect(QRectF(x0 * self.size, y0 * self.size, (x1 - x0) * self.size, (y1 - y0) * self.size))
+            self.selectionItem.show()
+
+    def copySelection(self):
+        if self.selection is None:
+            return False
+
+        mimeData = QMimeData()
+        mimeData.setData(STAMP_MIME_TYPE, QByteArray(self.copyStamp(*self.selection).toBytes()))
+        QGuiApplication.clipboard().setMimeData(mimeData)
+
+        return True
+
+    def pasteStamp(self):
+        # stamps copied from any map, ids are moved onto this map's sheets by file
+        mimeData = QGuiApplication.clipboard().mimeData()
+
+        if mimeData is None or not mimeData.hasFormat(STAMP_MIME_TYPE):
+            return False
+
+        stamp = Stamp.fromBytes(mimeData.data(STAMP_MIME_TYPE).data())
+
+        if stamp is None:
+            return False
+
+        self.setPlacementStamp(stamp)
+
+        return True
 
     def addSpriteSheet(self, filePath, spriteSheet):
+        spriteSheet.firstTileId = len(self.tilePixmaps)
+
+        for y in range(spriteSheet.verticalTiles):
+            for x in range(spriteSheet.horizontalTiles):
+                self.tilePixmaps.append(spriteSheet.tiles[x][y][0])
+                self.tileObjects.append(None)
+
+        for obj in spriteSheet.objects:
+            for tile in obj.tiles:
+                self.tileObjects[spriteSheet.tileId(*tile)] = (spriteSheet, obj)
+
+        spriteSheet.firstObjectId = len(self.mapObjects)
+        self.mapObjects.extend((spriteSheet, obj) for obj in spriteSheet.objects)
+        self.objectSizes = numpy.array([[obj.bounds()[2] - obj.bounds()[0], obj.bounds()[3] - obj.bounds()[1]] for _, obj in self.mapObjects],
+                                       dtype=numpy.int32).reshape(-1, 2)
+
+        self.navigation.rebuild(self)
+
         self.spriteSheets.append(spriteSheet)
         self.spriteSheetFiles.append(filePath)
+        self.autoTiler.addSpriteSheet(spriteSheet)
+        self.rebuildAnimations()
+        self.mapReset.emit()
+
+    def updateSpriteSheet(self, spriteSheet, objects):
+        """
+        Take frames and terrain rules from the objects of an open sheet, matched
+        by key, and rebuild the animations and auto-tiling that use them.
+        """
+        edited = {obj.key: obj for obj in objects}
+
+        for obj in spriteSheet.objects:
+            source = edited.get(obj.key)
+
+            if source is not None:
+                obj.frames = list(source.frames)
+                obj.terrain = TerrainRules.fromdict(source.terrain.asdict()) if source.terrain is not None else None
+
+        self.rebuildAutoTiler()
+        self.rebuildAnimations()
+        self.update()
+
+    def rebuildAutoTiler(self):
+        previous = self.autoTiler.terrains
+
+        self.autoTiler = AutoTiler()
+
+        for spriteSheet in self.spriteSheets:
+            self.autoTiler.addSpriteSheet(spriteSheet)
+
+        # painted cells keep their terrain when objects gain or lose rules ahead of them
+        remap = numpy.array([self.autoTiler.terrainIndex(obj) for obj in previous], dtype=numpy.int16)
+
+        if numpy.array_equal(remap, numpy.arange(len(previous))):
+            return
+
+        for layer in self.layers:
+            if layer.layerType == MapLayerType.TILES:
+                layer.terrain[...] = remap[layer.terrain]
+
+        self.saveCache.clear()
+        self.setModified()
+
+    def rebuildAnimations(self):
+        self.tileFrames = numpy.arange(len(self.tilePixmaps), dtype=numpy.int32)
+        self.animations = []
+        self.objectFrames = {}
+
+        for objectId, (spriteSheet, obj) in enumerate(self.mapObjects):
+            if not obj.isAnimated():
+                continue
+
+            tileIds = numpy.array([spriteSheet.tileId(x, y) for x, y in obj.tiles], dtype=numpy.int32)
+            frameIds = numpy.array([[spriteSheet.tileId(x + dx, y + dy)
+                                     if 0 <= x + dx < spriteSheet.horizontalTiles and 0 <= y + dy < spriteSheet.verticalTiles
+                                     else spriteSheet.tileId(x, y) for x, y in obj.tiles] for dx, dy, _ in obj.frames], dtype=numpy.int32)
+
+            self.animations.append((Animation([duration for _, _, duration in obj.frames]), objectId, tileIds, frameIds))
+            # no frame yet, so the first frame's offset is applied straight away
+            self.objectFrames[objectId] = -1
+
+        self.advanceAnimations(animationClock().now())
+        animationClock().register(self)
+
+    def nextFrameChange(self, now):
+        if not self.animations:
+            return None
+
+        return min(animation.nextChange(now) for animation, _, _, _ in self.animations)
+
+    def advanceAnimations(self, now):
+        """
+        Move every animation to its frame at now. Tiles of an animation change
+        together through tileFrames, then only the visible cells showing a
+        changed tile or object are repainted.
+        """
+        changedTiles = numpy.zeros(len(self.tileFrames), dtype=bool)
+        changedObjects = numpy.zeros(len(self.mapObjects), dtype=bool)
+
+        for animation, objectId, tileIds, frameIds in self.animations:
+            frame = animation.frameAt(now)
+
+            if frame != self.objectFrames[objectId]:
+                self.objectFrames[objectId] = frame
+                self.tileFrames[tileIds] = frameIds[frame]
+                changedTiles[tileIds] = True
+                changedObjects[objectId] = True
+
+        # hidden maps keep their frames current but don't repaint
+        rects = visibleRects(self)
+
+        if not changedObjects.any() or not rects:
+            return
+
+        size = self.size
+        records = self.instances.view()
+
+        for rect in rects:
+            x0, y0 = max(int(rect.left() // size), 0), max(int(rect.top() // size), 0)
+            x1, y1 = min(int(rect.right() // size) + 1, self.rows), min(int(rect.bottom() // size) + 1, self.cols)
+
+            if x0 >= x1 or y0 >= y1:
+                continue
+
+            for layerIndex, (layer, layerItem) in enumerate(zip(self.layers, self.layerItems)):
+                if layer.layerType != MapLayerType.TILES:
+                    continue
+
+                hits = changedTiles[layer.tiles[x0:x1, y0:y1]]
+                xs, ys = numpy.flatnonzero(hits.any(axis=1)), numpy.flatnonzero(hits.any(axis=0))
+                cells = [(x0 + xs[0], y0 + ys[0], x0 + xs[-1] + 1, y0 + ys[-1] + 1)] if len(xs) else []
+
+                indices = self.instances.inRect(self.objectSizes, x0, y0, x1, y1, layerIndex)
+                animated = records[indices][changedObjects[records[indices]['object']]]
+
+                if len(animated):
+                    sizes = self.objectSizes[animated['object']]
+                    cells.append((animated['x'].min(), animated['y'].min(),
+                                  (animated['x'] + sizes[:, 0]).max(), (animated['y'] + sizes[:, 1]).max()))
+
+                # one repaint per layer covering everything that changed frame
+                if cells:
+                    cx0, cy0 = max(min(cell[0] for cell in cells), x0), max(min(cell[1] for cell in cells), y0)
+                    cx1, cy1 = min(max(cell[2] for cell in cells), x1), min(max(cell[3] for cell in cells), y1)
+                    layerItem.update(QRectF(cx0 * size, cy0 * size, (cx1 - cx0) * size, (cy1 - cy0) * size))
+
+    def objectId(self, spriteSheet, obj):
+        return spriteSheet.firstObjectId + spriteSheet.objects.index(obj)
+
+    def objectPixmap(self, objectId):
+        frame = self.objectFrames.get(objectId, 0)
+        mip = self.objectPixmaps.get((objectId, frame))
+
+        if mip is None:
+            spriteSheet, obj = self.mapObjects[objectId]
+            left, top, _, _ = obj.bounds()
+            width, height = self.objectSizes[objectId]
+            tileWidth, tileHeight = spriteSheet.tileWidth, spriteSheet.tileHeight
+
+            pixmap = QPixmap(int(width) * tileWidth, int(height) * tileHeight)
+            pixmap.fill(Qt.transparent)
+            painter = QPainter(pixmap)
+
+            if obj.renderTiles:
+                dx, dy = obj.frames[frame][:2] if obj.isAnimated() else (0, 0)
+
+                for x, y in obj.tiles:
+                    frameX = x + dx if 0 <= x + dx < spriteSheet.horizontalTiles else x
+                    frameY = y + dy if 0 <= y + dy < spriteSheet.verticalTiles else y
+                    painter.drawPixmap((x - left) * tileWidth, (y - top) * tileHeight, spriteSheet.tiles[frameX][frameY][0].levels[0])
+            else:
+                # objects that don't render still need to be seen in the editor
+                painter.setPen(QPen(Qt.darkMagenta, 0, Qt.DashLine))
+                painter.setBrush(QBrush(QColor(128, 0, 128, 40)))
+                painter.drawRect(0, 0, pixmap.width() - 1, pixmap.height() - 1)
+
+            painter.end()
+
+            mip = MipPixmap(pixmap)
+            self.objectPixmaps[(objectId, frame)] = mip
+
+        return mip
+
+    def placingInstances(self):
+        return self.placementObject is not None and self.placementObject.terrain is None and not self.placementTiles
+
+    def stampAt(self, cellX, cellY):
+        """
+        Write the placement stamp with its top left at the cell, the stamp's
+        cells and instances each go in as one bulk write.
+        """
+        layer = self.currentLayer()
+        stamp = self.placementStamp
+
+        if layer.layerType != MapLayerType.TILES:
+            return
+
+        shape = clipMask(cellX, cellY, stamp.cells(), self.rows, self.cols)
+
+        if shape:
+            self.paintStamp(*shape, cellX, cellY)
+
+        if len(stamp.instances):
+            records = stamp.instances.copy()
+            records['x'] += cellX
+            records['y'] += cellY
+            records['layer'] = self.currentLayerIndex
+            # clipped to the map the same way the stamp's cells are
+            records = records[(records['x'] >= 0) & (records['x'] < self.rows) &
+                              (records['y'] >= 0) & (records['y'] < self.cols)]
+
+            if len(records):
+                self.instances.extend(records)
+
+                sizes = self.objectSizes[records['object']]
+                self.cellsChanged(self.currentLayerIndex, int(records['x'].min()), int(records['y'].min()),
+                                  int((records['x'] + sizes[:, 0]).max()), int((records['y'] + sizes[:, 1]).max()))
+
+    def paintStamp(self, x0, y0, mask, originX, originY):
+        # the stamp repeats from originX, originY so larger shapes fill with its pattern
+        layer = self.currentLayer()
+        stamp = self.placementStamp
+        x1 = x0 + mask.shape[0]
+        y1 = y0 + mask.shape[1]
+
+        index = numpy.ix_((numpy.arange(x0, x1) - originX) % stamp.width, (numpy.arange(y0, y1) - originY) % stamp.height)
+        cells = mask & stamp.cells()[index]
+
+        if not cells.any():
+            return
+
+        _, terrainIndices = self.terrainObjectIds()
+
+        layer.terrain[x0:x1, y0:y1][cells] = terrainIndices[stamp.terrain[index][cells]]
+        layer.tiles[x0:x1, y0:y1][cells] = stamp.tiles[index][cells]
+
+        if stamp.fills is not None and stamp.fills.any():
+            layer.allocateFills()
+
+        if layer.fills is not None:
+            layer.fills[x0:x1, y0:y1][cells] = stamp.fills[index][cells] if stamp.fills is not None else 0
+
+        resolved = self.autoTiler.resolve(layer, x0, y0, x1, y1)
+
+        if resolved:
+            self.cellsChanged(self.currentLayerIndex, *resolved)
+
+    def placeObject(self, cellX, cellY):
+        if self.currentLayer().layerType != MapLayerType.TILES:
+            return
+
+        obj = self.placementObject
+        objectId = self.objectId(self.spriteSheet, obj)
+        offsetX, offsetY = obj.originOffset()
+        x, y = cellX + offsetX, cellY + offsetY
+
+        records = self.instances.view()
+        same = (records['object'] == objectId) & (records['x'] == x) & (records['y'] == y) & (records['layer'] == self.currentLayerIndex)
+
+        # dragging the brush over the same cell shouldn't stack copies
+        if same.any():
+            return
+
+        self.instances.add(objectId, x, y, self.currentLayerIndex)
+
+        width, height = self.objectSizes[objectId]
+        self.cellsChanged(self.currentLayerIndex, x, y, x + width, y + height)
+
+    def eraseObjects(self, cellX, cellY):
+        indices = self.instances.inRect(self.objectSizes, cellX, cellY, cellX + 1, cellY + 1, self.currentLayerIndex)
+
+        if len(indices) == 0:
+            return
+
+        records = self.instances.view()[indices].copy()
+        self.instances.remove(indices)
+
+        for objectId, x, y, layerIndex in records:
+            width, height = self.objectSizes[objectId]
+            self.cellsChanged(int(layerIndex), int(x), int(y), int(x + width), int(y + height))
+
+    def placementTerrain(self):
+        if self.placementObject is not None and self.placementObject.terrain is not None:
+            return self.autoTiler.terrainIndex(self.placementObject)
+
+        return 0
+
+    def placementTileId(self):
+        if self.spriteSheet is None:
+            return 0
+
+        if self.placementTiles:
+            return self.spriteSheet.tileId(*self.placementTiles[0])
+
+        if self.placementObject is not None:
+            return self.spriteSheet.tileId(*self.placementObject.tiles[0])
+
+        return 0
+
+    def paintCells(self, x0, y0, mask, erase = False):
+        """
+        Write the current brush into every cell of mask, a boolean array whose
+        top left sits at x0, y0 on the current layer.
+        """
+        layer = self.currentLayer()
+        x1 = x0 + mask.shape[0]
+        y1 = y0 + mask.shape[1]
+
+        if layer.layerType != MapLayerType.TILES:
+            return
+
+        if self.placementStamp is not None and not erase:
+            self.paintStamp(x0, y0, mask, x0, y0)
+            return
+
+        fill = None if erase else self.placementFill
+        terrain = 0 if erase or fill is not None else self.placementTerrain()
+        tileId = 0 if erase or fill is not None or terrain else self.placementTileId()
+
+        if not erase and fill is None and not terrain and not tileId:
+            return
+
+        layer.terrain[x0:x1, y0:y1][mask] = terrain
+        layer.tiles[x0:x1, y0:y1][mask] = tileId
+
+        # a cell holds a tile or a fill colour, never both
+        if fill is not None:
+            layer.allocateFills()
+
+        if layer.fills is not None:
+            layer.fills[x0:x1, y0:y1][mask] = fill or 0
+
+        # neighbouring terrain transitions change even when plain tiles are painted
+        resolved = self.autoTiler.resolve(layer, x0, y0, x1, y1)
+
+        if resolved:
+            self.cellsChanged(self.currentLayerIndex, *resolved)
 
     def removeGridLines(self):
         if len(self.gridLines):
@@ -201,45 +1418,190 @@ class MapScene(QGraphicsScene):
             self.gridLines = []
 
     def createGrid(self):
-        self.rows = 50
-        self.cols = 50
-        self.size = 102 # extra 1 either side for borders
-        endPoint = self.rows * self.size
-
         if len(self.gridLines):
             for line in self.gridLines:
                 self.removeItem(line)
 
-            self.gridLines = []
+            self.gridLines = []
+
+        if not self.gridItems:
+            self.gridItems = [[None for col in range(self.cols)] for row in range(self.rows)]
+            self.selectedGridItems = [[None for col in range(self.cols)] for row in range(self.rows)]
+
+        if self.application.showGrid:
+            # vertical lines
+            for i in range(0, self.rows + 1):
+                x = i * self.size
+                self.gridLines.append(self.addLine(x, 0, x, self.cols * self.size, self.gridPen))
+
+            # horizontal lines
+            for i in range(0, self.cols + 1):
+                y = i * self.size
+                self.gridLines.append(self.addLine(0, y, self.rows * self.size, y, self.gridPen))
+
+    def headerState(self):
+        return {
+            'name': self.name,
+            'type': 'map',
+            'tileWidth': self.tileWidth,
+            'tileHeight': self.tileHeight,
+            'width': self.rows,
+            'height': self.cols,
+            'spriteSheets': self.spriteSheetFiles,
+            'sheetTiles': [[spriteSheet.horizontalTiles, spriteSheet.verticalTiles] for spriteSheet in self.spriteSheets],
+            'variantSeed': self.variantSeed
+        }
+
+    def saveState(self):
+        stateData = self.headerState()
+        stateData['layers'] = [layer.asdict() for layer in self.layers]
+        stateData['objects'] = self.instancesAsList()
+
+        return stateData
+
+    def saveText(self):
+        """
+        The json text of saveState, re-serializing only the layer chunks and
+        sections that changed since the last call.
+        """
+        members = [(key, json.dumps(value)) for key, value in self.headerState().items()]
+        members.append(('layers', '[' + ', '.join(self.layerText(index) for index in range(len(self.layers))) + ']'))
+        members.append(('objects', self.saveCache.text('objects', lambda: json.dumps(self.instancesAsList()), self.instances.version)))
+
+        return jsonObject(members)
+
+    def layerText(self, layerIndex):
+        layer = self.layers[layerIndex]
+        chunks = [(x0, y0) for x0 in range(0, self.rows, SAVE_CHUNK) for y0 in range(0, self.cols, SAVE_CHUNK)]
+
+        members = [('name', json.dumps(layer.name)), ('layerType', json.dumps(int(layer.layerType))),
+                   ('tiles', self.chunkedText(layerIndex, 'tiles', chunks, sparseCells)),
+                   ('terrain', self.chunkedText(layerIndex, 'terrain', chunks, sparseCells))]
+
+        if layer.fills is not None:
+            fills = self.chunkedText(layerIndex, 'fills', chunks, encodeRuns)
+
+            if fills != '[]':
+                members.append(('fills', fills))
+
+        if layer.layerType == MapLayerType.LOGIC:
+            members.append(('regions', json.dumps([region.asdict() for region in layer.regions.values()])))
+
+        return jsonObject(members)
+
+    def chunkedText(self, layerIndex, name, chunks, encode):
+        # one layer array as a json list, cells or runs are listed chunk by chunk
+        grid = getattr(self.layers[layerIndex], name)
+        texts = []
+
+        for x0, y0 in chunks:
+            text = self.saveCache.text((layerIndex, name, x0 // SAVE_CHUNK, y0 // SAVE_CHUNK),
+                                       lambda: json.dumps(encode(grid[x0:x0 + SAVE_CHUNK, y0:y0 + SAVE_CHUNK], x0, y0))[1:-1])
+
+            if text:
+                texts.append(text)
+
+        return '[' + ', '.join(texts) + ']'
+
+    def instancesAsList(self):
+        # [sheet index, object index in the sheet, x, y, layer] so ids survive sheets gaining objects
+        firstObjectIds = numpy.array([spriteSheet.firstObjectId for spriteSheet in self.spriteSheets] + [len(self.mapObjects)])
+        records = self.instances.view()
+        sheets = numpy.searchsorted(firstObjectIds, records['object'], side='right') - 1
+
+        return numpy.stack([sheets, records['object'] - firstObjectIds[sheets], records['x'], records['y'], records['layer']], axis=1).tolist()
+
+    def instancesFromList(self, objects):
+        objects = numpy.array(objects, dtype=numpy.int64).reshape(-1, 5)
+        firstObjectIds = numpy.array([spriteSheet.firstObjectId for spriteSheet in self.spriteSheets], dtype=numpy.int64)
+        records = numpy.zeros(len(objects), dtype=self.instances.records.dtype)
+
+        records['object'] = firstObjectIds[objects[:, 0]] + objects[:, 1]
+        records['x'] = objects[:, 2]
+        records['y'] = objects[:, 3]
+        records['layer'] = objects[:, 4]
+
+        self.instances.replace(records)
+
+    def restoreState(self, state):
+        # sprite sheets are added by the tab beforehand so tile ids line up
+        self.name = state['name']
+        self.tileWidth = state['tileWidth']
+        self.tileHeight = state['tileHeight']
+        self.variantSeed = state.get('variantSeed', 0)
+
+        self.setMapSize(state['width'], state['height'])
+        self.instancesFromList(state.get('objects', []))
+
+        layers = [MapLayer.fromdict(layer, self.rows, self.cols) for layer in state['layers']]
+        tileIds = self.savedTileIds(state)
+
+        if tileIds is not None:
+            for layer in layers:
+                if layer.layerType != MapLayerType.TILES:
+                    continue
+
+                layer.tiles[:] = numpy.where(layer.tiles < len(tileIds), tileIds[numpy.minimum(layer.tiles, len(tileIds) - 1)], 0)
+
+        self.setLayers(layers)
+        self.setModified(False)
+
+    def savedTileIds(self, state):
+        """
+        Lookup from a saved map's tile ids to the current ones, or None when the
+        sheets' tile layouts haven't changed since it was saved.
+        """
+        # maps saved before sheetTiles counted every sheet as square
+        sheetTiles = state.get('sheetTiles', [[spriteSheet.horizontalTiles] * 2 for spriteSheet in self.spriteSheets])
+        current = [[spriteSheet.horizontalTiles, spriteSheet.verticalTiles] for spriteSheet in self.spriteSheets]
+
+        if [list(tiles) for tiles in sheetTiles] == current:
+            return None
+
+        tileIds = [numpy.zeros(1, dtype=numpy.int32)]
+
+        for spriteSheet, (horizontalTiles, verticalTiles) in zip(self.spriteSheets, sheetTiles):
+            y, x = numpy.divmod(numpy.arange(horizontalTiles * verticalTiles), horizontalTiles)
+            kept = (x < spriteSheet.horizontalTiles) & (y < spriteSheet.verticalTiles)
+            # tiles that no longer exist in the sheet become empty
+            tileIds.append(numpy.where(kept, spriteSheet.firstTileId + y * spriteSheet.horizontalTiles + x, 0).astype(numpy.int32))
+
+        return numpy.concatenate(tileIds)
+
+    def saveFile(self, saveAs = False):
+        if self.fileName == '' or saveAs:
+            fileName, _ = QFileDialog.getSaveFileName(self.application, 'Save Map', filter='*.json')
+        elif not self.modified:
+            # nothing to write since the last save
+            return
+        else:
+            fileName = self.fileName
+
+        if fileName:
+            self.fileName = fileName
 
-        if not self.gridItems:
-            self.gridItems = [[None for col in range(self.cols)] for row in range(self.rows)]
-            self.selectedGridItems = [[None for col in range(self.cols)] for row in range(self.rows)]
+            writeFile(fileName, self.saveText())
+            self.setModified(False)
+            self.mapSaved.emit()
 
-        if self.application.showGrid:
-            # vertical lines
-            for i in range(0, self.cols + 1):
-                x = i * self.size
-                self.gridLines.append(self.addLine(x, 0, x, endPoint, self.gridPen))
+    def autosave(self):
+        # only maps that already have a file, written off the ui thread
+        if self.fileName and self.modified:
+            writeFileInBackground(self.fileName, self.saveText(), self.autosaved, self.changeCount)
 
-            # horizontal lines
-            for i in range(0, self.rows + 1):
-                y = i * self.size
-                self.gridLines.append(self.addLine(0, y, endPoint, y, self.gridPen))
+    def autosaved(self, changeCount):
+        # still dirty if the write failed or the map changed while it was queued
+        if changeCount == self.changeCount:
+            self.setModified(False)
 
-    def saveState(self):
-        stateData = {
-            'name': self.name,
-            'type': 'map',
-            'tileWidth': self.tileWidth,
-            'tileHeight': self.tileHeight,
-            'width': self.width,
-            'height': self.height,
-            'spriteSheets': self.spriteSheetFiles,
-            'layers': []
-        }
+        self.mapSaved.emit()
 
-        return stateData
+    def exportFile(self, profile = 'editor'):
+        if self.fileName == '':
+            self.saveFile()
+
+        if self.fileName:
+            return EXPORT_PROFILES[profile](self).exportFile(self.fileName)
 
     def fillGridItemCoordinates(self, x, y):
         #print(f"{x}x{y}", flush=True)
@@ -248,13 +1610,22 @@ class MapScene(QGraphicsScene):
         gridItemX = int(x // self.size) 
         gridItemY = int(y // self.size)
 
-        if self.gridItems[gridItemX][gridItemY] is None:
-            leftPos = gridItemX * self.size
-            topPos = gridItemY * self.size
+        if x < 0 or y < 0 or gridItemX >= self.rows or gridItemY >= self.cols:
+            return
 
-            self.gridItems[gridItemX][gridItemY] = SpriteItem(self,
-                                                              QRectF(leftPos, topPos, self.size, self.size), 
-                                                              QBrush(Qt.green))
+        if self.placementStamp is not None:
+            # a stroke lays stamps edge to edge from where it started
+            originX, originY = self.stampOrigin
+            cellX = originX + (gridItemX - originX) // self.placementStamp.width * self.placementStamp.width
+            cellY = originY + (gridItemY - originY) // self.placementStamp.height * self.placementStamp.height
+
+            if (cellX, cellY) not in self.stampedCells:
+                self.stampedCells.add((cellX, cellY))
+                self.stampAt(cellX, cellY)
+        elif self.placingInstances():
+            self.placeObject(gridItemX, gridItemY)
+        else:
+            self.paintCells(gridItemX, gridItemY, numpy.ones((1, 1), dtype=bool))
 
     def clearGridItemCoordinates(self, x, y):
         #print(f"{x}x{y}", flush=True)
@@ -263,12 +1634,11 @@ class MapScene(QGraphicsScene):
         gridItemX = int(x // self.size) 
         gridItemY = int(y // self.size)
 
-        if self.gridItems[gridItemX][gridItemY]:
-            spriteItem = self.gridItems[gridItemX][gridItemY]
-            
-            spriteItem.removeFromView()
-            # Need to set data here
-            self.gridItems[gridItemX][gridItemY] = None
+        if x < 0 or y < 0 or gridItemX >= self.rows or gridItemY >= self.cols:
+            return
+
+        self.eraseObjects(gridItemX, gridItemY)
+        self.paintCells(gridItemX, gridItemY, numpy.ones((1, 1), dtype=bool), True)
 
     def selectGridItemCoordinates(self, x, y):
         #print(f"{x}x{y}", flush=True)
@@ -277,7 +1647,10 @@ class MapScene(QGraphicsScene):
         gridItemX = int(x // self.size) 
         gridItemY = int(y // self.size)
 
-        if self.gridItems[gridItemX][gridItemY]:
+        if x < 0 or y < 0 or gridItemX >= self.rows or gridItemY >= self.cols:
+            return
+
+        if self.currentLayer().tiles[gridItemX, gridItemY]:
             if self.selectedGridItems[gridItemX][gridItemY] is None:
                 #spriteItem = self.gridItems[gridItemX][gridItemY]
                 leftPos = gridItemX * self.size
@@ -291,15 +1664,25 @@ class MapScene(QGraphicsScene):
                 self.selectedGridItems[gridItemX][gridItemY] = None
 
     def deletePress(self):
+        if self.selectedRegion is not None:
+            region = self.selectedRegion
+            self.removeRegion(self.currentLayerIndex, region)
+            self.undoStack.push(MapRegionRemoveCommand(self, self.currentLayerIndex, region, "Delete region"))
+            return
+
+        mask = numpy.zeros((self.rows, self.cols), dtype=bool)
+
         for index_x, x in enumerate(self.selectedGridItems):
             for index_y, cell in enumerate(self.selectedGridItems[index_x]):
                 if not cell is None:
                     self.removeItem(cell)
                     self.selectedGridItems[index_x][index_y] = None
+                    mask[index_x, index_y] = True
 
-                    if self.gridItems[index_x][index_y]:
-                        self.gridItems[index_x][index_y].removeFromView()
-                        self.gridItems[index_x][index_y] = None
+        if mask.any():
+            self.beginEdit()
+            self.paintCells(0, 0, mask, True)
+            self.endEdit("Delete")
 
     def mousePressEvent(self, e: QGraphicsSceneMouseEvent):
         print("mousePressEvent")
@@ -309,15 +1692,40 @@ class MapScene(QGraphicsScene):
         button = e.button()
 
         if button == Qt.MouseButton.LeftButton:
-            self.mouseDown = True
-
-            if self.application.controlHeld:
-                self.clearGridItemCoordinates(x, y)
-            else:
-                self.fillGridItemCoordinates(x, y)
+            erase = self.application.controlHeld
+
+            match self.tool:
+                case MapTool.BRUSH:
+                    self.mouseDown = True
+                    self.stampOrigin = self.cellAt(x, y)
+                    self.stampedCells = set()
+                    self.beginEdit()
+
+                    if erase:
+                        self.clearGridItemCoordinates(x, y)
+                    else:
+                        self.fillGridItemCoordinates(x, y)
+                case MapTool.BUCKET:
+                    self.bucketFill(x, y, erase)
+                case MapTool.PATH:
+                    self.previewPath(x, y)
+                case MapTool.REGION | MapTool.POLYGON_REGION:
+                    self.regionPress(x, y)
+                case _:
+                    self.mouseDown = True
+                    self.toolStart = self.cellAt(x, y)
+                    self.updateToolPreview(*self.toolStart)
         elif button == Qt.MouseButton.MiddleButton:
             self.selectGridItemCoordinates(x, y)
 
+    def updateToolPreview(self, endX, endY):
+        startX, startY = self.toolStart
+        x0, y0 = min(startX, endX), min(startY, endY)
+        x1, y1 = max(startX, endX) + 1, max(startY, endY) + 1
+
+        self.toolPreview.setRect(QRectF(x0 * self.size, y0 * self.size, (x1 - x0) * self.size, (y1 - y0) * self.size))
+        self.toolPreview.show()
+
     def moveGridTurtle(self, x, y):
         # align to inside grid item
         gridItemX = int(x // self.size) 
@@ -343,18 +1751,115 @@ class MapScene(QGraphicsScene):
         y = pos.y()
 
         self.moveGridTurtle(x, y)
-
-        if self.mouseDown:
-            if self.application.controlHeld:
+        self.updateHoveredRegion(x, y)
+
+        if self.regionPoints:
+            self.updateRegionPreview(x, y)
+        elif self.mouseDown and self.tool == MapTool.REGION:
+            if self.toolStart is not None:
+                self.updateRegionPreview(x, y)
+        elif self.mouseDown:
+            if self.toolStart is not None:
+                self.updateToolPreview(*self.cellAt(x, y))
+            elif self.application.controlHeld:
                 self.clearGridItemCoordinates(x, y)
             else:
                 self.fillGridItemCoordinates(x, y)
 
 
     def mouseReleaseEvent(self, e: QGraphicsSceneMouseEvent):
+        if self.mouseDown and self.tool == MapTool.REGION:
+            if self.toolStart is not None:
+                pos = e.scenePos()
+                self.regionRelease(pos.x(), pos.y())
+        elif self.mouseDown and self.tool == MapTool.SELECT and self.toolStart is not None:
+            pos = e.scenePos()
+            self.setSelection(orderedRect(*self.toolStart, *self.cellAt(pos.x(), pos.y())))
+
+            self.toolStart = None
+            self.toolPreview.hide()
+        elif self.mouseDown and self.toolStart is not None:
+            pos = e.scenePos()
+            shape = self.toolMask(*self.toolStart, *self.cellAt(pos.x(), pos.y()))
+
+            self.toolStart = None
+            self.toolPreview.hide()
+
+            if shape:
+                self.beginEdit()
+                self.paintCells(*shape, self.application.controlHeld)
+                self.endEdit(self.tool.name.capitalize())
+        else:
+            self.endEdit("Paint")
+
         self.mouseDown = False
 
+# Draws every hitbox on a sheet in one item, hovered and selected ones highlighted
+class HitBoxOverlayItem(QGraphicsItem):
+    def __init__(self, scene):
+        super().__init__()
+
+        self.sheetScene = scene
+
+        self.pen = QPen(QColor(255, 0, 255), 0)
+        self.brush = QBrush(QColor(255, 0, 255, 40))
+        self.hoverPen = QPen(Qt.yellow, 0)
+        self.selectedPen = QPen(Qt.red, 0)
+        self.selectedBrush = QBrush(QColor(255, 0, 0, 60))
+
+        self.setFlag(QGraphicsItem.ItemUsesExtendedStyleOption)
+        self.setZValue(50)
+
+    def boundingRect(self):
+        scene = self.sheetScene
+        return QRectF(0, 0, scene.horizontalTiles * scene.size, scene.verticalTiles * scene.size)
+
+    def paint(self, painter, option, widget = None):
+        scene = self.sheetScene
+        exposed = option.exposedRect
+        scaleX, scaleY = scene.hitBoxScale()
+
+        for obj in scene.objects:
+            if not obj.hasCollision or obj.hitBox is None:
+                continue
+
+            footprint = obj.footprint(scene.tileWidth, scene.tileHeight)
+            origin = scene.objectOrigin(obj)
+            bounds = obj.hitBox.boundingRect(footprint)
+
+            sceneBounds = QRectF(origin.x() + bounds.x() * scaleX, origin.y() + bounds.y() * scaleY,
+                                 bounds.width() * scaleX, bounds.height() * scaleY)
+
+            if not sceneBounds.intersects(exposed):
+                continue
+
+            if obj is scene.selectedObject:
+                pen, brush = self.selectedPen, self.selectedBrush
+            elif obj is scene.hoveredObject:
+                pen, brush = self.hoverPen, self.brush
+            else:
+                pen, brush = self.pen, self.brush
+
+            painter.save()
+            painter.translate(origin)
+            painter.scale(scaleX, scaleY)
+            painter.setPen(pen)
+            painter.setBrush(brush)
+            painter.drawPath(obj.hitBox.path(footprint))
+            painter.restore()
+
 class SpriteSheetScene(QGraphicsScene):
+    # objects were added, removed or replaced as a whole
+    objectsChanged = Signal()
+    # properties of these objects changed in one batch
+    objectsEdited = Signal(list)
+    # whether there are changes since the sheet was loaded or saved
+    modifiedChanged = Signal(bool)
+    # the sheet's tiles have been sliced and are drawn
+    tilesReady = Signal()
+    # objects were changed in any way, maps using the sheet pick up the changes
+    sheetEdited = Signal()
+
     def __init__(self, parent, application):
         super().__init__()
 
@@ -367,6 +1872,18 @@ class SpriteSheetScene(QGraphicsScene):
         self.size = 101 # extra 1 either side for borders
         self.tileWidth = 16
         self.tileHeight = 16
+        self.objects = []
+        self.modified = False
+        self.changeCount = 0
+
+        self.undoStack = QUndoStack(self)
+
+        self.objectsChanged.connect(lambda: self.setModified())
+        self.objectsEdited.connect(lambda objects: self.setModified())
+
+        # animated objects and their timing, rebuilt after edits
+        self.animations = None
+        self.sheetEdited.connect(self.resetAnimations)
 
         self.name = "Untitled sprite sheet"
 
@@ -389,6 +1906,27 @@ class SpriteSheetScene(QGraphicsScene):
         self.tilesToObjectAction = QAction("Tile/s to object", self)
         self.tilesToObjectAction.triggered.connect(self.tilesToObject)
 
+        self.autoSegmentAction = QAction("Auto-segment objects", self)
+        self.autoSegmentAction.triggered.connect(self.autoSegment)
+
+        # [x, y] index into objects of the object holding each tile, -1 for none
+        self.objectIndex = None
+
+        self.selectedObject = None
+        self.hoveredObject = None
+
+        self.hitBoxMode = False
+        self.hitBoxOverlay = None
+        self.hitBoxStart = None
+        self.hitBoxPoints = []
+
+        self.tileGridItem = None
+        self.tileLoader = None
+
+        self.hitBoxPreview = self.addPath(QPainterPath(), QPen(Qt.red, 0, Qt.DashLine), QBrush(QColor(255, 0, 0, 40)))
+        self.hitBoxPreview.setZValue(60)
+        self.hitBoxPreview.hide()
+
     def saveState(self):
         stateData = {
             'name': self.name,
@@ -414,60 +1952,159 @@ class SpriteSheetScene(QGraphicsScene):
         for key in state['items']:
             self.objects.append(SpriteObject.fromdict(state['items'][key]))
 
-    def saveFile(self, saveAs = False):
-        fileData = self.saveState()
+        self.rebuildObjectIndex()
+        self.objectsChanged.emit()
+        self.setModified(False)
+
+    def setModified(self, modified = True):
+        if modified:
+            # background saves compare against this to tell whether they're still current
+            self.changeCount += 1
 
+        if modified != self.modified:
+            self.modified = modified
+            self.modifiedChanged.emit(modified)
+
+        if modified:
+            self.sheetEdited.emit()
+
+    def saveFile(self, saveAs = False):
         if self.fileName == '' or saveAs:
             fileName, _ = QFileDialog.getSaveFileName(self.application, 'Save Sprite Sheet', filter='*.json')
+        elif not self.modified:
+            # nothing to write since the last save
+            return
         else:
             fileName = self.fileName
 
         if fileName:
             self.fileName = fileName
 
-            with open(fileName, 'w') as file:
-                file.write(json.dumps(fileData, indent=4))
+            writeFile(fileName, json.dumps(self.saveState(), indent=4))
+            self.setModified(False)
 
-            print(fileData, flush=True)
             print(fileName, flush=True)
 
+    def autosave(self):
+        if self.fileName and self.modified:
+            writeFileInBackground(self.fileName, json.dumps(self.saveState(), indent=4), self.autosaved, self.changeCount)
+
+    def autosaved(self, changeCount):
+        if changeCount == self.changeCount:
+            self.setModified(False)
+
     def loadSpriteSheetFromImageFile(self, filePath):
         self.spriteFile = filePath
         self.spriteFilename = basename(filePath)
-        masterPixmap = QPixmap(filePath)
-        self.masterPixmap = masterPixmap
+        # only the header is read, the pixels come from the tile cache
+        imageSize = QImageReader(filePath).size()
 
-        width = masterPixmap.width()
-        height = masterPixmap.height()
+        width = imageSize.width()
+        height = imageSize.height()
 
         self.width = width
         self.height = height
 
         self.horizontalTiles = ceil(self.width / self.tileWidth)
-        self.verticalTiles = ceil(self.width / self.tileWidth)
-        self.tiles = [[None for col in range(self.verticalTiles)] for row in range(self.horizontalTiles)]
+        self.verticalTiles = ceil(self.height / self.tileHeight)
         self.objects = []
         self.objectSelected = False
+        self.rebuildObjectIndex()
+        self.objectsChanged.emit()
 
-        for x, row in enumerate(range(self.horizontalTiles)):
-            for y, col in enumerate(range(self.verticalTiles)):
-                copy_x = x * self.tileWidth
-                copy_y = y * self.tileHeight
-                # copy + scale
-                pixmap = masterPixmap.copy(copy_x, copy_y, self.tileWidth, self.tileHeight).scaled(self.size - 2, self.size - 2)
-                pixmapItem = QGraphicsPixmapItem(pixmap)
-
-                # placement
-                x_pos = 1 + (x * (self.size))
-                y_pos = 1 + (y * (self.size))
+        # the sheet reads as empty until the tiles have been sliced in the background
+        self.tiles = [[None for col in range(self.verticalTiles)] for row in range(self.horizontalTiles)]
+        self.tileHashes = numpy.zeros((self.horizontalTiles, self.verticalTiles, 16), dtype=numpy.uint8)
+        self.emptyTiles = numpy.ones((self.horizontalTiles, self.verticalTiles), dtype=bool)
 
-                pixmapItem.setOffset(x_pos, y_pos)
-                self.tiles[x][y] = [pixmap, pixmapItem]
-                self.addItem(pixmapItem)
+        self.tileLoader = TileLoader(filePath, self.tileWidth, self.tileHeight, self.horizontalTiles, self.verticalTiles)
+        self.tileLoader.signals.loaded.connect(self.tilesLoaded)
+        self.tileLoader.start()
 
         self.parent.propertiesDock.setDetails(self)
         self.createGrid()
 
+    def tilesLoaded(self, filePath, sourceTiles, hashes, empty):
+        # a sheet imported again since this load started wins
+        if filePath != self.spriteFile or hashes.shape[:2] != (self.horizontalTiles, self.verticalTiles):
+            return
+
+        self.tileLoader = None
+        self.tiles = tileGrid(sourceTiles, hashes)
+        self.tileHashes = hashes
+        self.emptyTiles = empty
+
+        if self.tileGridItem is not None:
+            self.removeItem(self.tileGridItem)
+
+        # one item draws every tile at whatever level the view's zoom needs
+        self.tileGridItem = TileGridItem(self.tiles, self.size, self.emptyTiles)
+        self.addItem(self.tileGridItem)
+
+        # the first frames show straight away rather than at their first change
+        self.advanceAnimations(animationClock().now())
+        animationClock().register(self)
+        self.tilesReady.emit()
+
+    def objectAnimations(self):
+        if self.animations is None:
+            self.animations = [(obj, Animation([duration for _, _, duration in obj.frames]))
+                               for obj in self.objects if obj.isAnimated()]
+
+        return self.animations
+
+    def resetAnimations(self):
+        # frames may have been added or changed
+        self.animations = None
+
+        if self.tileGridItem is not None:
+            self.advanceAnimations(animationClock().now())
+
+        animationClock().schedule()
+
+    def nextFrameChange(self, now):
+        animations = self.objectAnimations()
+
+        if self.tileGridItem is None or not animations:
+            return None
+
+        return min(animation.nextChange(now) for _, animation in animations)
+
+    def advanceAnimations(self, now):
+        # animated objects play in place, their cells show each frame's tiles
+        if self.tileGridItem is None:
+            return
+
+        frames = {}
+
+        for obj, animation in self.objectAnimations():
+            dx, dy, _ = obj.frames[animation.frameAt(now)]
+
+            for x, y in obj.tiles:
+                if 0 <= x + dx < self.horizontalTiles and 0 <= y + dy < self.verticalTiles:
+                    frames[(x, y)] = (x + dx, y + dy)
+
+        previous = self.tileGridItem.frames
+        self.tileGridItem.frames = frames
+
+        changed = [cell for cell in set(frames) | set(previous) if frames.get(cell) != previous.get(cell)]
+        rects = visibleRects(self)
+
+        if not changed or not rects:
+            return
+
+        # one repaint covering every visible cell that changed frame
+        dirty = QRectF()
+
+        for x, y in changed:
+            cell = QRectF(x * self.size, y * self.size, self.size, self.size)
+
+            if any(cell.intersects(rect) for rect in rects):
+                dirty = dirty.united(cell)
+
+        if not dirty.isEmpty():
+            self.tileGridItem.update(dirty)
+
     def test(self):
         print("trigger context", flush=True)
 
@@ -482,8 +2119,6 @@ class SpriteSheetScene(QGraphicsScene):
         self.rows = self.horizontalTiles
         self.cols = self.verticalTiles
         
-        endPoint = self.rows * self.size
-
         if len(self.gridLines):
             for line in self.gridLines:
                 self.removeItem(line)
@@ -496,14 +2131,14 @@ class SpriteSheetScene(QGraphicsScene):
 
         if self.application.showGrid:
             # vertical lines
-            for i in range(0, self.cols + 1):
+            for i in range(0, self.rows + 1):
                 x = i * self.size
-                self.gridLines.append(self.addLine(x, 0, x, endPoint, self.gridPen))
+                self.gridLines.append(self.addLine(x, 0, x, self.cols * self.size, self.gridPen))
 
             # horizontal lines
-            for i in range(0, self.rows + 1):
+            for i in range(0, self.cols + 1):
                 y = i * self.size
-                self.gridLines.append(self.addLine(0, y, endPoint, y, self.gridPen))
+                self.gridLines.append(self.addLine(0, y, self.rows * self.size, y, self.gridPen))
 
     def fillGridItemCoordinates(self, x, y):
         #print(f"{x}x{y}", flush=True)
@@ -549,32 +2184,11 @@ class SpriteSheetScene(QGraphicsScene):
 
         #self.saveFile()
 
-        if len(self.objects):
-            for obj in self.objects:
-                for tile in obj.tiles:
-                    if tile[0] == gridItemX and tile[1] == gridItemY:
-                        foundObject = True
-
-                        startX = obj.tiles[0][0]
-                        startY = obj.tiles[0][1]
-
-                        endX = obj.tiles[-1][0]
-                        endY = obj.tiles[-1][1]
-
-                        leftPos = startX * self.size
-                        topPos = startY * self.size
-
-                        width = (endX - startX + 1) * self.size
-                        height = (endY - startY + 1) * self.size
-
-                        self.unselectAll()
-
-                        self.selectedGridItems[startX][startY] = self.addRect(QRectF(leftPos, topPos, width, height), QPen(Qt.yellow, 0), QBrush(QColor(255,255,0, 75)))
-
-                        self.objectSelected = True
-                        self.parent.objectPropertiesDock.setObject(obj)
+        objectIndex = self.objectIndex[gridItemX, gridItemY]
 
-                        break
+        if objectIndex >= 0:
+            foundObject = True
+            self.selectObject(self.objects[objectIndex])
 
         if not foundObject and self.tiles[gridItemX][gridItemY]:
 
@@ -593,6 +2207,49 @@ class SpriteSheetScene(QGraphicsScene):
                 self.removeItem(self.selectedGridItems[gridItemX][gridItemY])
                 self.selectedGridItems[gridItemX][gridItemY] = None
 
+    def selectObject(self, obj):
+        startX = obj.tiles[0][0]
+        startY = obj.tiles[0][1]
+
+        endX = obj.tiles[-1][0]
+        endY = obj.tiles[-1][1]
+
+        leftPos = startX * self.size
+        topPos = startY * self.size
+
+        width = (endX - startX + 1) * self.size
+        height = (endY - startY + 1) * self.size
+
+        self.unselectAll()
+
+        self.selectedGridItems[startX][startY] = self.addRect(QRectF(leftPos, topPos, width, height), QPen(Qt.yellow, 0), QBrush(QColor(255,255,0, 75)))
+
+        self.objectSelected = True
+        self.selectedObject = obj
+        self.parent.objectPropertiesDock.setObject(obj)
+        self.parent.objectsDock.setCurrentObject(obj)
+
+        if self.hitBoxOverlay:
+            self.hitBoxOverlay.update()
+
+    def keyTaken(self, key, obj = None):
+        # saved sheets key their objects by this, so it's unique and never empty
+        return key == '' or any(other.key == key for other in self.objects if other is not obj)
+
+    def unusedObjectNumbers(self, count):
+        # the lowest numbers whose object_N key is free, gaps left by deletes are reused
+        used = {obj.key for obj in self.objects}
+        numbers = []
+        number = 1
+
+        while len(numbers) < count:
+            if "object_" + str(number) not in used:
+                numbers.append(number)
+
+            number += 1
+
+        return numbers
+
     def unselectAll(self):
         for index_x, x in enumerate(self.selectedGridItems):
             for index_y, cell in enumerate(self.selectedGridItems[index_x]):
@@ -600,6 +2257,15 @@ class SpriteSheetScene(QGraphicsScene):
                     self.removeItem(cell)
                     self.selectedGridItems[index_x][index_y] = None
         self.objectSelected = False
+        self.selectedObject = None
+
+        # a hitbox being drawn belonged to the old selection
+        self.hitBoxStart = None
+        self.hitBoxPoints = []
+        self.hitBoxPreview.hide()
+
+        if self.hitBoxOverlay:
+            self.hitBoxOverlay.update()
 
     def deletePress(self):
         for index_x, x in enumerate(self.selectedGridItems):
@@ -612,6 +2278,145 @@ class SpriteSheetScene(QGraphicsScene):
                         self.gridItems[index_x][index_y].removeFromView()
                         self.gridItems[index_x][index_y] = None
 
+    def setHitBoxMode(self, enabled):
+        self.hitBoxMode = enabled
+        self.hitBoxStart = None
+        self.hitBoxPoints = []
+        self.hitBoxPreview.hide()
+
+        if enabled and self.hitBoxOverlay is None:
+            self.hitBoxOverlay = HitBoxOverlayItem(self)
+            self.addItem(self.hitBoxOverlay)
+        elif not enabled and self.hitBoxOverlay:
+            self.removeItem(self.hitBoxOverlay)
+            self.hitBoxOverlay = None
+
+    def hitBoxScale(self):
+        # sheet pixels to scene units
+        return (self.size / self.tileWidth, self.size / self.tileHeight)
+
+    def objectOrigin(self, obj):
+        left, top, _, _ = obj.bounds()
+        return QPointF(left * self.size, top * self.size)
+
+    def sceneToObject(self, obj, pos):
+        scaleX, scaleY = self.hitBoxScale()
+        origin = self.objectOrigin(obj)
+
+        return QPointF((pos.x() - origin.x()) / scaleX, (pos.y() - origin.y()) / scaleY)
+
+    def objectToScene(self, obj, point):
+        scaleX, scaleY = self.hitBoxScale()
+        origin = self.objectOrigin(obj)
+
+        return QPointF(origin.x() + point.x() * scaleX, origin.y() + point.y() * scaleY)
+
+    def hitBoxAt(self, pos):
+        for obj in self.objects:
+            if obj.hasCollision and obj.hitBox is not None:
+                if obj.hitBox.contains(self.sceneToObject(obj, pos), obj.footprint(self.tileWidth, self.tileHeight)):
+                    return obj
+
+        return None
+
+    def objectSceneRect(self, obj):
+        left, top, right, bottom = obj.bounds()
+        return QRectF(left * self.size, top * self.size, (right - left) * self.size, (bottom - top) * self.size)
+
+    def clampToObject(self, obj, point):
+        width, height = obj.footprint(self.tileWidth, self.tileHeight)
+        return QPointF(min(max(point.x(), 0), width), min(max(point.y(), 0), height))
+
+    def hitBoxPress(self, pos):
+        obj = self.selectedObject
+
+        if obj is None or not self.objectSceneRect(obj).contains(pos):
+            hovered = self.hitBoxAt(pos)
+
+            if hovered:
+                left, top, _, _ = hovered.bounds()
+                self.selectGridItemCoordinates(left * self.size, top * self.size)
+            else:
+                self.selectGridItemCoordinates(pos.x(), pos.y())
+
+            return
+
+        if obj.hitBox is None:
+            obj.hitBox = HitBox()
+
+        obj.hasCollision = True
+        point = self.clampToObject(obj, self.sceneToObject(obj, pos))
+
+        if obj.hitBox.hitBoxType == HitBoxType.POLYGON:
+            self.hitBoxPoints.append(point)
+            self.updateHitBoxPreview(point)
+        else:
+            self.hitBoxStart = point
+
+    def updateHitBoxPreview(self, point):
+        obj = self.selectedObject
+        path = QPainterPath()
+
+        if self.hitBoxPoints:
+            path.addPolygon(QPolygonF([self.objectToScene(obj, p) for p in self.hitBoxPoints + [point]]))
+        elif self.hitBoxStart is not None:
+            rect = QRectF(self.objectToScene(obj, self.hitBoxStart), self.objectToScene(obj, point)).normalized()
+
+            if obj.hitBox.hitBoxType == HitBoxType.ELLIPSE:
+                path.addEllipse(rect)
+            else:
+                path.addRect(rect)
+
+        self.hitBoxPreview.setPath(path)
+        self.hitBoxPreview.show()
+
+    def hitBoxRelease(self, pos):
+        obj = self.selectedObject
+
+        if obj is None or self.hitBoxStart is None:
+            return
+
+        rect = QRectF(self.hitBoxStart, self.clampToObject(obj, self.sceneToObject(obj, pos))).normalized()
+        self.hitBoxStart = None
+        self.hitBoxPreview.hide()
+
+        # snap to whole sheet pixels
+        hitBox = obj.hitBox
+        hitBox.x, hitBox.y = round(rect.x()), round(rect.y())
+        hitBox.width, hitBox.height = round(rect.right()) - hitBox.x, round(rect.bottom()) - hitBox.y
+        hitBox.invalidate()
+
+        self.hitBoxOverlay.update()
+        self.setModified()
+
+    def finishHitBoxPolygon(self):
+        obj = self.selectedObject
+
+        if obj is None or len(self.hitBoxPoints) < 3:
+            return
+
+        points = [(round(point.x()), round(point.y())) for point in self.hitBoxPoints]
+        left = min(point[0] for point in points)
+        top = min(point[1] for point in points)
+
+        hitBox = obj.hitBox
+        hitBox.x, hitBox.y = left, top
+        hitBox.width = max(point[0] for point in points) - left
+        hitBox.height = max(point[1] for point in points) - top
+        hitBox.shape = [[point[0] - left, point[1] - top] for point in points]
+        hitBox.invalidate()
+
+        self.hitBoxPoints = []
+        self.hitBoxPreview.hide()
+        self.hitBoxOverlay.update()
+        self.setModified()
+
+    def mouseDoubleClickEvent(self, e: QGraphicsSceneMouseEvent):
+        if self.hitBoxMode:
+            self.finishHitBoxPolygon()
+        else:
+            super().mouseDoubleClickEvent(e)
+
     def mousePressEvent(self, e: QGraphicsSceneMouseEvent):
         print("mousePressEvent")
         pos = e.scenePos()
@@ -619,7 +2424,9 @@ class SpriteSheetScene(QGraphicsScene):
         y = pos.y()
         button = e.button()
 
-        if button == Qt.MouseButton.LeftButton:
+        if self.hitBoxMode and button == Qt.MouseButton.LeftButton:
+            self.hitBoxPress(pos)
+        elif button == Qt.MouseButton.LeftButton:
             self.mouseDown = True
 
             self.selectGridItemCoordinates(x, y)
@@ -656,7 +2463,16 @@ class SpriteSheetScene(QGraphicsScene):
 
         self.moveGridTurtle(x, y)
 
-        if self.mouseDown:
+        if self.hitBoxMode:
+            hovered = self.hitBoxAt(pos)
+
+            if hovered is not self.hoveredObject:
+                self.hoveredObject = hovered
+                self.hitBoxOverlay.update()
+
+            if self.hitBoxStart is not None or self.hitBoxPoints:
+                self.updateHitBoxPreview(self.clampToObject(self.selectedObject, self.sceneToObject(self.selectedObject, pos)))
+        elif self.mouseDown:
             self.selectGridItemCoordinates(x, y, False)
 
     def tilesToObject(self):
@@ -684,12 +2500,97 @@ class SpriteSheetScene(QGraphicsScene):
         if len(tiles) == 0:
             return False
 
-        self.objects.append(SpriteObject("Object " + str(len(self.objects) + 1), "object_" + str(len(self.objects) + 1), '', tiles))
+        number = self.unusedObjectNumbers(1)[0]
+
+        self.objects.append(SpriteObject("Object " + str(number), "object_" + str(number), '', tiles))
+        self.rebuildObjectIndex()
+        self.objectsChanged.emit()
         # select it
         self.selectGridItemCoordinates(tiles[0][0] * self.size, tiles[0][1] * self.size)
 
         return True
 
+    def rebuildObjectIndex(self):
+        self.objectIndex = numpy.full((self.horizontalTiles, self.verticalTiles), -1, dtype=numpy.int32)
+
+        # the first object holding a tile wins, as when they were searched in order
+        for index in range(len(self.objects) - 1, -1, -1):
+            for x, y in self.objects[index].tiles:
+                if 0 <= x < self.horizontalTiles and 0 <= y < self.verticalTiles:
+                    self.objectIndex[x, y] = index
+
+    def editObjects(self, objects, changes, properties = None, text = "Edit objects"):
+        """
+        Apply the same attribute changes to every object as one undo step.
+        properties are merged into each object's extra properties, a None
+        value removes the key.
+        """
+        before = []
+        after = []
+
+        for obj in objects:
+            values = dict(changes)
+
+            # objects can share their properties dict, each gets its own copy
+            if properties:
+                merged = {**obj.extraProperties, **properties}
+                values['extraProperties'] = {key: value for key, value in merged.items() if value is not None}
+
+            if values.get('hasCollision') and obj.hitBox is None:
+                values['hitBox'] = HitBox()
+
+            before.append({name: getattr(obj, name) for name in values})
+            after.append(values)
+
+        if not objects or not any(after):
+            return
+
+        command = SpriteObjectsEditCommand(self, list(objects), before, after, text)
+        command.apply(after)
+        self.undoStack.push(command)
+
+    def autoSegment(self):
+        """
+        Propose an object for every group of touching non-empty tiles not
+        already in an object, each covering its group's bounding box. Groups
+        whose boxes overlap are merged so no tile ends up in two new objects.
+        """
+        free = ~self.emptyTiles & (self.objectIndex < 0)
+        mask = free
+
+        # filling the boxes in can join groups, repeat until the boxes settle
+        while True:
+            labels, count = labelComponents(mask)
+            bounds = componentBounds(labels, count)
+
+            boxes = numpy.zeros_like(free)
+
+            for x0, y0, x1, y1 in bounds:
+                boxes[x0:x1, y0:y1] = True
+
+            boxes &= self.objectIndex < 0
+
+            if numpy.array_equal(boxes, mask):
+                break
+
+            mask = boxes
+
+        numbers = self.unusedObjectNumbers(len(bounds))
+
+        for label, (x0, y0, x1, y1) in enumerate(bounds.tolist(), 1):
+            box = labels[x0:x1, y0:y1] == label
+            tiles = [[x0 + int(x), y0 + int(y)] for x, y in zip(*numpy.nonzero(box))]
+            number = numbers[label - 1]
+
+            self.objects.append(SpriteObject("Object " + str(number), "object_" + str(number), '', tiles))
+
+        # the index is rebuilt and the list refreshed once for the whole batch
+        self.rebuildObjectIndex()
+        self.objectsChanged.emit()
+        self.unselectAll()
+
+        return count
+
     def contextMenuEvent(self, e):
         print("contextMenuEvent", flush=True)
         pos = e.scenePos()
@@ -704,6 +2605,7 @@ class SpriteSheetScene(QGraphicsScene):
             # show context menu
             menu = QMenu()
             menu.addAction(self.tilesToObjectAction)
+            menu.addAction(self.autoSegmentAction)
             menu.popup(e.screenPos())
 
             # Else it gets garbage collected
@@ -712,6 +2614,9 @@ class SpriteSheetScene(QGraphicsScene):
             e.setAccepted(True)
 
     def mouseReleaseEvent(self, e: QGraphicsSceneMouseEvent):
+        if self.hitBoxMode:
+            self.hitBoxRelease(e.scenePos())
+
         self.mouseDown = False
 
 # For the view inside the dock when interacting with a map
@@ -724,12 +2629,44 @@ class MiniSpriteSheetScene(QGraphicsScene):
 
         self.selectedGridItems = None
         self.spriteSheet = spriteSheet
+        self.gridPen = QPen(Qt.black, 0, Qt.DashLine)
 
         self.setBackgroundBrush(QBrush(QColor(220,220,220)))        
+        self.setSceneRect(0, 0, spriteSheet.horizontalTiles * spriteSheet.size, spriteSheet.verticalTiles * spriteSheet.size)
+
+        # the whole sheet is one downscaled pixmap, cells are hit tested from coordinates
+        self.thumbnailItem = self.addPixmap(QPixmap())
+        self.thumbnailItem.setScale(spriteSheet.size / THUMBNAIL_TILE_SIZE)
+        self.thumbnailItem.setTransformationMode(Qt.SmoothTransformation)
+
+        self.thumbnailLoader = ThumbnailLoader(spriteSheet.spriteFile, spriteSheet.tileWidth, spriteSheet.tileHeight,
+                                               spriteSheet.horizontalTiles, spriteSheet.verticalTiles)
+        self.thumbnailLoader.signals.loaded.connect(self.thumbnailLoaded)
+        self.thumbnailLoader.start()
 
         self.gridTurtle = self.addRect(QRectF(0, 0, spriteSheet.size, spriteSheet.size), QPen(Qt.yellow, 0), QBrush(QColor(128,128,0, 75)))
         self.gridTurtle.setZValue(100) #always on top
 
+        self.placementItem = None
+        # cell a drag started on, dragging over several tiles picks them as a stamp
+        self.dragStart = None
+
+    def thumbnailLoaded(self, image):
+        self.thumbnailItem.setPixmap(QPixmap.fromImage(image))
+
+    def drawForeground(self, painter, rect):
+        size = self.spriteSheet.size
+        rows = self.spriteSheet.horizontalTiles
+        cols = self.spriteSheet.verticalTiles
+
+        painter.setPen(self.gridPen)
+
+        for i in range(max(int(rect.left() // size), 0), min(int(rect.right() // size) + 1, rows) + 1):
+            painter.drawLine(QPointF(i * size, 0), QPointF(i * size, cols * size))
+
+        for i in range(max(int(rect.top() // size), 0), min(int(rect.bottom() // size) + 1, cols) + 1):
+            painter.drawLine(QPointF(0, i * size), QPointF(rows * size, i * size))
+
     def moveGridTurtle(self, x, y):
         # align to inside grid item
         gridItemX = int(x // self.spriteSheet.size) 
@@ -737,13 +2674,13 @@ class MiniSpriteSheetScene(QGraphicsScene):
 
         if gridItemX < 0:
             gridItemX = 0
-        elif gridItemX >= self.spriteSheet.verticalTiles:
-            gridItemX = self.spriteSheet.verticalTiles - 1
+        elif gridItemX >= self.spriteSheet.horizontalTiles:
+            gridItemX = self.spriteSheet.horizontalTiles - 1
 
         if gridItemY < 0:
             gridItemY = 0
-        elif gridItemY >= self.spriteSheet.horizontalTiles:
-            gridItemY = self.spriteSheet.horizontalTiles - 1
+        elif gridItemY >= self.spriteSheet.verticalTiles:
+            gridItemY = self.spriteSheet.verticalTiles - 1
 
         self.gridTurtle.setPos(QPointF(float(gridItemX * self.spriteSheet.size), float(gridItemY * self.spriteSheet.size)))
 
@@ -753,4 +2690,74 @@ class MiniSpriteSheetScene(QGraphicsScene):
         x = pos.x()
         y = pos.y()
 
-        self.moveGridTurtle(x, y)
\ No newline at end of file
+        self.moveGridTurtle(x, y)
+
+        if self.dragStart is not None and self.placementItem:
+            self.placementItem.setRect(self.dragRect(x, y))
+
+    def dragRect(self, x, y):
+        size = self.spriteSheet.size
+        endX = min(max(int(x // size), 0), self.spriteSheet.horizontalTiles - 1)
+        endY = min(max(int(y // size), 0), self.spriteSheet.verticalTiles - 1)
+        x0, y0, x1, y1 = orderedRect(*self.dragStart, endX, endY)
+
+        return QRectF(x0 * size, y0 * size, (x1 - x0) * size, (y1 - y0) * size)
+
+    def mouseReleaseEvent(self, e: QGraphicsSceneMouseEvent):
+        if self.dragStart is None:
+            return
+
+        pos = e.scenePos()
+        size = self.spriteSheet.size
+        rect = self.dragRect(pos.x(), pos.y())
+        self.dragStart = None
+
+        tab = self.application.workAreaWidget.activeTab()
+
+        if rect.width() <= size and rect.height() <= size or tab is None or not isinstance(tab.scene, MapScene):
+            return
+
+        x0, y0 = int(rect.left() // size), int(rect.top() // size)
+        x1, y1 = x0 + int(round(rect.width() / size)), y0 + int(round(rect.height() / size))
+
+        tab.scene.setPlacementStamp(tab.scene.sheetStamp(self.spriteSheet, x0, y0, x1, y1))
+
+    def mousePressEvent(self, e: QGraphicsSceneMouseEvent):
+        pos = e.scenePos()
+        size = self.spriteSheet.size
+
+        gridItemX = int(pos.x() // size)
+        gridItemY = int(pos.y() // size)
+
+        if pos.x() < 0 or pos.y() < 0 or gridItemX >= self.spriteSheet.horizontalTiles or gridItemY >= self.spriteSheet.verticalTiles:
+            return
+
+        tab = self.application.workAreaWidget.activeTab()
+
+        if tab is None or not isinstance(tab.scene, MapScene):
+            return
+
+        foundObject = None
+
+        for obj in self.spriteSheet.objects:
+            if [gridItemX, gridItemY] in obj.tiles:
+                foundObject = obj
+                break
+
+        if self.placementItem:
+            self.removeItem(self.placementItem)
+
+        if foundObject:
+            tab.scene.setPlacementObject(foundObject, self.spriteSheet)
+
+            xs = [tile[0] for tile in foundObject.tiles]
+            ys = [tile[1] for tile in foundObject.tiles]
+            rect = QRectF(min(xs) * size, min(ys) * size, (max(xs) - min(xs) + 1) * size, (max(ys) - min(ys) + 1) * size)
+        else:
+            tab.scene.setPlacementTiles([[gridItemX, gridItemY]], self.spriteSheet)
+            rect = QRectF(gridItemX * size, gridItemY * size, size, size)
+
+        self.placementItem = self.addRect(rect, QPen(Qt.blue, 0), QBrush(QColor(0,0,255, 75)))
+        self.placementItem.setZValue(99)
+
+        self.dragStart = (gridItemX, gridItemY)
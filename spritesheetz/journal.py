@@ -0,0 +1,255 @@
+import os
+import json
+import uuid
+import struct
+import zlib
+import numpy
+from glob import glob
+from PySide6.QtCore import QObject, QTimer, QElapsedTimer, QLockFile, QStandardPaths, QRunnable
+
+from spritesheetz.objects import INSTANCE_DTYPE
+from spritesheetz.saving import writerPool, writeFileAtomic
+
+# ms between handing batched records to the writer, at most this much is lost in a crash
+JOURNAL_FLUSH_INTERVAL = 500
+# a fresh snapshot replaces the journal once it has run this long or grown this big,
+# which bounds how much a recovery has to replay
+JOURNAL_SNAPSHOT_INTERVAL = 60000
+JOURNAL_SNAPSHOT_BYTES = 16 * 1024 * 1024
+
+# Record kinds
+RECORD_BASE = 0
+RECORD_CELLS = 1
+RECORD_INSTANCES = 2
+
+# layer arrays a cells record can carry, in the order they follow its header
+JOURNAL_ARRAYS = [('tiles', numpy.int32), ('terrain', numpy.int16), ('fills', numpy.uint32)]
+
+FRAME_HEADER = struct.Struct('<II')
+CELLS_HEADER = struct.Struct('<BHiiiiB')
+
+def recoveryDirectory():
+    # named like the settings rather than after whichever script started the app
+    path = os.path.join(QStandardPaths.writableLocation(QStandardPaths.GenericDataLocation), 'Bamboo', 'SpriteSheetz', 'recovery')
+    os.makedirs(path, exist_ok=True)
+
+    return path
+
+def frame(payload):
+    # length and crc first so a record torn by a crash is recognised and dropped
+    return FRAME_HEADER.pack(len(payload), zlib.crc32(payload)) + payload
+
+def baseRecord(base):
+    return frame(bytes([RECORD_BASE]) + json.dumps(base).encode('utf-8'))
+
+def cellsRecord(layerIndex, x0, y0, x1, y1, arrays):
+    mask = 0
+    data = []
+
+    for bit, (name, dtype) in enumerate(JOURNAL_ARRAYS):
+        if name in arrays:
+            mask |= 1 << bit
+            data.append(numpy.ascontiguousarray(arrays[name][x0:x1, y0:y1], dtype=dtype).tobytes())
+
+    return frame(CELLS_HEADER.pack(RECORD_CELLS, layerIndex, x0, y0, x1, y1, mask) + b''.join(data))
+
+def instancesRecord(records):
+    return frame(bytes([RECORD_INSTANCES]) + numpy.ascontiguousarray(records).tobytes())
+
+def readJournal(path):
+    """
+    The base and the records of a journal file as (base dict, [payload]),
+    reading stops at the first incomplete or corrupt record.
+    """
+    with open(path, 'rb') as file:
+        data = file.read()
+
+    payloads = []
+    offset = 0
+
+    while offset + FRAME_HEADER.size <= len(data):
+        length, crc = FRAME_HEADER.unpack_from(data, offset)
+        payload = data[offset + FRAME_HEADER.size:offset + FRAME_HEADER.size + length]
+
+        if len(payload) != length or zlib.crc32(payload) != crc:
+            break
+
+        payloads.append(payload)
+        offset += FRAME_HEADER.size + length
+
+    if not payloads or payloads[0][0] != RECORD_BASE:
+        return None, []
+
+    return json.loads(payloads[0][1:].decode('utf-8')), payloads[1:]
+
+def replayRecord(scene, payload):
+    # records hold the state after each change, replaying them in order rebuilds the map
+    if payload[0] == RECORD_CELLS:
+        _, layerIndex, x0, y0, x1, y1, mask = CELLS_HEADER.unpack_from(payload)
+        offset = CELLS_HEADER.size
+        layer = scene.layers[layerIndex]
+        shape = (x1 - x0, y1 - y0)
+
+        for bit, (name, dtype) in enumerate(JOURNAL_ARRAYS):
+            if mask & (1 << bit):
+                count = shape[0] * shape[1]
+                values = numpy.frombuffer(payload, dtype=dtype, count=count, offset=offset).reshape(shape)
+                grid = layer.allocateFills() if name == 'fills' else getattr(layer, name)
+                grid[x0:x1, y0:y1] = values
+                offset += count * numpy.dtype(dtype).itemsize
+
+        scene.cellsChanged(layerIndex, x0, y0, x1, y1)
+    elif payload[0] == RECORD_INSTANCES:
+        previous = scene.instances.view().copy()
+        scene.instances.replace(numpy.frombuffer(payload, dtype=INSTANCE_DTYPE, offset=1).copy())
+
+        for objectId, x, y, layerIndex in numpy.setxor1d(previous, scene.instances.view()):
+            width, height = scene.objectSizes[objectId]
+            scene.cellsChanged(int(layerIndex), int(x), int(y), int(x + width), int(y + height))
+
+class JournalWriter(QRunnable):
+    # runs on the single writer thread, so jobs land in the order they were queued
+    def __init__(self, path, data, truncate = False, snapshotPath = None, snapshotText = None, staleSnapshot = None):
+        super().__init__()
+
+        self.path = path
+        self.data = data
+        self.truncate = truncate
+        self.snapshotPath = snapshotPath
+        self.snapshotText = snapshotText
+        self.staleSnapshot = staleSnapshot
+
+    def run(self):
+        try:
+            # the new snapshot is complete before the journal points at it
+            if self.snapshotPath:
+                writeFileAtomic(self.snapshotPath, self.snapshotText)
+
+            with open(self.path, 'wb' if self.truncate else 'ab') as file:
+                file.write(self.data)
+
+            if self.staleSnapshot and os.path.exists(self.staleSnapshot):
+                os.remove(self.staleSnapshot)
+        except OSError as error:
+            print(f"Couldn't write journal {self.path}: {error}", flush=True)
+
+# Crash recovery for one map. Every cell change is recorded as the new contents
+# of the changed rect, batched and appended to a journal file off the ui thread.
+# Changes records don't cover, like new layers or regions, and journals that
+# have grown too long start over from a snapshot of the whole map. A map that
+# was just loaded or saved needs no snapshot, its file is the base.
+class MapJournal(QObject):
+    def __init__(self, scene):
+        super().__init__()
+
+        self.scene = scene
+        self.journalId = uuid.uuid4().hex
+        self.directory = recoveryDirectory()
+        self.path = os.path.join(self.directory, self.journalId + '.journal')
+
+        # held while the map is open, a journal whose lock is free was left by a crash
+        self.lock = QLockFile(os.path.join(self.directory, self.journalId + '.lock'))
+        self.lock.tryLock(0)
+
+        self.pending = []
+        self.needsBase = True
+        self.generation = 0
+        self.snapshotPath = None
+        self.journalBytes = 0
+        self.instancesVersion = scene.instances.version
+
+        self.sinceBase = QElapsedTimer()
+        self.sinceBase.start()
+
+        self.timer = QTimer(self)
+        self.timer.setInterval(JOURNAL_FLUSH_INTERVAL)
+        self.timer.timeout.connect(self.flush)
+        self.timer.start()
+
+        scene.cellsDirty.connect(self.cellsChanged)
+        scene.mapReset.connect(self.rebase)
+        scene.mapEdited.connect(self.rebase)
+        # only once the file is actually written, a failed save keeps the journal going
+        scene.mapSaved.connect(self.rebase)
+
+    def rebase(self):
+        # whatever is pending is covered by the base taken at the next flush
+        self.needsBase = True
+        self.pending = []
+
+    def cellsChanged(self, layerIndex, x0, y0, x1, y1):
+        if self.needsBase:
+            return
+
+        self.pending.append(cellsRecord(layerIndex, x0, y0, x1, y1, self.scene.layers[layerIndex].dataArrays()))
+
+        # placed objects repaint through cellsChanged too
+        if self.scene.instances.version != self.instancesVersion:
+            self.instancesVersion = self.scene.instances.version
+            self.pending.append(instancesRecord(self.scene.instances.view()))
+
+    def flush(self):
+        if not self.needsBase and (self.journalBytes > JOURNAL_SNAPSHOT_BYTES or
+                                   (self.journalBytes and self.sinceBase.elapsed() > JOURNAL_SNAPSHOT_INTERVAL)):
+            self.rebase()
+
+        if self.needsBase:
+            self.writeBase()
+        elif self.pending:
+            data = b''.join(self.pending)
+            self.pending = []
+            self.journalBytes += len(data)
+
+            writerPool().start(JournalWriter(self.path, data))
+
+    def writeBase(self):
+        scene = self.scene
+        base = {'name': scene.name, 'fileName': scene.fileName, 'snapshot': None}
+        staleSnapshot = self.snapshotPath
+        snapshotText = None
+
+        if scene.modified or not scene.fileName:
+            self.generation += 1
+            self.snapshotPath = os.path.join(self.directory, f"{self.journalId}.{self.generation}.json")
+            snapshotText = scene.saveText()
+            base['snapshot'] = self.snapshotPath
+        else:
+            self.snapshotPath = None
+
+        writerPool().start(JournalWriter(self.path, baseRecord(base), True,
+                                         base['snapshot'], snapshotText, staleSnapshot))
+
+        self.needsBase = False
+        self.pending = []
+        self.journalBytes = 0
+        self.instancesVersion = scene.instances.version
+        self.sinceBase.restart()
+
+    def close(self):
+        # a clean close leaves nothing to recover
+        self.timer.stop()
+        writerPool().waitForDone()
+        self.lock.unlock()
+        removeJournal(self.path)
+
+def removeJournal(path):
+    stem = path[:-len('.journal')]
+
+    for leftover in [path, stem + '.lock'] + glob(stem + '.*.json'):
+        if os.path.exists(leftover):
+            os.remove(leftover)
+
+def abandonedJournals():
+    """
+    Journals left behind by a crash, as (path, lock) with the lock held so
+    another running copy of the app doesn't recover them too.
+    """
+    journals = []
+
+    for path in glob(os.path.join(recoveryDirectory(), '*.journal')):
+        lock = QLockFile(path[:-len('.journal')] + '.lock')
+
+        if lock.tryLock(0):
+            journals.append((path, lock))
+
+    return journals
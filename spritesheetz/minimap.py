@@ -0,0 +1,192 @@
+import numpy
+from math import ceil
+from PySide6.QtCore import Qt, QTimer, QElapsedTimer, QRectF, QPointF
+from PySide6.QtGui import QPainter, QPen, QColor, QImage
+from PySide6.QtWidgets import QWidget
+
+from spritesheetz.cache import arrayToImage
+from spritesheetz.objects import MapLayerType
+
+# Longest side of the overview image in pixels, bigger maps average blocks of cells
+MINIMAP_SIZE = 512
+# Cells per side of the chunks the overview is redrawn in
+MINIMAP_CHUNK = 64
+# ms of chunk work done per pass of the event loop, edits in the meantime are coalesced
+MINIMAP_BUDGET = 8
+MINIMAP_DELAY = 50
+
+def averageColors(tiles):
+    """
+    Alpha weighted mean colour of each tile in a (horizontalTiles,
+    verticalTiles, tileHeight, tileWidth, 4) array, as (horizontalTiles,
+    verticalTiles, 4) RGBA.
+    """
+    colors = numpy.zeros(tiles.shape[:2] + (4,), dtype=numpy.uint8)
+
+    # a column at a time keeps the float copy small for big atlases
+    for x in range(tiles.shape[0]):
+        pixels = tiles[x].reshape(tiles.shape[1], -1, 4).astype(numpy.float32)
+        alpha = pixels[:, :, 3:]
+        weight = numpy.maximum(alpha.sum(axis=1), 1)
+
+        colors[x, :, :3] = (pixels[:, :, :3] * alpha).sum(axis=1) / weight
+        colors[x, :, 3] = pixels[:, :, 3].mean(axis=1)
+
+    return colors
+
+# The whole map as one small image, redrawn a chunk at a time as cells change,
+# with the views' visible area outlined. Clicking or dragging moves the view.
+class MinimapWidget(QWidget):
+    def __init__(self, scene, view):
+        super().__init__()
+
+        self.scene = scene
+        self.view = view
+
+        self.dirty = set()
+        self.image = QImage()
+
+        self.background = QColor(220, 220, 220)
+        self.viewportPen = QPen(Qt.red, 0)
+
+        self.timer = QTimer(self)
+        self.timer.setSingleShot(True)
+        self.timer.timeout.connect(self.flush)
+
+        scene.cellsDirty.connect(self.cellsChanged)
+        scene.mapReset.connect(self.reset)
+
+        for scrollBar in [view.horizontalScrollBar(), view.verticalScrollBar()]:
+            scrollBar.valueChanged.connect(self.update)
+            scrollBar.rangeChanged.connect(self.update)
+
+        self.setMinimumSize(128, 128)
+        self.reset()
+
+    def reset(self):
+        scene = self.scene
+
+        # cells averaged into each pixel, chunks always hold whole blocks
+        self.block = max(ceil(max(scene.rows, scene.cols) / MINIMAP_SIZE), 1)
+        self.chunk = self.block * max(MINIMAP_CHUNK // self.block, 1)
+        self.pixels = numpy.zeros((ceil(scene.cols / self.block), ceil(scene.rows / self.block), 4), dtype=numpy.uint8)
+
+        # tile id -> colour, in the same order the scene hands out ids
+        self.tileColors = numpy.concatenate([numpy.zeros((1, 4), dtype=numpy.uint8)] +
+                                            [spriteSheet.tileColors.transpose(1, 0, 2).reshape(-1, 4) for spriteSheet in scene.spriteSheets])
+        self.objectColors = numpy.array([self.tileColors[[spriteSheet.tileId(*tile) for tile in obj.tiles]].mean(axis=0)
+                                         for spriteSheet, obj in scene.mapObjects], dtype=numpy.uint8).reshape(-1, 4)
+
+        self.dirty = {(chunkX, chunkY) for chunkX in range(ceil(scene.rows / self.chunk)) for chunkY in range(ceil(scene.cols / self.chunk))}
+        self.timer.start(0)
+
+    def cellsChanged(self, layerIndex, x0, y0, x1, y1):
+        for chunkX in range(x0 // self.chunk, (x1 - 1) // self.chunk + 1):
+            for chunkY in range(y0 // self.chunk, (y1 - 1) // self.chunk + 1):
+                self.dirty.add((chunkX, chunkY))
+
+        if not self.timer.isActive():
+            self.timer.start(MINIMAP_DELAY)
+
+    def flush(self):
+        elapsed = QElapsedTimer()
+        elapsed.start()
+
+        while self.dirty and elapsed.elapsed() < MINIMAP_BUDGET:
+            self.renderChunk(*self.dirty.pop())
+
+        self.image = arrayToImage(self.pixels)
+        self.update()
+
+        # big rebuilds carry on once pending events have had their turn
+        if self.dirty:
+            self.timer.start(0)
+
+    def renderChunk(self, chunkX, chunkY):
+        scene = self.scene
+        x0, y0 = chunkX * self.chunk, chunkY * self.chunk
+        x1, y1 = min(x0 + self.chunk, scene.rows), min(y0 + self.chunk, scene.cols)
+
+        if x0 >= x1 or y0 >= y1:
+            return
+
+        cells = numpy.zeros((x1 - x0, y1 - y0, 4), dtype=numpy.uint8)
+        records = scene.instances.view()
+
+        # upper layers cover lower ones wherever they have something
+        for layerIndex, layer in enumerate(scene.layers):
+            if layer.layerType != MapLayerType.TILES:
+                continue
+
+            tiles = layer.tiles[x0:x1, y0:y1]
+            cells = numpy.where((tiles > 0)[:, :, None], self.tileColors[numpy.minimum(tiles, len(self.tileColors) - 1)], cells)
+
+            if layer.fills is not None:
+                fills = layer.fills[x0:x1, y0:y1]
+                # packed 0xRRGGBBAA, big endian bytes are already in RGBA order
+                cells = numpy.where((fills > 0)[:, :, None], fills.astype('>u4').view(numpy.uint8).reshape(fills.shape + (4,)), cells)
+
+            for index in scene.instances.inRect(scene.objectSizes, x0, y0, x1, y1, layerIndex):
+                objectId, x, y = records[index]['object'], records[index]['x'], records[index]['y']
+                width, height = scene.objectSizes[objectId]
+                cells[max(x - x0, 0):max(x + width - x0, 0), max(y - y0, 0):max(y + height - y0, 0)] = self.objectColors[objectId]
+
+        # average blocks of cells into pixels, partial blocks at the map edge count what they have
+        block = self.block
+        width, height = ceil((x1 - x0) / block), ceil((y1 - y0) / block)
+        padded = numpy.zeros((width * block, height * block, 4), dtype=numpy.float32)
+        padded[:x1 - x0, :y1 - y0] = cells
+        counts = numpy.zeros((width * block, height * block), dtype=numpy.float32)
+        counts[:x1 - x0, :y1 - y0] = 1
+
+        sums = padded.reshape(width, block, height, block, 4).sum(axis=(1, 3))
+        pixels = sums / counts.reshape(width, block, height, block).sum(axis=(1, 3))[:, :, None]
+
+        # the image is indexed [y, x]
+        self.pixels[y0 // block:y0 // block + height, x0 // block:x0 // block + width] = pixels.transpose(1, 0, 2).astype(numpy.uint8)
+
+    def imageRect(self):
+        # where the image is drawn, scaled to fit while keeping its shape
+        if self.image.isNull():
+            return QRectF()
+
+        scale = min(self.width() / self.image.width(), self.height() / self.image.height())
+        width, height = self.image.width() * scale, self.image.height() * scale
+
+        return QRectF((self.width() - width) / 2, (self.height() - height) / 2, width, height)
+
+    def paintEvent(self, event):
+        painter = QPainter(self)
+        painter.fillRect(self.rect(), self.background)
+
+        target = self.imageRect()
+
+        if target.isEmpty():
+            return
+
+        painter.drawImage(target, self.image)
+
+        # the view's visible area, scene units -> cells -> image pixels -> widget
+        scale = target.width() / (self.image.width() * self.block * self.scene.size)
+        visible = self.view.mapToScene(self.view.viewport().rect()).boundingRect()
+
+        painter.setPen(self.viewportPen)
+        painter.drawRect(QRectF(target.left() + visible.left() * scale, target.top() + visible.top() * scale,
+                                visible.width() * scale, visible.height() * scale).intersected(target))
+
+    def jumpTo(self, pos):
+        target = self.imageRect()
+
+        if target.isEmpty():
+            return
+
+        scale = target.width() / (self.image.width() * self.block * self.scene.size)
+        self.view.centerOn(QPointF((pos.x() - target.left()) / scale, (pos.y() - target.top()) / scale))
+
+    def mousePressEvent(self, event):
+        if event.button() == Qt.LeftButton:
+            self.jumpTo(event.position())
+
+    def mouseMoveEvent(self, event):
+        if event.buttons() & Qt.LeftButton:
+            self.jumpTo(event.position())
@@ -0,0 +1,75 @@
+from math import floor, log2
+from PySide6.QtCore import Qt, QRectF
+from PySide6.QtGui import QPainter
+from PySide6.QtWidgets import QGraphicsItem, QStyleOptionGraphicsItem
+
+# A pixmap kept at its native resolution, halved levels are only made once a
+# view zooms out far enough to draw them
+class MipPixmap:
+    __slots__ = ('levels',)
+
+    def __init__(self, pixmap):
+        self.levels = [pixmap]
+
+    def level(self, drawnSize):
+        # the smallest level that is still at least as big as it will be drawn
+        base = self.levels[0]
+        index = max(int(floor(log2(max(base.width(), 1) / max(drawnSize, 1)))), 0)
+
+        while len(self.levels) <= index:
+            previous = self.levels[-1]
+
+            if previous.width() <= 1 and previous.height() <= 1:
+                return previous
+
+            self.levels.append(previous.scaled(max(previous.width() // 2, 1), max(previous.height() // 2, 1),
+                                               Qt.IgnoreAspectRatio, Qt.SmoothTransformation))
+
+        return self.levels[index]
+
+def levelOfDetail(painter):
+    return QStyleOptionGraphicsItem.levelOfDetailFromTransform(painter.worldTransform())
+
+def drawMipPixmap(painter, rect, mip, detail):
+    # pixel art is magnified nearest neighbour, minified from the matching level
+    pixmap = mip.level(rect.width() * detail)
+    painter.drawPixmap(rect, pixmap, QRectF(pixmap.rect()))
+
+# Draws a [x][y] grid of MipPixmaps in cells of size, inset by the 1px border,
+# skipping any cell flagged in empty. frames maps (x, y) cells to the cell
+# whose tile they currently show.
+class TileGridItem(QGraphicsItem):
+    def __init__(self, tiles, size, empty = None):
+        super().__init__()
+
+        self.tiles = tiles
+        self.size = size
+        self.empty = empty
+        self.frames = {}
+
+        self.setFlag(QGraphicsItem.ItemUsesExtendedStyleOption)
+
+    def boundingRect(self):
+        rows = len(self.tiles)
+        cols = len(self.tiles[0]) if rows else 0
+
+        return QRectF(0, 0, rows * self.size, cols * self.size)
+
+    def paint(self, painter, option, widget = None):
+        size = self.size
+        exposed = option.exposedRect
+        detail = levelOfDetail(painter)
+
+        rows = len(self.tiles)
+        cols = len(self.tiles[0]) if rows else 0
+
+        painter.setRenderHint(QPainter.SmoothPixmapTransform, False)
+
+        for x in range(max(int(exposed.left() // size), 0), min(int(exposed.right() // size) + 1, rows)):
+            for y in range(max(int(exposed.top() // size), 0), min(int(exposed.bottom() // size) + 1, cols)):
+                frameX, frameY = self.frames.get((x, y), (x, y))
+
+                if self.empty is not None and self.empty[frameX, frameY]:
+                    continue
+
+                drawMipPixmap(painter, QRectF(x * size + 1, y * size + 1, size - 2, size - 2), self.tiles[frameX][frameY][0], detail)
@@ -0,0 +1,272 @@
+import heapq
+from math import sqrt
+import numpy
+
+from spritesheetz.tools import labelComponents
+
+DIAGONAL_COST = sqrt(2)
+
+# Walkability derived from the map's layers, kept in step with edits one
+# changed region at a time along with the connected regions
+class NavigationGrid:
+    def __init__(self, rows, cols):
+        self.rows = rows
+        self.cols = cols
+        self.walkable = numpy.ones((rows, cols), dtype=bool)
+        self.relabel()
+
+    def rebuild(self, scene):
+        self.rows = scene.rows
+        self.cols = scene.cols
+        self.walkable = ~self.blockedCells(scene, 0, 0, self.rows, self.cols)
+        self.relabel()
+
+    def relabel(self):
+        # connected walkable regions, 0 where blocked. Edits patch the labels so
+        # cells in different regions are always disconnected, regions in suspect
+        # may have been cut apart and are relabelled when a query needs them
+        self.regions, self.regionCount = labelComponents(self.walkable)
+        # label -> the region it has been merged into, always pointing straight at the root
+        self.parents = numpy.arange(self.regionCount + 1, dtype=numpy.int32)
+        self.labelCount = self.regionCount + 1
+        self.suspect = set()
+        # whether regions are still exactly as labelled, which export needs
+        self.exact = True
+
+    def blockedCells(self, scene, x0, y0, x1, y1):
+        blocking = scene.blockingTiles()
+        blocked = numpy.zeros((x1 - x0, y1 - y0), dtype=bool)
+
+        for layer in scene.layers:
+            blocked |= blocking[layer.tiles[x0:x1, y0:y1]]
+
+        blocked |= scene.blockingInstances(x0, y0, x1, y1)
+
+        return blocked
+
+    def updateCells(self, scene, x0, y0, x1, y1):
+        walkable = ~self.blockedCells(scene, x0, y0, x1, y1)
+        region = self.walkable[x0:x1, y0:y1]
+        closed = region & ~walkable
+
+        if numpy.array_equal(region, walkable):
+            return
+
+        region[:] = walkable
+        self.regions[x0:x1, y0:y1][closed] = 0
+        self.exact = False
+
+        # big edits are cheaper to label from scratch than to patch
+        if (x1 - x0) * (y1 - y0) * 4 >= self.rows * self.cols:
+            self.relabel()
+        else:
+            self.patchRegions(max(x0 - 1, 0), max(y0 - 1, 0), min(x1 + 1, self.rows), min(y1 + 1, self.cols), closed.any())
+
+    def patchRegions(self, x0, y0, x1, y1, closed):
+        """
+        Update labels after an edit inside the window, which keeps a border of
+        untouched cells around it. Opened cells join every region they touch.
+        Blocked cells can only split a region whose cells in the window no
+        longer connect inside it, those regions are marked suspect.
+        """
+        local, count = labelComponents(self.walkable[x0:x1, y0:y1])
+        regions = self.regions[x0:x1, y0:y1]
+        roots = self.parents[regions]
+        known = roots > 0
+
+        # (component, root) for every region each component of the window touches
+        pairs = numpy.unique(numpy.stack([local[known], roots[known]], axis=1), axis=0)
+        targets = numpy.zeros(count + 1, dtype=numpy.int32)
+        splits = numpy.searchsorted(pairs[:, 0], numpy.arange(1, count + 2))
+
+        for component in range(1, count + 1):
+            touched = pairs[splits[component - 1]:splits[component], 1]
+
+            if len(touched) == 0:
+                targets[component] = self.newLabels(1)
+                continue
+
+            target = targets[component] = touched[0]
+
+            for root in touched[1:]:
+                self.merge(target, root)
+
+        # opened cells take their component's region
+        opened = (local > 0) & ~known
+        regions[opened] = targets[local[opened]]
+
+        if closed:
+            roots = self.parents[regions]
+            known = local > 0
+            pairs = numpy.unique(numpy.stack([local[known], roots[known]], axis=1), axis=0)
+            split, counts = numpy.unique(pairs[:, 1], return_counts=True)
+
+            for root in split[counts > 1]:
+                if not self.separatePockets(root, x0, y0, x1, y1):
+                    self.suspect.add(int(root))
+
+    def separatePockets(self, root, x0, y0, x1, y1):
+        """
+        Look for where a region's cells in the window still meet in growing
+        windows around it. Pieces closed off inside a window become regions of
+        their own, if more than one piece runs out of the largest window the
+        region is left for splitRegion.
+        """
+        for margin in (8, 32, 128):
+            wx0, wy0 = max(x0 - margin, 0), max(y0 - margin, 0)
+            wx1, wy1 = min(x1 + margin, self.rows), min(y1 + margin, self.cols)
+            local, _ = labelComponents(self.parents[self.regions[wx0:wx1, wy0:wy1]] == root)
+            inner = local[x0 - wx0:x1 - wx0, y0 - wy0:y1 - wy0]
+            pieces = numpy.unique(inner[inner > 0])
+
+            if len(pieces) <= 1:
+                return True
+
+            # pieces reaching an edge of the window that isn't the map's edge may go on outside it
+            edges = [local[0, :] if wx0 > 0 else None, local[-1, :] if wx1 < self.rows else None,
+                     local[:, 0] if wy0 > 0 else None, local[:, -1] if wy1 < self.cols else None]
+            edges = [edge for edge in edges if edge is not None]
+            reaching = numpy.isin(pieces, numpy.concatenate(edges)) if edges else numpy.zeros(len(pieces), dtype=bool)
+
+            if reaching.sum() <= 1:
+                # keep the open piece, or the first when all are closed, in the region
+                enclosed = pieces[~reaching] if reaching.any() else pieces[1:]
+                first = self.newLabels(len(enclosed))
+                regions = self.regions[wx0:wx1, wy0:wy1]
+
+                for index, piece in enumerate(enclosed):
+                    regions[local == piece] = first + index
+
+                return True
+
+        return False
+
+    def newLabels(self, count):
+        first = self.labelCount
+        self.labelCount += count
+
+        if self.labelCount > len(self.parents):
+            self.parents = numpy.concatenate([self.parents, numpy.zeros(max(self.labelCount, len(self.parents)), dtype=numpy.int32)])
+
+        self.parents[first:self.labelCount] = numpy.arange(first, self.labelCount)
+
+        return first
+
+    def merge(self, target, root):
+        root = self.parents[root]
+        target = self.parents[target]
+
+        if root == target:
+            return
+
+        self.parents[:self.labelCount][self.parents[:self.labelCount] == root] = target
+
+        if root in self.suspect:
+            self.suspect.discard(root)
+            self.suspect.add(int(target))
+
+    def splitRegion(self, root):
+        # relabel just the cells of a region that blocking may have cut apart
+        self.suspect.discard(root)
+        cells = self.parents[self.regions] == root
+        xs = numpy.flatnonzero(cells.any(axis=1))
+        ys = numpy.flatnonzero(cells.any(axis=0))
+        x0, x1, y0, y1 = xs[0], xs[-1] + 1, ys[0], ys[-1] + 1
+
+        local, count = labelComponents(cells[x0:x1, y0:y1])
+
+        if count > 1:
+            first = self.newLabels(count)
+            inside = local > 0
+            self.regions[x0:x1, y0:y1][inside] = local[inside] + (first - 1)
+
+    def sameRegion(self, start, goal):
+        root = self.parents[self.regions[start]]
+
+        if root != self.parents[self.regions[goal]]:
+            return False
+
+        if root in self.suspect:
+            self.splitRegion(root)
+
+            return self.parents[self.regions[start]] == self.parents[self.regions[goal]]
+
+        return True
+
+    def updateRegions(self):
+        # export wants labels numbered 1 to regionCount
+        if not self.exact:
+            self.relabel()
+
+        return self.regions
+
+    def isWalkable(self, x, y):
+        return 0 <= x < self.rows and 0 <= y < self.cols and bool(self.walkable[x, y])
+
+    def findPath(self, start, goal):
+        """
+        A* over 8 connected cells, diagonals can't cut corners. Returns the
+        list of (x, y) cells from start to goal or None when there is no path.
+        """
+        if not self.isWalkable(*start) or not self.isWalkable(*goal):
+            return None
+
+        # different regions can never connect, skip the search entirely. Labelling is
+        # 4 connected, which is enough since diagonal steps can't cut corners
+        if not self.sameRegion(start, goal):
+            return None
+
+        walkable = self.walkable
+        goalX, goalY = goal
+
+        def heuristic(x, y):
+            dx, dy = abs(x - goalX), abs(y - goalY)
+            return max(dx, dy) + (DIAGONAL_COST - 1) * min(dx, dy)
+
+        costs = {start: 0.0}
+        cameFrom = {start: None}
+        frontier = [(heuristic(*start), 0.0, start)]
+
+        while frontier:
+            _, cost, current = heapq.heappop(frontier)
+
+            if current == goal:
+                path = []
+
+                while current is not None:
+                    path.append(current)
+                    current = cameFrom[current]
+
+                return path[::-1]
+
+            if cost > costs[current]:
+                continue
+
+            x, y = current
+
+            for dx in (-1, 0, 1):
+                for dy in (-1, 0, 1):
+                    if dx == 0 and dy == 0:
+                        continue
+
+                    nx, ny = x + dx, y + dy
+
+                    if not (0 <= nx < self.rows and 0 <= ny < self.cols) or not walkable[nx, ny]:
+                        continue
+
+                    if dx and dy:
+                        if not walkable[x + dx, y] or not walkable[x, y + dy]:
+                            continue
+
+                        step = cost + DIAGONAL_COST
+                    else:
+                        step = cost + 1.0
+
+                    neighbour = (nx, ny)
+
+                    if step < costs.get(neighbour, float('inf')):
+                        costs[neighbour] = step
+                        cameFrom[neighbour] = current
+                        heapq.heappush(frontier, (step + heuristic(nx, ny), step, neighbour))
+
+        return None
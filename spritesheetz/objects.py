@@ -1,6 +1,11 @@
 from enum import IntEnum
-from PySide6.QtCore import Qt
-from PySide6.QtGui import QPen, QBrush, QColor
+import numpy
+from spritesheetz.spatial import UniformGrid
+from PySide6.QtCore import Qt, QRectF, QPointF
+from PySide6.QtGui import QPen, QBrush, QColor, QPainterPath, QPolygonF
+
+# ms an animation frame shows for when none is given
+DEFAULT_FRAME_DURATION = 100
 
 class SpriteObjectOrigin(IntEnum):
     BOTTOM_LEFT = 0
@@ -13,6 +18,14 @@ class HitBoxType(IntEnum):
     ELLIPSE = 1
     POLYGON = 2
 
+class MapLayerType(IntEnum):
+    TILES = 0
+    LOGIC = 1
+
+class TerrainMode(IntEnum):
+    EDGE = 0
+    BLOB = 1
+
 class SpriteItem:
     def __init__(self, view, rect, brush):
         self.rect = rect
@@ -37,8 +50,58 @@ class HitBox:
         self.y = 0
         self.width = 0
         self.height = 0
+        # polygon points, relative to x and y
         self.shape = None
 
+        self._path = None
+        self._footprint = None
+        self._boundingRect = QRectF()
+
+    def isFullTile(self):
+        # an empty rect covers the object's whole footprint
+        return self.hitBoxType == HitBoxType.RECT and (self.width <= 0 or self.height <= 0)
+
+    def invalidate(self):
+        self._path = None
+
+    def path(self, footprint):
+        """
+        Outline in sheet pixels relative to the object's top left, footprint is
+        the object's full size and only used by full tile hitboxes. Cached until
+        the hitbox is invalidated.
+        """
+        if self._path is not None and self._footprint == footprint:
+            return self._path
+
+        path = QPainterPath()
+
+        if self.isFullTile():
+            path.addRect(QRectF(0, 0, footprint[0], footprint[1]))
+        elif self.hitBoxType == HitBoxType.ELLIPSE:
+            path.addEllipse(QRectF(self.x, self.y, self.width, self.height))
+        elif self.hitBoxType == HitBoxType.POLYGON and self.shape:
+            path.addPolygon(QPolygonF([QPointF(self.x + point[0], self.y + point[1]) for point in self.shape]))
+            path.closeSubpath()
+        else:
+            path.addRect(QRectF(self.x, self.y, self.width, self.height))
+
+        self._path = path
+        self._footprint = footprint
+        self._boundingRect = path.boundingRect()
+
+        return path
+
+    def boundingRect(self, footprint):
+        self.path(footprint)
+        return self._boundingRect
+
+    def contains(self, point, footprint):
+        # cheap rejection before the exact path test
+        if not self.boundingRect(footprint).contains(point):
+            return False
+
+        return self._path.contains(point)
+
     def asdict(self):
         return {
             'type': self.hitBoxType,
@@ -51,7 +114,43 @@ class HitBox:
 
     @staticmethod
     def fromdict(obj):
-        return HitBox()
+        hitBox = HitBox(HitBoxType(obj['type']))
+        hitBox.x = obj['x']
+        hitBox.y = obj['y']
+        hitBox.width = obj['width']
+        hitBox.height = obj['height']
+        hitBox.shape = obj['shape']
+
+        return hitBox
+
+class TerrainRules:
+    def __init__(self, mode = TerrainMode.EDGE, rules = None):
+        self.mode = mode
+        # neighbour bitmask -> [x, y] tile on the sheet
+        self.rules = rules if rules is not None else {}
+
+    def resolvedRules(self, tiles):
+        if len(self.rules):
+            return self.rules
+
+        # no explicit rules, read the object's tiles in order as the rule set
+        from spritesheetz.tiling import BLOB_MASKS
+
+        masks = BLOB_MASKS if self.mode == TerrainMode.BLOB else range(16)
+        ordered = sorted(tiles, key=lambda tile: (tile[1], tile[0]))
+
+        return {mask: tile for mask, tile in zip(masks, ordered)}
+
+    def asdict(self):
+        return {
+            'mode': int(self.mode),
+            'rules': {str(mask): tile for mask, tile in self.rules.items()}
+        }
+
+    @staticmethod
+    def fromdict(obj):
+        return TerrainRules(TerrainMode(obj['mode']),
+                            {int(mask): tile for mask, tile in obj['rules'].items()})
 
 class SpriteObject:
     def __init__(self,
@@ -62,11 +161,14 @@ class SpriteObject:
                  originMode = SpriteObjectOrigin.BOTTOM_LEFT,
                  renderTiles = True,
                  hasCollision = False,
-                 extraProperties = {}):
+                 extraProperties = {},
+                 terrain = None,
+                 variants = None,
+                 frames = None):
         self.name = name
 
         if key is None:
-           key = lower(name).replace(' ', '_')
+           key = name.lower().replace(' ', '_')
 
         self.key = key
         self.objType = objType
@@ -74,10 +176,14 @@ class SpriteObject:
         self.originMode = originMode
         self.renderTiles = renderTiles
         self.hasCollision = hasCollision
-        if self.hasCollision:
-            self.hitBox = HitBox()
+        self.hitBox = HitBox() if self.hasCollision else None
 
         self.extraProperties = extraProperties
+        self.terrain = terrain
+        # [key, weight] pairs of objects this one stands in for, picked at export
+        self.variants = variants or []
+        # [dx, dy, ms] animation frames, the object's tiles shifted by dx, dy on the sheet
+        self.frames = frames or []
 
     def asdict(self):
         data = {
@@ -90,17 +196,276 @@ class SpriteObject:
             'hasCollision': self.hasCollision
         }
 
-        if self.hasCollision:
+        if self.hasCollision and self.hitBox:
             data['hitbox'] = self.hitBox.asdict()
 
+        if self.terrain is not None:
+            data['terrain'] = self.terrain.asdict()
+
+        if self.variants:
+            data['variants'] = self.variants
+
+        if self.frames:
+            data['frames'] = self.frames
+
+        if self.extraProperties:
+            data['properties'] = self.extraProperties
+
         return data
 
+    def isAnimated(self):
+        return len(self.frames) > 1
+
+    def framesText(self):
+        return ', '.join(f"{dx} {dy}:{duration}" for dx, dy, duration in self.frames)
+
+    def setFramesText(self, text):
+        frames = []
+
+        for entry in text.split(','):
+            offset, _, duration = entry.strip().partition(':')
+
+            if offset:
+                dx, dy = offset.split()
+                frames.append([int(dx), int(dy), int(duration) if duration else DEFAULT_FRAME_DURATION])
+
+        self.frames = frames
+
+    def variantsText(self):
+        return ', '.join(key if weight == 1 else f"{key}:{weight:g}" for key, weight in self.variants)
+
+    def setVariantsText(self, text):
+        variants = []
+
+        for entry in text.split(','):
+            key, _, weight = entry.strip().partition(':')
+
+            if key:
+                variants.append([key, float(weight) if weight else 1])
+
+        self.variants = variants
+
+    def originOffset(self):
+        # offset from the clicked cell to the top left cell of the object
+        left, top, right, bottom = self.bounds()
+        width, height = right - left, bottom - top
+
+        match self.originMode:
+            case SpriteObjectOrigin.TOP_LEFT:
+                return (0, 0)
+            case SpriteObjectOrigin.BOTTOM_LEFT:
+                return (0, 1 - height)
+            case SpriteObjectOrigin.TOP_RIGHT:
+                return (1 - width, 0)
+            case SpriteObjectOrigin.BOTTOM_RIGHT:
+                return (1 - width, 1 - height)
+
+    def footprint(self, tileWidth, tileHeight):
+        # size in sheet pixels
+        left, top, right, bottom = self.bounds()
+        return ((right - left) * tileWidth, (bottom - top) * tileHeight)
+
+    def bounds(self):
+        xs = [tile[0] for tile in self.tiles]
+        ys = [tile[1] for tile in self.tiles]
+
+        return (min(xs), min(ys), max(xs) + 1, max(ys) + 1)
+
     @staticmethod
     def fromdict(obj):
-        return SpriteObject(name = obj['name'],
+        spriteObject = SpriteObject(name = obj['name'],
                             key = obj['key'],
                             objType = obj['type'],
                             tiles = obj['tiles'],
                             originMode = SpriteObjectOrigin(obj['originMode']),
                             renderTiles = obj['renderTiles'],
-                            hasCollision = obj['hasCollision'])
\ No newline at end of file
+                            hasCollision = obj['hasCollision'],
+                            terrain = TerrainRules.fromdict(obj['terrain']) if 'terrain' in obj else None,
+                            variants = obj.get('variants'),
+                            frames = obj.get('frames'),
+                            extraProperties = dict(obj.get('properties', {})))
+
+        if 'hitbox' in obj:
+            spriteObject.hitBox = HitBox.fromdict(obj['hitbox'])
+
+        return spriteObject
+
+INSTANCE_DTYPE = numpy.dtype([('object', numpy.int32), ('x', numpy.int32), ('y', numpy.int32), ('layer', numpy.int16)])
+# cells per side of the buckets rect queries look instances up in
+INSTANCE_BUCKET_SIZE = 16
+
+# Objects placed on a map as packed (object, x, y, layer) records, x and y are
+# the top left cell of the object
+class ObjectInstances:
+    def __init__(self, records = None):
+        self.records = numpy.zeros(64, dtype=INSTANCE_DTYPE)
+        self.count = 0
+        # bumped on every change so whoever caches something built from the records can tell
+        self.version = 0
+        # instances bucketed by their top left cell, records added since are checked one by one
+        self.grid = None
+        self.gridCount = 0
+        self.gridSizes = None
+        self.gridMaxSize = None
+
+        if records is not None:
+            self.extend(records)
+
+    def __len__(self):
+        return self.count
+
+    def view(self):
+        return self.records[:self.count]
+
+    def extend(self, records):
+        needed = self.count + len(records)
+
+        if needed > len(self.records):
+            grown = numpy.zeros(max(needed, len(self.records) * 2), dtype=INSTANCE_DTYPE)
+            grown[:self.count] = self.view()
+            self.records = grown
+
+        self.records[self.count:needed] = records
+        self.count = needed
+        self.version += 1
+
+    def add(self, objectId, x, y, layer):
+        self.extend(numpy.array([(objectId, x, y, layer)], dtype=INSTANCE_DTYPE))
+
+    def replace(self, records):
+        self.count = 0
+        self.grid = None
+        self.extend(records)
+
+    def remove(self, indices):
+        keep = numpy.ones(self.count, dtype=bool)
+        keep[indices] = False
+        self.replace(self.view()[keep].copy())
+
+    def inRect(self, sizes, x0, y0, x1, y1, layer = None):
+        """
+        Indices of instances whose footprint overlaps the cell rect, sizes is an
+        (objects, 2) array of object widths and heights in cells.
+        """
+        if self.count == 0 or x0 >= x1 or y0 >= y1:
+            return numpy.zeros(0, dtype=numpy.int64)
+
+        grid = self.bucketGrid(sizes)
+        # an instance overlapping the rect starts at most one object size before it
+        maxWidth, maxHeight = self.gridMaxSize
+
+        candidates = numpy.concatenate([grid.query(x0 - maxWidth + 1, y0 - maxHeight + 1, x1 - 1, y1 - 1),
+                                        numpy.arange(self.gridCount, self.count)])
+        records = self.records[candidates]
+        objectSizes = sizes[records['object']]
+
+        hit = (records['x'] < x1) & (records['x'] + objectSizes[:, 0] > x0) & \
+              (records['y'] < y1) & (records['y'] + objectSizes[:, 1] > y0)
+
+        if layer is not None:
+            hit &= records['layer'] == layer
+
+        return candidates[hit]
+
+    def bucketGrid(self, sizes):
+        # rebuilt after removals, new objects, or once enough records were added to slow queries down
+        if self.grid is None or self.gridSizes is not sizes or self.count - self.gridCount > max(self.gridCount // 8, 4096):
+            records = self.view()
+            boxes = numpy.stack([records['x'], records['y'], records['x'] + 1, records['y'] + 1], axis=1)
+
+            self.grid = UniformGrid.build(boxes, INSTANCE_BUCKET_SIZE, int(boxes[:, 2].max()), int(boxes[:, 3].max()))
+            self.gridCount = self.count
+            self.gridSizes = sizes
+            self.gridMaxSize = [int(size) for size in sizes.max(axis=0)]
+
+        return self.grid
+
+class RegionKind(IntEnum):
+    TRIGGER = 0
+    SPAWN = 1
+    CUSTOM = 2
+
+# Logic region on a map, in map pixels. Polygon points are absolute.
+class MapRegion:
+    def __init__(self,
+                 regionId,
+                 name = '',
+                 kind = RegionKind.TRIGGER,
+                 x = 0,
+                 y = 0,
+                 width = 0,
+                 height = 0,
+                 points = None,
+                 properties = None):
+        self.regionId = regionId
+        self.name = name
+        self.kind = kind
+        self.x = x
+        self.y = y
+        self.width = width
+        self.height = height
+        self.points = points
+        self.properties = properties if properties is not None else {}
+
+        self._path = None
+
+    def setPoints(self, points):
+        xs = [point[0] for point in points]
+        ys = [point[1] for point in points]
+
+        self.points = points
+        self.x, self.y = min(xs), min(ys)
+        self.width, self.height = max(xs) - self.x, max(ys) - self.y
+        self._path = None
+
+    def rect(self):
+        return (self.x, self.y, self.x + self.width, self.y + self.height)
+
+    def path(self):
+        if self._path is None:
+            path = QPainterPath()
+
+            if self.points:
+                path.addPolygon(QPolygonF([QPointF(point[0], point[1]) for point in self.points]))
+                path.closeSubpath()
+            else:
+                path.addRect(QRectF(self.x, self.y, self.width, self.height))
+
+            self._path = path
+
+        return self._path
+
+    def contains(self, x, y):
+        if self.points:
+            return self.path().contains(QPointF(x, y))
+
+        return self.x <= x < self.x + self.width and self.y <= y < self.y + self.height
+
+    def asdict(self):
+        data = {
+            'id': self.regionId,
+            'name': self.name,
+            'kind': int(self.kind),
+            'x': self.x,
+            'y': self.y,
+            'width': self.width,
+            'height': self.height,
+            'properties': self.properties
+        }
+
+        if self.points:
+            data['points'] = self.points
+
+        return data
+
+    @staticmethod
+    def fromdict(obj):
+        return MapRegion(obj['id'],
+                         obj['name'],
+                         RegionKind(obj['kind']),
+                         obj['x'],
+                         obj['y'],
+                         obj['width'],
+                         obj['height'],
+                         obj.get('points'),
+                         obj['properties'])
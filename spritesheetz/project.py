@@ -0,0 +1,278 @@
+import hashlib
+import json
+import re
+from os import walk, stat
+from os.path import join, abspath, normpath
+from PySide6.QtCore import QObject, QRunnable, QThreadPool, QFileSystemWatcher, QTimer, Signal
+
+from spritesheetz.cache import cacheDirectory
+
+# Saved files write their header keys before the layer and item data, so only
+# the start of each file needs reading
+HEADER_BYTES = 64 * 1024
+HEADER_KEYS = ['type', 'name', 'width', 'height', 'tileWidth', 'tileHeight', 'spriteFile', 'spriteSheets']
+STRING_PATTERN = re.compile(r'"(?:[^"\\]|\\.)*"')
+BRACKET_PATTERN = re.compile(r'["\[\]{}]')
+WHITESPACE_PATTERN = re.compile(r'\s*')
+
+def projectPath(filePath, base = None):
+    # relative paths are taken from base, the working directory by default
+    return normpath(join(base, filePath) if base else abspath(filePath))
+
+def skipValue(text, position):
+    # end of the JSON value at position, nested values are stepped over by their brackets without being parsed
+    if text[position] not in '[{':
+        return json.JSONDecoder().raw_decode(text, position)[1]
+
+    depth = 0
+
+    while True:
+        match = BRACKET_PATTERN.search(text, position)
+
+        if match is None:
+            raise ValueError("Unterminated value")
+
+        if match.group() == '"':
+            string = STRING_PATTERN.match(text, match.start())
+
+            if string is None:
+                raise ValueError("Unterminated string")
+
+            position = string.end()
+            continue
+
+        depth += 1 if match.group() in '[{' else -1
+        position = match.end()
+
+        if depth == 0:
+            return position
+
+def topLevelValues(text, header, complete = True):
+    """
+    Read the header keys of the top level object in text into header. Returns
+    whether the object was read to its end, which a partial text can stop
+    short of.
+    """
+    decoder = json.JSONDecoder()
+    position = WHITESPACE_PATTERN.match(text).end()
+
+    # anything but an object has no header
+    if not text.startswith('{', position):
+        return True
+
+    position += 1
+
+    try:
+        while True:
+            position = WHITESPACE_PATTERN.match(text, position).end()
+
+            if text.startswith('}', position):
+                return True
+
+            if not text.startswith('"', position):
+                raise ValueError("Expected a key")
+
+            key, position = decoder.raw_decode(text, position)
+            position = WHITESPACE_PATTERN.match(text, position).end()
+
+            if not text.startswith(':', position):
+                raise ValueError("Expected ':'")
+
+            position = WHITESPACE_PATTERN.match(text, position + 1).end()
+
+            if key in HEADER_KEYS:
+                header[key], position = decoder.raw_decode(text, position)
+            else:
+                position = skipValue(text, position)
+
+            position = WHITESPACE_PATTERN.match(text, position).end()
+
+            if text.startswith(',', position):
+                position += 1
+            elif not text.startswith('}', position):
+                raise ValueError("Expected ',' or '}'")
+    except (ValueError, IndexError):
+        # a partial text runs out partway through a value
+        if complete:
+            raise
+
+        return False
+
+def readHeader(filePath, base = None):
+    with open(filePath, 'r', encoding='utf-8') as file:
+        text = file.read(HEADER_BYTES)
+        complete = len(text) < HEADER_BYTES
+
+    header = {}
+    finished = topLevelValues(text, header, complete)
+
+    if not complete and not finished and ('type' not in header or (header['type'] == 'map' and 'spriteSheets' not in header)):
+        # a header bigger than the read, parse the whole thing instead
+        with open(filePath, 'r', encoding='utf-8') as file:
+            data = json.load(file)
+
+        header = {key: data[key] for key in HEADER_KEYS if isinstance(data, dict) and key in data}
+
+    # only keep the keys the file type has
+    if header.get('type') != 'sheet':
+        header.pop('spriteFile', None)
+
+    if header.get('type') != 'map':
+        header.pop('spriteSheets', None)
+    else:
+        header['spriteSheets'] = [projectPath(path, base) for path in header.get('spriteSheets', [])]
+
+    return header
+
+def scanProject(root, known, base = None, scannedDirectories = None):
+    """
+    Header of every json file under root, reusing entries from known whose
+    mtime hasn't changed, base is what relative paths inside files are taken
+    from. Every directory walked is added to scannedDirectories if given.
+    Runs on a worker thread.
+    """
+    entries = {}
+
+    for directory, directories, files in walk(root):
+        directories[:] = [name for name in directories if not name.startswith('.')]
+
+        if scannedDirectories is not None:
+            scannedDirectories.append(projectPath(directory))
+
+        for name in files:
+            if not name.endswith('.json'):
+                continue
+
+            filePath = projectPath(join(directory, name))
+
+            try:
+                mtime = stat(filePath).st_mtime_ns
+            except OSError:
+                continue
+
+            entry = known.get(filePath)
+
+            if entry is None or entry['mtime'] != mtime:
+                try:
+                    entry = readHeader(filePath, base)
+                except (OSError, ValueError):
+                    entry = {}
+
+                entry['mtime'] = mtime
+
+            entries[filePath] = entry
+
+    return entries
+
+class ProjectScanSignals(QObject):
+    # entries and the directories they were found in
+    scanned = Signal(dict, list)
+
+class ProjectScanner(QRunnable):
+    def __init__(self, root, known):
+        super().__init__()
+
+        self.root = root
+        self.known = known
+        self.signals = ProjectScanSignals()
+
+        self.setAutoDelete(False)
+
+    def run(self):
+        directories = []
+        entries = scanProject(self.root, self.known, scannedDirectories=directories)
+
+        self.signals.scanned.emit(entries, directories)
+
+# Headers of the project's files, kept current in the background and cached
+# between sessions by mtime
+class ProjectIndex(QObject):
+    updated = Signal()
+
+    def __init__(self, root):
+        super().__init__()
+
+        self.root = projectPath(root)
+        self.entries = {}
+        self.scanner = None
+        self.rescan = False
+
+        self.cacheFile = join(cacheDirectory('index'), hashlib.sha1(self.root.encode('utf-8')).hexdigest() + '.json')
+
+        try:
+            with open(self.cacheFile, 'r') as file:
+                self.entries = json.load(file)
+        except (OSError, ValueError):
+            pass
+
+        # bursts of file changes only trigger one scan
+        self.scanTimer = QTimer(self)
+        self.scanTimer.setSingleShot(True)
+        self.scanTimer.setInterval(250)
+        self.scanTimer.timeout.connect(self.scan)
+
+        self.watcher = QFileSystemWatcher([self.root], self)
+        self.watcher.directoryChanged.connect(self.scanTimer.start)
+
+    def scan(self):
+        if self.scanner is not None:
+            self.rescan = True
+            return
+
+        self.scanner = ProjectScanner(self.root, dict(self.entries))
+        self.scanner.signals.scanned.connect(self.scanned)
+        QThreadPool.globalInstance().start(self.scanner)
+
+    def scanned(self, entries, directories):
+        self.scanner = None
+        self.entries = entries
+
+        # files change in subfolders too, watch every folder the scan went through
+        watched = set(self.watcher.directories())
+        added = sorted(set(directories) - watched)
+        removed = sorted(watched - set(directories) - {self.root})
+
+        if added:
+            self.watcher.addPaths(added)
+
+        if removed:
+            self.watcher.removePaths(removed)
+
+        try:
+            with open(self.cacheFile, 'w') as file:
+                file.write(json.dumps(entries))
+        except OSError:
+            pass
+
+        self.updated.emit()
+
+        if self.rescan:
+            self.rescan = False
+            self.scan()
+
+    def entry(self, filePath):
+        # the scan keeps entries current off the GUI thread, files it hasn't reached yet are read on the spot
+        filePath = projectPath(filePath)
+        entry = self.entries.get(filePath)
+
+        if entry is None:
+            try:
+                entry = readHeader(filePath)
+            except (OSError, ValueError):
+                entry = {}
+
+            # no mtime, so the scan this starts reads it again properly
+            entry['mtime'] = None
+            self.entries[filePath] = entry
+            self.scanTimer.start()
+
+        return entry
+
+    def fileType(self, filePath):
+        return self.entry(filePath).get('type')
+
+    def mapsUsingSheet(self, sheetPath):
+        sheetPath = projectPath(sheetPath)
+
+        return sorted(filePath for filePath, entry in self.entries.items()
+                      if entry.get('type') == 'map' and sheetPath in entry.get('spriteSheets', []))
@@ -0,0 +1,123 @@
+import os
+import json
+import numpy
+from PySide6.QtCore import QObject, QRunnable, QThreadPool, Signal
+
+# Cells per side of the chunks map layers are serialized in, an edit only
+# re-serializes the chunks it touched
+SAVE_CHUNK = 64
+# ms between autosaves of modified documents
+AUTOSAVE_INTERVAL = 5000
+
+def writeFileAtomic(fileName, text):
+    # written beside the target and swapped in, a crash part way leaves the old file whole
+    temporary = fileName + '.tmp'
+
+    with open(temporary, 'wb' if isinstance(text, bytes) else 'w') as file:
+        file.write(text)
+
+    os.replace(temporary, fileName)
+
+class FileWriterSignals(QObject):
+    # the version handed to the writer, only sent once the file is on disk
+    written = Signal(int)
+
+class FileWriter(QRunnable):
+    def __init__(self, fileName, text, version = 0):
+        super().__init__()
+
+        self.fileName = fileName
+        self.text = text
+        self.version = version
+        self.signals = FileWriterSignals()
+
+    def run(self):
+        try:
+            writeFileAtomic(self.fileName, self.text)
+        except OSError as error:
+            print(f"Couldn't write {self.fileName}: {error}", flush=True)
+            return
+
+        self.signals.written.emit(self.version)
+
+_writerPool = None
+
+def writerPool():
+    global _writerPool
+
+    if _writerPool is None:
+        _writerPool = QThreadPool()
+        # one thread so writes of the same file land in the order they were made
+        _writerPool.setMaxThreadCount(1)
+
+    return _writerPool
+
+def writeFileInBackground(fileName, text, written = None, version = 0):
+    # written(version) is called back on the ui thread once the write has succeeded
+    writer = FileWriter(fileName, text, version)
+
+    if written is not None:
+        writer.signals.written.connect(written)
+
+    writerPool().start(writer)
+
+def writeFile(fileName, text):
+    # background writes still queued would otherwise land on top of this one
+    writerPool().waitForDone()
+    writeFileAtomic(fileName, text)
+
+def encodeRuns(grid, x0 = 0, y0 = 0):
+    # [x, y, length, value] for every run of equal non-zero values along y, x0, y0 is where grid sits in the map
+    rows, cols = grid.shape
+    # every column starts a new run so runs never wrap onto the next column
+    changes = numpy.ones((rows, cols), dtype=bool)
+    changes[:, 1:] = grid[:, 1:] != grid[:, :-1]
+
+    runX, runY = numpy.nonzero(changes)
+    starts = runX * cols + runY
+    lengths = numpy.diff(numpy.append(starts, rows * cols))
+    values = grid[runX, runY]
+    keep = values != 0
+
+    return numpy.stack([runX[keep] + x0, runY[keep] + y0, lengths[keep], values[keep]], axis=1).tolist()
+
+def decodeRuns(runs, grid):
+    # inverse of encodeRuns, writes the runs into grid
+    runs = numpy.asarray(runs, dtype=numpy.int64).reshape(-1, 4)
+    lengths = runs[:, 2]
+    offsets = numpy.arange(lengths.sum()) - numpy.repeat(numpy.cumsum(lengths) - lengths, lengths)
+
+    grid[numpy.repeat(runs[:, 0], lengths), numpy.repeat(runs[:, 1], lengths) + offsets] = numpy.repeat(runs[:, 3], lengths)
+
+def sparseCells(grid, x0 = 0, y0 = 0):
+    # [x, y, value] for every non-zero cell, x0, y0 is where grid sits in the map
+    xs, ys = numpy.nonzero(grid)
+    return numpy.stack([xs + x0, ys + y0, grid[xs, ys]], axis=1).tolist()
+
+def jsonObject(members):
+    # join (key, serialized value) pairs into the text of a json object, laid out as json.dumps would
+    if not members:
+        return '{}'
+
+    return '{' + ', '.join(f"{json.dumps(key)}: {text}" for key, text in members) + '}'
+
+# Serialized text of each section of a document, kept until the section is
+# invalidated or its version changes, so saving only re-serializes what changed
+class SectionCache:
+    def __init__(self):
+        self.sections = {}
+
+    def text(self, key, build, version = None):
+        cached = self.sections.get(key)
+
+        if cached is None or cached[0] != version:
+            cached = (version, build())
+            self.sections[key] = cached
+
+        return cached[1]
+
+    def invalidate(self, key):
+        self.sections.pop(key, None)
+
+    def clear(self):
+        self.sections = {}
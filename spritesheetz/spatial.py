@@ -0,0 +1,195 @@
+import numpy
+
+def mergeRects(mask):
+    """
+    Greedily cover a boolean [x, y] grid with maximal rectangles, returned as
+    (x, y, width, height) in cells. Runs are grown along y first then along x.
+    """
+    remaining = mask.copy()
+    rows = mask.shape[0]
+    rects = []
+
+    for x in numpy.flatnonzero(mask.any(axis=1)):
+        ys = numpy.flatnonzero(remaining[x])
+
+        while len(ys):
+            y0 = ys[0]
+            stops = numpy.flatnonzero(~remaining[x, y0:])
+            y1 = y0 + stops[0] if len(stops) else remaining.shape[1]
+
+            x1 = x + 1
+            while x1 < rows and remaining[x1, y0:y1].all():
+                x1 += 1
+
+            remaining[x:x1, y0:y1] = False
+            rects.append((int(x), int(y0), int(x1 - x), int(y1 - y0)))
+
+            ys = numpy.flatnonzero(remaining[x])
+
+    return rects
+
+# Bucket grid over axis aligned boxes, stored compressed: the entries of cell c
+# are indices[offsets[c]:offsets[c + 1]]
+class UniformGrid:
+    def __init__(self, cellSize, columns, rows, offsets, indices):
+        self.cellSize = cellSize
+        self.columns = columns
+        self.rows = rows
+        self.offsets = offsets
+        self.indices = indices
+
+    @staticmethod
+    def build(boxes, cellSize, width, height):
+        columns = max(int(numpy.ceil(width / cellSize)), 1)
+        rows = max(int(numpy.ceil(height / cellSize)), 1)
+
+        boxes = numpy.asarray(boxes, dtype=numpy.float64).reshape(-1, 4)
+
+        cx0 = numpy.clip(numpy.floor(boxes[:, 0] / cellSize), 0, columns - 1).astype(numpy.int64)
+        cy0 = numpy.clip(numpy.floor(boxes[:, 1] / cellSize), 0, rows - 1).astype(numpy.int64)
+        # boxes are half open, a box ending on a cell border doesn't touch the next cell
+        cx1 = numpy.clip(numpy.ceil(boxes[:, 2] / cellSize) - 1, 0, columns - 1).astype(numpy.int64)
+        cy1 = numpy.clip(numpy.ceil(boxes[:, 3] / cellSize) - 1, 0, rows - 1).astype(numpy.int64)
+        cx1 = numpy.maximum(cx1, cx0)
+        cy1 = numpy.maximum(cy1, cy0)
+
+        spanX = cx1 - cx0 + 1
+        counts = spanX * (cy1 - cy0 + 1)
+
+        # expand every box into the cells it covers without a python loop
+        owner = numpy.repeat(numpy.arange(len(boxes)), counts)
+        starts = numpy.repeat(numpy.cumsum(counts) - counts, counts)
+        local = numpy.arange(counts.sum()) - starts
+
+        cells = (cy0[owner] + local // spanX[owner]) * columns + cx0[owner] + local % spanX[owner]
+        order = numpy.argsort(cells, kind='stable')
+
+        offsets = numpy.zeros(columns * rows + 1, dtype=numpy.int64)
+        offsets[1:] = numpy.cumsum(numpy.bincount(cells, minlength=columns * rows))
+
+        return UniformGrid(cellSize, columns, rows, offsets, owner[order])
+
+    def query(self, x0, y0, x1, y1):
+        cx0 = min(max(int(x0 // self.cellSize), 0), self.columns - 1)
+        cy0 = min(max(int(y0 // self.cellSize), 0), self.rows - 1)
+        cx1 = min(max(int(x1 // self.cellSize), 0), self.columns - 1)
+        cy1 = min(max(int(y1 // self.cellSize), 0), self.rows - 1)
+
+        found = [self.indices[self.offsets[row * self.columns + cx0]:self.offsets[row * self.columns + cx1 + 1]]
+                 for row in range(cy0, cy1 + 1)]
+
+        return numpy.unique(numpy.concatenate(found)) if found else numpy.zeros(0, dtype=numpy.int64)
+
+    def asdict(self):
+        return {
+            'cellSize': self.cellSize,
+            'columns': self.columns,
+            'rows': self.rows,
+            'offsets': self.offsets.tolist(),
+            'indices': self.indices.tolist()
+        }
+
+def rectsIntersect(a, b):
+    return a[0] < b[2] and b[0] < a[2] and a[1] < b[3] and b[1] < a[3]
+
+def rectContains(outer, inner):
+    return outer[0] <= inner[0] and outer[1] <= inner[1] and inner[2] <= outer[2] and inner[3] <= outer[3]
+
+class QuadNode:
+    __slots__ = ('bounds', 'depth', 'items', 'children')
+
+    def __init__(self, bounds, depth):
+        self.bounds = bounds
+        self.depth = depth
+        self.items = {}
+        self.children = None
+
+    def childBounds(self):
+        x0, y0, x1, y1 = self.bounds
+        cx, cy = (x0 + x1) / 2, (y0 + y1) / 2
+
+        return [(x0, y0, cx, cy), (cx, y0, x1, cy), (x0, cy, cx, y1), (cx, cy, x1, y1)]
+
+# Rects are (x0, y0, x1, y1). Items live in the deepest node that fully contains
+# them, so items straddling a split stay with the parent.
+class QuadTree:
+    def __init__(self, bounds, capacity = 16, maxDepth = 12):
+        self.root = QuadNode(bounds, 0)
+        self.capacity = capacity
+        self.maxDepth = maxDepth
+        self.nodes = {}
+
+    def __len__(self):
+        return len(self.nodes)
+
+    def insert(self, itemId, rect):
+        node = self.root
+
+        while node.children is not None:
+            child = next((child for child in node.children if rectContains(child.bounds, rect)), None)
+
+            if child is None:
+                break
+
+            node = child
+
+        node.items[itemId] = rect
+        self.nodes[itemId] = node
+
+        if node.children is None and len(node.items) > self.capacity and node.depth < self.maxDepth:
+            self.split(node)
+
+    def split(self, node):
+        node.children = [QuadNode(bounds, node.depth + 1) for bounds in node.childBounds()]
+        items = node.items
+        node.items = {}
+
+        for itemId, rect in items.items():
+            child = next((child for child in node.children if rectContains(child.bounds, rect)), node)
+            child.items[itemId] = rect
+            self.nodes[itemId] = child
+
+    def remove(self, itemId):
+        node = self.nodes.pop(itemId, None)
+
+        if node is not None:
+            del node.items[itemId]
+
+    def update(self, itemId, rect):
+        self.remove(itemId)
+        self.insert(itemId, rect)
+
+    def query(self, rect):
+        found = []
+        stack = [self.root]
+
+        while stack:
+            node = stack.pop()
+
+            for itemId, itemRect in node.items.items():
+                if rectsIntersect(itemRect, rect):
+                    found.append(itemId)
+
+            if node.children is not None:
+                stack.extend(child for child in node.children if rectsIntersect(child.bounds, rect))
+
+        return found
+
+    def queryPoint(self, x, y):
+        found = []
+        node = self.root
+
+        # only one branch can hold the point
+        while node is not None:
+            for itemId, (x0, y0, x1, y1) in node.items.items():
+                if x0 <= x < x1 and y0 <= y < y1:
+                    found.append(itemId)
+
+            if node.children is None:
+                break
+
+            x0, y0, x1, y1 = node.bounds
+            cx, cy = (x0 + x1) / 2, (y0 + y1) / 2
+            node = node.children[(1 if x >= cx else 0) + (2 if y >= cy else 0)]
+
+        return found
@@ -0,0 +1,124 @@
+import json
+import struct
+import numpy
+
+from spritesheetz.objects import INSTANCE_DTYPE
+
+STAMP_MIME_TYPE = 'application/x-spritesheetz-stamp'
+STAMP_MAGIC = b'SSZSTAMP'
+
+# Per cell flag bits
+STAMP_CELL = 1
+
+def idLookup(source, target, column):
+    """
+    Lookup from the ids of one map's sheets to another's, sheets are matched by
+    file. column picks the (first id, count) pair out of each sheet entry, ids
+    of sheets the target doesn't have map to -1.
+    """
+    size = max([sheet[column] + sheet[column + 1] for sheet in source] + [1])
+    lookup = numpy.full(size, -1, dtype=numpy.int64)
+    targets = {sheet[0]: sheet for sheet in target}
+
+    for sheet in source:
+        match = targets.get(sheet[0])
+
+        if match is None:
+            continue
+
+        count = min(sheet[column + 1], match[column + 1])
+        lookup[sheet[column]:sheet[column] + count] = match[column] + numpy.arange(count)
+
+    return lookup
+
+# A copied block of cells held as flat arrays indexed [x, y], so stamping one
+# is a handful of array writes no matter how big it is. Terrain is held as the
+# terrain object's id + 1 and instance positions are relative to the top left.
+# sheets lists [file, firstTileId, tileCount, firstObjectId, objectCount] of
+# the map the ids came from.
+class Stamp:
+    def __init__(self, tiles, terrain, flags, sheets, fills = None, instances = None):
+        self.tiles = tiles
+        self.terrain = terrain
+        self.flags = flags
+        self.sheets = sheets
+        self.fills = fills
+        self.instances = instances if instances is not None else numpy.zeros(0, dtype=INSTANCE_DTYPE)
+
+    @property
+    def width(self):
+        return self.tiles.shape[0]
+
+    @property
+    def height(self):
+        return self.tiles.shape[1]
+
+    def cells(self):
+        return (self.flags & STAMP_CELL) > 0
+
+    def remapped(self, sheets):
+        # the same stamp with its ids moved onto another map's sheets
+        if sheets == self.sheets:
+            return self
+
+        tileIds = idLookup(self.sheets, sheets, 1)
+        objectIds = idLookup(self.sheets, sheets, 3)
+
+        tiles = tileIds[numpy.minimum(self.tiles, len(tileIds) - 1)]
+        terrain = objectIds[numpy.clip(self.terrain - 1, 0, len(objectIds) - 1)] + 1
+        instances = self.instances[objectIds[self.instances['object']] >= 0].copy()
+        instances['object'] = objectIds[instances['object']]
+
+        # cells whose tile or terrain came from a sheet the map doesn't have are left out
+        flags = self.flags.copy()
+        flags[((self.tiles > 0) & (tiles < 0)) | ((self.terrain > 0) & (terrain <= 0))] &= numpy.uint8(255 ^ STAMP_CELL)
+
+        return Stamp(numpy.maximum(tiles, 0).astype(numpy.int32), numpy.where(self.terrain > 0, numpy.maximum(terrain, 0), 0).astype(numpy.int32),
+                     flags, sheets, self.fills, instances)
+
+    def arrays(self):
+        arrays = {'tiles': self.tiles, 'terrain': self.terrain, 'flags': self.flags, 'instances': self.instances}
+
+        if self.fills is not None:
+            arrays['fills'] = self.fills
+
+        return arrays
+
+    def toBytes(self):
+        """
+        Binary form for the clipboard, a json header giving each array's dtype
+        and shape followed by the raw arrays.
+        """
+        arrays = self.arrays()
+        header = json.dumps({
+            'sheets': self.sheets,
+            'arrays': [[name, array.dtype.str if array.dtype.names is None else array.dtype.descr, list(array.shape)]
+                       for name, array in arrays.items()]
+        }).encode('utf-8')
+
+        return b''.join([STAMP_MAGIC, struct.pack('<I', len(header)), header] +
+                        [numpy.ascontiguousarray(array).tobytes() for array in arrays.values()])
+
+    @staticmethod
+    def fromBytes(data):
+        data = bytes(data)
+
+        if not data.startswith(STAMP_MAGIC):
+            return None
+
+        offset = len(STAMP_MAGIC)
+        length, = struct.unpack_from('<I', data, offset)
+        offset += 4
+        header = json.loads(data[offset:offset + length].decode('utf-8'))
+        offset += length
+
+        arrays = {}
+
+        for name, descr, shape in header['arrays']:
+            dtype = numpy.dtype(descr if isinstance(descr, str) else [tuple(field) for field in descr])
+            count = int(numpy.prod(shape))
+            arrays[name] = numpy.frombuffer(data, dtype=dtype, count=count, offset=offset).reshape(shape).copy()
+            offset += count * dtype.itemsize
+
+        return Stamp(arrays['tiles'], arrays['terrain'], arrays['flags'], [list(sheet) for sheet in header['sheets']],
+                     arrays.get('fills'), arrays['instances'])
@@ -1,9 +1,15 @@
 from enum import IntEnum
 from PySide6.QtCore import Qt
-from PySide6.QtWidgets import QTabWidget, QWidget, QMainWindow, QFrame, QVBoxLayout, QMessageBox, QDockWidget, QListWidget, QGraphicsScene
+from PySide6.QtGui import QActionGroup
+from PySide6.QtWidgets import QTabWidget, QWidget, QMainWindow, QFrame, QVBoxLayout, QMessageBox, QDockWidget, QListWidget, QGraphicsScene, QColorDialog, QInputDialog
 
 from spritesheetz.graphics import MapScene, SpriteSheetScene, SpriteSheetView, GraphicsView, SpriteSheet, MiniSpriteSheetScene
-from spritesheetz.docks import LayersDock, ObjectPropertiesWidget, SpriteSheetPropertiesWidget
+from spritesheetz.docks import LayersDock, ObjectPropertiesWidget, SpriteSheetPropertiesWidget, RegionPropertiesWidget, SpriteObjectsDockWidget
+from spritesheetz.tools import MapTool
+from spritesheetz.objects import MapLayerType
+from spritesheetz.project import projectPath
+from spritesheetz.minimap import MinimapWidget
+from spritesheetz.journal import MapJournal
 
 class WorkAreaType(IntEnum):
     MAP = 0
@@ -32,6 +38,7 @@ class WorkAreaTab(QMainWindow):
         view = SpriteSheetView(application, scene);
         self.view = view
         view.setScene(scene)
+        view.setDisplayScale(application.displayScale)
 
         centralFrame.layout().addWidget(view)
 
@@ -43,6 +50,15 @@ class WorkAreaTab(QMainWindow):
     def saveFile(self):
         self.scene.saveFile()
 
+    def autosave(self):
+        self.scene.autosave()
+
+    def isModified(self):
+        return self.scene.modified
+
+    def closeDocument(self):
+        pass
+
     def saveState(self):
         return self.scene.saveState()
 
@@ -51,10 +67,18 @@ class WorkAreaTabMap(WorkAreaTab):
         super().__init__(application, title, areaType)
 
         self.layersDock = LayersDock("Layers", self)
+        self.layersDock.layerAdded.connect(self.layerAdded)
+        self.layersDock.layerSelected.connect(self.scene.setCurrentLayer)
+        self.layersDock.layerRenamed.connect(self.layerRenamed)
 
         self.layersDock.setFloating(False)
         self.addDockWidget(Qt.RightDockWidgetArea, self.layersDock)
 
+        self.regionPropertiesDock = RegionPropertiesWidget("Region Properties", self)
+        self.regionPropertiesDock.regionChanged.connect(self.scene.editRegion)
+        self.scene.regionSelected.connect(self.regionPropertiesDock.setRegion)
+        self.addDockWidget(Qt.RightDockWidgetArea, self.regionPropertiesDock)
+
         self.spriteSheetsDock = QDockWidget("Sprite Sheets", self)
         self.spriteSheetTabWidget = SpriteSheetTabWidget(application)
         
@@ -62,6 +86,11 @@ class WorkAreaTabMap(WorkAreaTab):
         self.spriteSheetsDock.setFloating(False)
         self.addDockWidget(Qt.RightDockWidgetArea, self.spriteSheetsDock)
 
+        self.overviewDock = QDockWidget("Overview", self)
+        self.overviewDock.setWidget(MinimapWidget(self.scene, self.view))
+        self.overviewDock.setFloating(False)
+        self.addDockWidget(Qt.RightDockWidgetArea, self.overviewDock)
+
         halfHeight = self.height() // 2
 
         self.resizeDocks([self.layersDock, self.spriteSheetsDock], [halfHeight, halfHeight], Qt.Orientation.Vertical);
@@ -69,10 +98,87 @@ class WorkAreaTabMap(WorkAreaTab):
 
         # Using a title
         fileToolBar = self.addToolBar("Map")
-        fileToolBar.addAction("Test")
+
+        self.toolActions = QActionGroup(self)
+
+        for tool, title in [(MapTool.BRUSH, "Brush"), (MapTool.BUCKET, "Bucket Fill"), (MapTool.RECTANGLE, "Rectangle"),
+                            (MapTool.LINE, "Line"), (MapTool.ELLIPSE, "Ellipse"), (MapTool.PATH, "Path Preview"),
+                            (MapTool.REGION, "Region"), (MapTool.POLYGON_REGION, "Polygon Region"), (MapTool.SELECT, "Select")]:
+            action = fileToolBar.addAction(title)
+            action.setCheckable(True)
+            action.setChecked(tool == MapTool.BRUSH)
+            action.setData(tool)
+            self.toolActions.addAction(action)
+
+        self.toolActions.triggered.connect(self.toolChanged)
+
+        fileToolBar.addSeparator()
+        fileToolBar.addAction("Fill Colour").triggered.connect(self.pickFillColor)
+        fileToolBar.addAction("Variant Seed").triggered.connect(self.pickVariantSeed)
 
         self.spriteSheets = []
 
+        # edits are journaled as they happen so a crash can be recovered from
+        self.journal = MapJournal(self.scene)
+
+    def closeDocument(self):
+        self.journal.close()
+
+    def toolChanged(self, action):
+        self.scene.setTool(MapTool(action.data()))
+
+    def setTool(self, tool):
+        for action in self.toolActions.actions():
+            action.setChecked(action.data() == tool)
+
+        self.scene.setTool(tool)
+
+    def copySelection(self):
+        self.scene.copySelection()
+
+    def paste(self):
+        # a pasted stamp is laid down with the brush
+        if self.scene.pasteStamp():
+            self.setTool(MapTool.BRUSH)
+
+    def pickFillColor(self):
+        color = QColorDialog.getColor(parent=self, title="Fill Colour", options=QColorDialog.ShowAlphaChannel)
+
+        if color.isValid():
+            self.scene.setPlacementFill(color)
+
+    def pickVariantSeed(self):
+        # exports pick each cell's variant from this, changing it reshuffles them all
+        seed, ok = QInputDialog.getInt(self, "Variant Seed", "Seed:", self.scene.variantSeed, -2147483647, 2147483647)
+
+        if ok and seed != self.scene.variantSeed:
+            self.scene.variantSeed = seed
+            self.scene.mapChanged()
+
+    def layerAdded(self, layerType):
+        self.scene.addLayer(MapLayerType(layerType))
+        self.layersDock.setLayers(self.scene.layers, len(self.scene.layers) - 1)
+        self.scene.setCurrentLayer(len(self.scene.layers) - 1)
+
+    def layerRenamed(self, index, name):
+        self.scene.layers[index].name = name
+        self.scene.mapChanged()
+
+    def restoreState(self, state):
+        for filePath in state['spriteSheets']:
+            self.addSpriteSheet(filePath, self.application.readFile(filePath))
+
+        self.scene.restoreState(state)
+        self.layersDock.setLayers(self.scene.layers)
+
+    def exportFile(self, profile = 'editor'):
+        return self.scene.exportFile(profile)
+
+    def spriteSheetEdited(self, filePath, objects):
+        for spriteSheet, sheetFile in zip(self.scene.spriteSheets, self.scene.spriteSheetFiles):
+            if projectPath(sheetFile) == filePath:
+                self.scene.updateSpriteSheet(spriteSheet, objects)
+
     def addSpriteSheet(self, filePath, data):
         spriteSheet = SpriteSheet.fromdict(data)
 
@@ -101,9 +207,6 @@ class SpriteSheetTabContentWidget(QWidget):
         view.scale(0.25, 0.25)
         view.translate(0.0, 0.0)
 
-        self.spriteSheet.drawTiles(self.scene)
-        self.spriteSheet.drawGrid(self.scene)
-
 class SpriteSheetTabWidget(QTabWidget):
     def __init__(self, application = None):
         super().__init__(application)
@@ -171,8 +274,55 @@ class WorkAreaTabSpriteSheet(WorkAreaTab):
         self.addDockWidget(Qt.LeftDockWidgetArea, self.propertiesDock)
 
         self.objectPropertiesDock = ObjectPropertiesWidget("Object Properties", self)
+        self.objectPropertiesDock.objectChanged.connect(self.objectChanged)
         self.addDockWidget(Qt.LeftDockWidgetArea, self.objectPropertiesDock)
 
+        self.objectsDock = SpriteObjectsDockWidget("Objects", self, self.scene)
+        self.objectsDock.objectSelected.connect(self.objectSelected)
+        self.objectsDock.model.objectEdited.connect(self.objectEdited)
+        self.objectsDock.bulkEdit.connect(self.bulkEdit)
+        self.scene.objectsEdited.connect(self.objectsEdited)
+        self.addDockWidget(Qt.RightDockWidgetArea, self.objectsDock)
+
+        sheetToolBar = self.addToolBar("Sprite Sheet")
+
+        self.hitBoxAction = sheetToolBar.addAction("Edit Hitboxes")
+        self.hitBoxAction.setCheckable(True)
+        self.hitBoxAction.toggled.connect(self.scene.setHitBoxMode)
+
+        sheetToolBar.addAction("Auto-segment Objects").triggered.connect(self.scene.autoSegment)
+
+    def objectSelected(self, obj):
+        self.scene.selectObject(obj)
+        self.view.ensureVisible(self.scene.objectSceneRect(obj))
+
+    def objectEdited(self, obj):
+        # edited in the list, the properties dock shows it too if selected
+        if obj is self.scene.selectedObject:
+            self.objectPropertiesDock.setObject(obj)
+
+        self.objectChanged(obj)
+
+    def bulkEdit(self, objects, changes, properties):
+        self.scene.editObjects(objects, changes, properties, f"Edit {len(objects)} objects")
+
+    def objectsEdited(self, objects):
+        # a batch edit, or its undo, refreshes everything once
+        self.objectsDock.model.objectsChanged(objects)
+
+        if self.scene.selectedObject in objects:
+            self.objectPropertiesDock.setObject(self.scene.selectedObject)
+
+        if self.scene.hitBoxOverlay:
+            self.scene.hitBoxOverlay.update()
+
+    def objectChanged(self, obj):
+        self.objectsDock.model.objectChanged(obj)
+        self.scene.setModified()
+
+        if self.scene.hitBoxOverlay:
+            self.scene.hitBoxOverlay.update()
+
     def restoreState(self, state):
         print(state)
         self.scene.restoreState(state)
@@ -190,6 +340,7 @@ class WorkAreaTabWidget(QTabWidget):
 
         self.setTabsClosable(True)
         self.tabCloseRequested.connect(self.closeHandler)
+        self.currentChanged.connect(self.tabChanged)
 
         #self.addTab("Untitled sprite sheet", WorkAreaType.SPRITE_SHEET)
         #self.addTab("Untitled map", WorkAreaType.MAP)
@@ -199,20 +350,42 @@ class WorkAreaTabWidget(QTabWidget):
         msgBox = QMessageBox(self.application)
 
         msgBox.setWindowTitle("SpriteSheetz");
-        msgBox.setText("Are you sure you want to close this tab?");
+        if self.widget(index).isModified():
+            msgBox.setText("This tab has unsaved changes, are you sure you want to close it?");
+        else:
+            msgBox.setText("Are you sure you want to close this tab?");
         msgBox.setStandardButtons(QMessageBox.Yes)
         msgBox.addButton(QMessageBox.No)
         msgBox.setDefaultButton(QMessageBox.No)
         
         if msgBox.exec() == QMessageBox.Yes:
+            undoStack = getattr(self.widget(index).scene, 'undoStack', None)
+
+            if undoStack:
+                self.application.undoGroup.removeStack(undoStack)
+
+            self.widget(index).closeDocument()
+
             self.removeTab(index)
 
+    def tabChanged(self, index):
+        tab = self.widget(index)
+        self.application.undoGroup.setActiveStack(getattr(tab.scene, 'undoStack', None) if tab else None)
+
     def addTab(self, title, areaType):
         if areaType == WorkAreaType.MAP:
             newTab = WorkAreaTabMap(self.application, title, areaType)
         else:
             newTab = WorkAreaTabSpriteSheet(self.application, title, areaType)
 
+        undoStack = getattr(newTab.scene, 'undoStack', None)
+
+        if undoStack:
+            self.application.undoGroup.addStack(undoStack)
+
+        if areaType == WorkAreaType.SPRITE_SHEET:
+            newTab.scene.sheetEdited.connect(lambda: self.sheetEdited(newTab.scene))
+
         #self.tabs.append(newTab)
         super().addTab(newTab, title)
 
@@ -220,12 +393,33 @@ class WorkAreaTabWidget(QTabWidget):
 
         return newTab
 
+    def sheetEdited(self, sheet):
+        # open maps using the sheet's file follow its edits
+        if sheet.fileName == '':
+            return
+
+        filePath = projectPath(sheet.fileName)
+
+        for i in range(0, self.count()):
+            tab = self.widget(i)
+
+            if tab.areaType == WorkAreaType.MAP:
+                tab.spriteSheetEdited(filePath, sheet.objects)
+
     def activeTab(self):
         currentIndex = self.currentIndex()
 
         if currentIndex > -1:
             return self.widget(self.currentIndex())
 
+    def closeDocuments(self):
+        for i in range(0, self.count()):
+            self.widget(i).closeDocument()
+
+    def setDisplayScale(self, scale):
+        for i in range(0, self.count()):
+            self.widget(i).view.setDisplayScale(scale)
+
     def saveState(self):
         tabStates = []
 
@@ -238,7 +432,13 @@ class WorkAreaTabWidget(QTabWidget):
     def loadFile(self, filePath, data):
         if data['type'] == 'sheet':
             # if tab exists, swap to it instead
-            self.addTab(data['name'], WorkAreaType.SPRITE_SHEET).restoreState(data)
+            tab = self.addTab(data['name'], WorkAreaType.SPRITE_SHEET)
+            tab.restoreState(data)
+            tab.scene.fileName = filePath
+        elif data['type'] == 'map':
+            tab = self.addTab(data['name'], WorkAreaType.MAP)
+            tab.restoreState(data)
+            tab.scene.fileName = filePath
 
     def restoreState(self, tabStates):
         print(tabStates)
@@ -248,4 +448,6 @@ class WorkAreaTabWidget(QTabWidget):
                 print("me", flush=True)
                 if state['type'] == 'sheet':
                     self.addTab(state['name'], WorkAreaType.SPRITE_SHEET).restoreState(state)
+                elif state['type'] == 'map':
+                    self.addTab(state['name'], WorkAreaType.MAP).restoreState(state)
  
\ No newline at end of file
@@ -0,0 +1,109 @@
+import numpy
+
+from spritesheetz.objects import TerrainMode
+
+# Neighbour bit weights, laid out as (dx, dy, bit). Edge mode only uses the four
+# cardinal directions, blob mode uses all eight.
+EDGE_WEIGHTS = [(0, -1, 1), (1, 0, 2), (0, 1, 4), (-1, 0, 8)]
+BLOB_WEIGHTS = [(-1, -1, 1), (0, -1, 2), (1, -1, 4),
+                (-1, 0, 8),               (1, 0, 16),
+                (-1, 1, 32), (0, 1, 64),  (1, 1, 128)]
+
+def reduceBlobMask(mask):
+    # a corner only counts when both edges next to it are set as well
+    mask = numpy.asarray(mask, dtype=numpy.int32)
+    n, w, e, s = (mask & 2) > 0, (mask & 8) > 0, (mask & 16) > 0, (mask & 64) > 0
+    keep = 2 | 8 | 16 | 64
+    keep = keep | numpy.where(n & w, 1, 0) | numpy.where(n & e, 4, 0)
+    keep = keep | numpy.where(s & w, 32, 0) | numpy.where(s & e, 128, 0)
+    return mask & keep
+
+# The 47 distinct masks left after reduction, in ascending order. Rule sets
+# without explicit masks map these onto the object's tiles in reading order.
+BLOB_MASKS = sorted(set(int(m) for m in reduceBlobMask(numpy.arange(256))))
+BLOB_REDUCTION = reduceBlobMask(numpy.arange(256))
+
+def neighbourMask(window, weights):
+    # window is the terrain indices padded by one cell on each side, cells
+    # outside the map are -1 and match anything so map borders don't show seams.
+    # This is a convolution of the per-direction equality maps with the weights.
+    width = window.shape[0] - 2
+    height = window.shape[1] - 2
+    centre = window[1:-1, 1:-1]
+    mask = numpy.zeros(centre.shape, dtype=numpy.int32)
+
+    for dx, dy, bit in weights:
+        neighbour = window[1 + dx:1 + dx + width, 1 + dy:1 + dy + height]
+        mask |= numpy.where((neighbour == centre) | (neighbour < 0), bit, 0)
+
+    return mask
+
+class AutoTiler:
+    def __init__(self):
+        self.terrains = [None]
+        self.modes = numpy.zeros(1, dtype=numpy.uint8)
+        self.lookup = numpy.zeros((1, 256), dtype=numpy.int32)
+
+    def addSpriteSheet(self, spriteSheet):
+        rows = []
+        modes = []
+
+        for obj in spriteSheet.objects:
+            if obj.terrain is None:
+                continue
+
+            row = numpy.full(256, spriteSheet.tileId(*obj.tiles[0]), dtype=numpy.int32)
+
+            for mask, tile in obj.terrain.resolvedRules(obj.tiles).items():
+                row[mask] = spriteSheet.tileId(*tile)
+
+            if obj.terrain.mode == TerrainMode.BLOB:
+                # unreduced masks share the tile of their reduced form
+                row = row[BLOB_REDUCTION]
+
+            self.terrains.append(obj)
+            rows.append(row)
+            modes.append(int(obj.terrain.mode))
+
+        if rows:
+            self.lookup = numpy.vstack([self.lookup, numpy.array(rows)])
+            self.modes = numpy.concatenate([self.modes, numpy.array(modes, dtype=numpy.uint8)])
+
+    def terrainIndex(self, obj):
+        for index, terrain in enumerate(self.terrains):
+            if terrain is obj:
+                return index
+
+        return 0
+
+    def resolve(self, layer, x0, y0, x1, y1):
+        """
+        Recompute tiles for the painted region [x0, x1) x [y0, y1) and the ring
+        of neighbours around it, returns the region that was rewritten.
+        """
+        rows, cols = layer.terrain.shape
+
+        # cells whose masks can change
+        rx0, ry0 = max(x0 - 1, 0), max(y0 - 1, 0)
+        rx1, ry1 = min(x1 + 1, rows), min(y1 + 1, cols)
+
+        if rx0 >= rx1 or ry0 >= ry1:
+            return None
+
+        window = numpy.full((rx1 - rx0 + 2, ry1 - ry0 + 2), -1, dtype=numpy.int32)
+        wx0, wy0 = max(rx0 - 1, 0), max(ry0 - 1, 0)
+        wx1, wy1 = min(rx1 + 1, rows), min(ry1 + 1, cols)
+        window[wx0 - rx0 + 1:wx1 - rx0 + 1, wy0 - ry0 + 1:wy1 - ry0 + 1] = layer.terrain[wx0:wx1, wy0:wy1]
+
+        centre = window[1:-1, 1:-1]
+        modes = self.modes[centre]
+
+        mask = numpy.where(modes == TerrainMode.BLOB,
+                           neighbourMask(window, BLOB_WEIGHTS),
+                           neighbourMask(window, EDGE_WEIGHTS))
+
+        region = layer.tiles[rx0:rx1, ry0:ry1]
+        painted = centre > 0
+        region[painted] = self.lookup[centre[painted], mask[painted]]
+
+        return (rx0, ry0, rx1, ry1)
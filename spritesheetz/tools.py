@@ -0,0 +1,182 @@
+from enum import IntEnum
+import numpy
+
+class MapTool(IntEnum):
+    BRUSH = 0
+    BUCKET = 1
+    RECTANGLE = 2
+    LINE = 3
+    ELLIPSE = 4
+    PATH = 5
+    REGION = 6
+    POLYGON_REGION = 7
+    SELECT = 8
+
+# All shapes are returned as (x0, y0, mask) where mask is a boolean array whose
+# top left cell sits at x0, y0. Masks are clipped to the grid.
+
+def clipMask(x0, y0, mask, rows, cols):
+    cx0, cy0 = max(x0, 0), max(y0, 0)
+    cx1, cy1 = min(x0 + mask.shape[0], rows), min(y0 + mask.shape[1], cols)
+
+    if cx0 >= cx1 or cy0 >= cy1:
+        return None
+
+    return (cx0, cy0, mask[cx0 - x0:cx1 - x0, cy0 - y0:cy1 - y0])
+
+def cropMask(mask):
+    xs = numpy.flatnonzero(mask.any(axis=1))
+
+    if len(xs) == 0:
+        return None
+
+    ys = numpy.flatnonzero(mask.any(axis=0))
+
+    return (int(xs[0]), int(ys[0]), mask[xs[0]:xs[-1] + 1, ys[0]:ys[-1] + 1])
+
+def orderedRect(startX, startY, endX, endY):
+    return (min(startX, endX), min(startY, endY), max(startX, endX) + 1, max(startY, endY) + 1)
+
+def rectangleMask(startX, startY, endX, endY, rows, cols):
+    x0, y0, x1, y1 = orderedRect(startX, startY, endX, endY)
+    return clipMask(x0, y0, numpy.ones((x1 - x0, y1 - y0), dtype=bool), rows, cols)
+
+def lineMask(startX, startY, endX, endY, rows, cols):
+    x0, y0, x1, y1 = orderedRect(startX, startY, endX, endY)
+    steps = max(abs(endX - startX), abs(endY - startY)) + 1
+
+    xs = numpy.rint(numpy.linspace(startX, endX, steps)).astype(numpy.int64)
+    ys = numpy.rint(numpy.linspace(startY, endY, steps)).astype(numpy.int64)
+
+    mask = numpy.zeros((x1 - x0, y1 - y0), dtype=bool)
+    mask[xs - x0, ys - y0] = True
+
+    return clipMask(x0, y0, mask, rows, cols)
+
+def ellipseMask(startX, startY, endX, endY, rows, cols):
+    x0, y0, x1, y1 = orderedRect(startX, startY, endX, endY)
+    radiusX = (x1 - x0) / 2
+    radiusY = (y1 - y0) / 2
+
+    # test cell centres against the ellipse inscribed in the dragged rect
+    xs, ys = numpy.ogrid[0:x1 - x0, 0:y1 - y0]
+    mask = ((xs + 0.5 - radiusX) / radiusX) ** 2 + ((ys + 0.5 - radiusY) / radiusY) ** 2 <= 1.0
+
+    return clipMask(x0, y0, mask, rows, cols)
+
+def floodFillMask(grid, x, y):
+    """
+    Scanline flood fill over the 4-connected cells equal to grid[x, y]. Spans
+    run along y, which is the contiguous axis of the layer arrays.
+    """
+    rows, cols = grid.shape
+    match = grid == grid[x, y]
+    filled = numpy.zeros((rows, cols), dtype=bool)
+    stack = [(x, y)]
+
+    while stack:
+        x, y = stack.pop()
+
+        if filled[x, y]:
+            continue
+
+        blocked = numpy.flatnonzero(~match[x])
+        split = numpy.searchsorted(blocked, y)
+        spanStart = blocked[split - 1] + 1 if split > 0 else 0
+        spanEnd = blocked[split] if split < len(blocked) else cols
+
+        filled[x, spanStart:spanEnd] = True
+
+        for nx in (x - 1, x + 1):
+            if nx < 0 or nx >= rows:
+                continue
+
+            candidates = match[nx, spanStart:spanEnd] & ~filled[nx, spanStart:spanEnd]
+
+            if candidates.any():
+                # seed once per run of fillable cells next to the span
+                starts = numpy.flatnonzero(candidates & ~numpy.concatenate(([False], candidates[:-1])))
+                stack.extend((nx, spanStart + int(start)) for start in starts)
+
+    return cropMask(filled)
+
+def labelComponents(mask):
+    """
+    Label the 4-connected components of a boolean [x, y] grid, returns the
+    label grid (0 where mask is False) and the number of components. Works on
+    runs along y so the python level work scales with runs rather than cells.
+    """
+    rows, cols = mask.shape
+    labels = numpy.zeros((rows, cols), dtype=numpy.int32)
+
+    padded = numpy.zeros((rows, cols + 2), dtype=numpy.int8)
+    padded[:, 1:-1] = mask
+    edges = numpy.diff(padded, axis=1)
+
+    # nonzero walks x then y, so starts and ends pair up run for run
+    runX, runStart = numpy.nonzero(edges == 1)
+    runEnd = numpy.nonzero(edges == -1)[1]
+    runCount = len(runX)
+
+    if runCount == 0:
+        return labels, 0
+
+    columnStarts = numpy.searchsorted(runX, numpy.arange(rows + 1))
+    linksA = []
+    linksB = []
+
+    for x in numpy.flatnonzero(numpy.diff(columnStarts[:-1]) * numpy.diff(columnStarts[1:])):
+        a0, a1 = columnStarts[x], columnStarts[x + 1]
+        b0, b1 = columnStarts[x + 1], columnStarts[x + 2]
+
+        # runs in the next column that overlap each run in this one
+        low = b0 + numpy.searchsorted(runEnd[b0:b1], runStart[a0:a1], side='right')
+        high = b0 + numpy.searchsorted(runStart[b0:b1], runEnd[a0:a1], side='left')
+        counts = numpy.maximum(high - low, 0)
+
+        linksA.append(numpy.repeat(numpy.arange(a0, a1), counts))
+        linksB.append(numpy.repeat(low, counts) + numpy.arange(counts.sum()) - numpy.repeat(numpy.cumsum(counts) - counts, counts))
+
+    runLabels = numpy.arange(runCount)
+
+    if linksA:
+        linksA = numpy.concatenate(linksA)
+        linksB = numpy.concatenate(linksB)
+
+        # propagate the smallest run index through each component
+        while True:
+            smallest = numpy.minimum(runLabels[linksA], runLabels[linksB])
+            updated = runLabels.copy()
+            numpy.minimum.at(updated, linksA, smallest)
+            numpy.minimum.at(updated, linksB, smallest)
+            updated = updated[updated]
+
+            if numpy.array_equal(updated, runLabels):
+                break
+
+            runLabels = updated
+
+    roots, runLabels = numpy.unique(runLabels, return_inverse=True)
+
+    lengths = runEnd - runStart
+    offsets = numpy.arange(lengths.sum()) - numpy.repeat(numpy.cumsum(lengths) - lengths, lengths)
+    labels[numpy.repeat(runX, lengths), numpy.repeat(runStart, lengths) + offsets] = numpy.repeat(runLabels + 1, lengths)
+
+    return labels, len(roots)
+
+def componentBounds(labels, count):
+    """
+    Bounding boxes of the components in a label grid from labelComponents, as
+    a (count, 4) array of x0, y0, x1, y1 with the ends exclusive.
+    """
+    xs, ys = numpy.nonzero(labels)
+    components = labels[xs, ys] - 1
+
+    bounds = numpy.zeros((count, 4), dtype=numpy.int64)
+    bounds[:, :2] = numpy.iinfo(numpy.int64).max
+    numpy.minimum.at(bounds[:, 0], components, xs)
+    numpy.minimum.at(bounds[:, 1], components, ys)
+    numpy.maximum.at(bounds[:, 2], components, xs + 1)
+    numpy.maximum.at(bounds[:, 3], components, ys + 1)
+
+    return bounds
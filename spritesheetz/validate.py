@@ -0,0 +1,289 @@
+import os
+import sys
+import json
+import argparse
+from itertools import chain
+from math import ceil
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context, cpu_count
+import numpy
+
+# Projects with fewer files than this are checked in process, a pool costs more than it saves
+PARALLEL_FILES = 32
+# Files handed to a worker at a time
+POOL_CHUNK = 8
+# Cells listed with a problem that covers many of them
+EXAMPLE_CELLS = 5
+
+# Only numpy is imported here so spawned workers start quickly and never touch Qt
+
+ERROR = 'error'
+WARNING = 'warning'
+
+def problem(filePath, severity, code, message, **details):
+    entry = {'file': filePath, 'severity': severity, 'code': code, 'message': message}
+    entry.update(details)
+
+    return entry
+
+def examples(xs, ys):
+    return [[int(x), int(y)] for x, y in zip(xs[:EXAMPLE_CELLS], ys[:EXAMPLE_CELLS])]
+
+def rowsArray(rows, width):
+    # list of equal length int lists -> (len, width) array, flattening first is much faster than numpy.array
+    return numpy.fromiter(chain.from_iterable(rows), dtype=numpy.int64, count=len(rows) * width).reshape(-1, width)
+
+def loadJson(filePath):
+    """
+    The parsed file and every key that appears more than once in one of its
+    objects, json.load quietly keeps only the last of them.
+    """
+    duplicates = []
+
+    def pairs(items):
+        data = {}
+
+        for key, value in items:
+            if key in data:
+                duplicates.append(key)
+
+            data[key] = value
+
+        return data
+
+    with open(filePath, 'r', encoding='utf-8') as file:
+        return json.load(file, object_pairs_hook=pairs), duplicates
+
+def projectFile(root, path):
+    # paths inside project files are relative to the project, not wherever the check runs from
+    return os.path.normpath(os.path.join(root, path))
+
+def validateSheet(filePath, root):
+    """
+    Problems with one sprite sheet, and the summary maps using it are checked
+    against: its size in tiles and its object count, or None if it can't be read.
+    """
+    try:
+        data, duplicates = loadJson(filePath)
+        horizontalTiles = ceil(data['width'] / data['tileWidth'])
+        verticalTiles = ceil(data['height'] / data['tileHeight'])
+        items = list(data['items'].items())
+    except (OSError, ValueError, KeyError, TypeError, ZeroDivisionError) as error:
+        return [problem(filePath, ERROR, 'unreadable', f"Couldn't read sheet: {error}")], None
+
+    problems = []
+
+    if not os.path.exists(projectFile(root, data['spriteFile'])):
+        problems.append(problem(filePath, ERROR, 'missing-sprite-file', f"Sprite file {data['spriteFile']} doesn't exist"))
+
+    # items are stored by key, a key used twice loses all but the last object on load
+    for key in sorted(set(duplicates) & {itemKey for itemKey, _ in items}):
+        problems.append(problem(filePath, ERROR, 'duplicate-key', f"More than one object uses the key {key}", key=key))
+
+    keys = set()
+
+    for itemKey, item in items:
+        key = item.get('key', itemKey)
+
+        if key != itemKey:
+            problems.append(problem(filePath, ERROR, 'key-mismatch', f"Object stored as {itemKey} has the key {key}", key=key))
+
+        if key in keys:
+            problems.append(problem(filePath, ERROR, 'duplicate-key', f"More than one object uses the key {key}", key=key))
+
+        keys.add(key)
+
+    for itemKey, item in items:
+        tiles = rowsArray(item.get('tiles', []), 2)
+
+        if len(tiles) == 0:
+            problems.append(problem(filePath, ERROR, 'no-tiles', f"Object {itemKey} has no tiles", key=itemKey))
+
+        outside = (tiles[:, 0] < 0) | (tiles[:, 0] >= horizontalTiles) | (tiles[:, 1] < 0) | (tiles[:, 1] >= verticalTiles)
+
+        if outside.any():
+            problems.append(problem(filePath, ERROR, 'tile-out-of-bounds',
+                                    f"Object {itemKey} uses {int(outside.sum())} tiles outside the {horizontalTiles}x{verticalTiles} sheet",
+                                    key=itemKey, tiles=tiles[outside][:EXAMPLE_CELLS].tolist()))
+
+        for variantKey, _ in item.get('variants', []):
+            if variantKey not in keys:
+                problems.append(problem(filePath, WARNING, 'unknown-variant', f"Object {itemKey} has a variant {variantKey} the sheet doesn't have",
+                                        key=itemKey))
+
+    return problems, {'tiles': [horizontalTiles, verticalTiles], 'objects': len(items)}
+
+def validateMap(filePath, root, sheets):
+    """
+    Problems with one map, sheets maps each sprite sheet path to its summary
+    from validateSheet or None for sheets that are missing or unreadable.
+    """
+    try:
+        with open(filePath, 'r', encoding='utf-8') as file:
+            data = json.load(file)
+
+        width, height = data['width'], data['height']
+        layers = data['layers']
+    except (OSError, ValueError, KeyError, TypeError) as error:
+        return [problem(filePath, ERROR, 'unreadable', f"Couldn't read map: {error}")]
+
+    problems = []
+    sheetPaths = [projectFile(root, path) for path in data.get('spriteSheets', [])]
+    summaries = [sheets.get(path) for path in sheetPaths]
+
+    for path, sheetPath, summary in zip(data.get('spriteSheets', []), sheetPaths, summaries):
+        if summary is None:
+            code = 'missing-sprite-sheet' if not os.path.exists(sheetPath) else 'unreadable-sprite-sheet'
+            problems.append(problem(filePath, ERROR, code, f"Sprite sheet {path} is missing or unreadable", sheet=path))
+
+    # tile ids as the map was saved, the layouts of its sheets at the time
+    sheetTiles = data.get('sheetTiles', [summary['tiles'] if summary else [0, 0] for summary in summaries])
+    # 0 is an empty cell
+    validTiles = [numpy.ones(1, dtype=bool)]
+
+    for summary, (horizontalTiles, verticalTiles) in zip(summaries, sheetTiles):
+        y, x = numpy.divmod(numpy.arange(horizontalTiles * verticalTiles), horizontalTiles)
+
+        if summary is None:
+            # already reported, don't repeat it for every cell
+            validTiles.append(numpy.ones(len(x), dtype=bool))
+        else:
+            validTiles.append((x < summary['tiles'][0]) & (y < summary['tiles'][1]))
+
+    validTiles = numpy.concatenate(validTiles)
+
+    for layerIndex, layer in enumerate(layers):
+        name = layer.get('name', str(layerIndex))
+
+        cellArrays = {cellsName: rowsArray(layer.get(cellsName, []), 3) for cellsName in ['tiles', 'terrain']}
+
+        for cellsName, cells in cellArrays.items():
+            outside = (cells[:, 0] < 0) | (cells[:, 0] >= width) | (cells[:, 1] < 0) | (cells[:, 1] >= height)
+
+            if outside.any():
+                problems.append(problem(filePath, ERROR, 'cell-out-of-bounds',
+                                        f"{int(outside.sum())} {cellsName} cells of layer {name} lie outside the {width}x{height} map",
+                                        layer=layerIndex, cells=examples(cells[outside, 0], cells[outside, 1])))
+
+        cells = cellArrays['tiles']
+        tileIds = cells[:, 2]
+        unknown = (tileIds < 0) | (tileIds >= len(validTiles))
+
+        if unknown.any():
+            problems.append(problem(filePath, ERROR, 'unknown-tile',
+                                    f"{int(unknown.sum())} cells of layer {name} use tile ids past the sheets' {len(validTiles) - 1} tiles",
+                                    layer=layerIndex, cells=examples(cells[unknown, 0], cells[unknown, 1])))
+
+        removed = ~unknown & ~validTiles[numpy.where(unknown, 0, tileIds)]
+
+        if removed.any():
+            problems.append(problem(filePath, ERROR, 'tile-out-of-bounds',
+                                    f"{int(removed.sum())} cells of layer {name} use tiles outside their sheet",
+                                    layer=layerIndex, cells=examples(cells[removed, 0], cells[removed, 1])))
+
+    # [sheet index, object index in the sheet, x, y, layer]
+    instances = rowsArray(data.get('objects', []), 5)
+    objectCounts = numpy.array([summary['objects'] if summary else numpy.iinfo(numpy.int64).max for summary in summaries] + [0], dtype=numpy.int64)
+    validSheet = (instances[:, 0] >= 0) & (instances[:, 0] < len(summaries))
+    # sheets the map doesn't have look up the trailing 0, they're reported as unknown sheets only
+    sheetIndices = numpy.where(validSheet, instances[:, 0], len(summaries))
+
+    checks = [
+        ('unknown-sheet', ~validSheet, "placed objects refer to sheets the map doesn't have"),
+        ('unknown-object', validSheet & ((instances[:, 1] < 0) | (instances[:, 1] >= objectCounts[sheetIndices])),
+         "placed objects refer to objects their sheet doesn't have"),
+        ('object-out-of-bounds', (instances[:, 2] < 0) | (instances[:, 2] >= width) | (instances[:, 3] < 0) | (instances[:, 3] >= height),
+         f"placed objects lie outside the {width}x{height} map"),
+        ('unknown-layer', (instances[:, 4] < 0) | (instances[:, 4] >= len(layers)), "placed objects are on layers the map doesn't have")
+    ]
+
+    for code, failed, message in checks:
+        if failed.any():
+            problems.append(problem(filePath, ERROR, code, f"{int(failed.sum())} {message}",
+                                    cells=examples(instances[failed, 2], instances[failed, 3])))
+
+    return problems
+
+# Pool entry points, data of the wrong shape is reported rather than ending the whole run
+
+def validateSheetEntry(entry):
+    try:
+        return validateSheet(*entry)
+    except (ValueError, TypeError, KeyError, IndexError) as error:
+        return [problem(entry[0], ERROR, 'malformed', f"Sheet data is malformed: {error}")], None
+
+def validateMapEntry(entry):
+    try:
+        return validateMap(*entry)
+    except (ValueError, TypeError, KeyError, IndexError) as error:
+        return [problem(entry[0], ERROR, 'malformed', f"Map data is malformed: {error}")]
+
+def runAll(function, items, workers):
+    if workers > 1 and len(items) >= PARALLEL_FILES:
+        with ProcessPoolExecutor(max_workers=workers, mp_context=get_context('spawn')) as pool:
+            return list(pool.map(function, items, chunksize=POOL_CHUNK))
+
+    return [function(item) for item in items]
+
+def validateProject(root, workers = None):
+    """
+    Problems with every sheet and map under root. Sheets are checked first, maps
+    are then checked against the summaries of the sheets they use, each file on
+    its own in a pool of worker processes.
+    """
+    # the project index reads only file headers to tell sheets from maps
+    from spritesheetz.project import scanProject
+
+    workers = workers or cpu_count()
+    entries = scanProject(root, {}, root)
+    sheetPaths = sorted(path for path, entry in entries.items() if entry.get('type') == 'sheet')
+    mapPaths = sorted(path for path, entry in entries.items() if entry.get('type') == 'map')
+
+    problems = []
+    sheets = {}
+
+    for path, (sheetProblems, summary) in zip(sheetPaths, runAll(validateSheetEntry, [(path, root) for path in sheetPaths], workers)):
+        problems.extend(sheetProblems)
+
+        if summary is not None:
+            sheets[path] = summary
+
+    # each map is sent only the summaries of its own sheets
+    mapEntries = [(path, root, {sheet: sheets[sheet] for sheet in entries[path].get('spriteSheets', []) if sheet in sheets}) for path in mapPaths]
+
+    for mapProblems in runAll(validateMapEntry, mapEntries, workers):
+        problems.extend(mapProblems)
+
+    return {
+        'root': root,
+        'sheets': len(sheetPaths),
+        'maps': len(mapPaths),
+        'errors': sum(entry['severity'] == ERROR for entry in problems),
+        'warnings': sum(entry['severity'] == WARNING for entry in problems),
+        'problems': problems
+    }
+
+def main(arguments = None):
+    parser = argparse.ArgumentParser(prog='python -m spritesheetz.validate',
+                                     description='Check the sheets and maps of a project for broken references, out of bounds tiles and duplicate keys.')
+    parser.add_argument('root', help='project directory')
+    parser.add_argument('--format', choices=['json', 'text'], default='json', help='json report, or one line per problem')
+    parser.add_argument('--workers', type=int, default=None, help='worker processes, all cores by default')
+    options = parser.parse_args(arguments)
+
+    report = validateProject(os.path.normpath(os.path.abspath(options.root)), options.workers)
+
+    if options.format == 'json':
+        print(json.dumps(report, indent=2))
+    else:
+        for entry in report['problems']:
+            print(f"{entry['file']}: {entry['severity']}: {entry['code']}: {entry['message']}")
+
+        print(f"{report['sheets']} sheets, {report['maps']} maps, {report['errors']} errors, {report['warnings']} warnings")
+
+    # a failed check fails the build
+    return 1 if report['errors'] else 0
+
+# spawned workers import this module again
+if __name__ == '__main__':
+    sys.exit(main())